@@ -1,9 +1,48 @@
+import time
+_imports_started = time.perf_counter()  # 起動時のモジュールの読み込み時間（計測結果の startup_imports）
 import streamlit as st
 import pandas as pd
 import io
-import openpyxl
-import altair as alt
+import os
+import sys
+import json
+import hashlib
+import threading
+import uuid
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from trade_processing import (
+    STREAM_CHUNK_ROWS, TradeDataError, MissingColumnsError,
+    clean_trade_data, iter_trade_chunks, concat_trade_chunks, parse_trade_files, merge_trade_frames,
+    read_trade_csv, memory_usage_report, period_bounds, generate_summary_stats,
+)
+from trade_store import TRADE_STORE_DIR, TradeStore, validate_account_name
+from trade_rollup import build_rollup, slice_rollup, rollup_by
+from trade_charts import (
+    GRAPH_OPTIONS, TRADE_LEVEL_GRAPHS, CHART_RESOLUTION_OPTIONS, DEFAULT_CHART_RESOLUTION,
+    build_chart, build_rolling_chart, build_distribution_chart, build_equity_comparison_chart,
+)
+from trade_export import EXPORT_FORMATS, GZIP_EXPORT_FORMAT, EXCEL_MAX_ROWS, export_trade_data
+from trade_instrumentation import StageTimer, instrumentation_enabled_by_env
+from trade_jobs import JobRegistry
+from trade_accounts import default_account_name, group_files_by_account, process_account, iter_account_results, compare_accounts
+from trade_simulation import (
+    SIMULATION_PATH_OPTIONS, DEFAULT_SIMULATION_PATHS, DEFAULT_BANKROLL, SIMULATION_MAX_TRADES,
+    simulate_trades, risk_of_ruin, summarize_simulation,
+)
+from trade_segments import (
+    DEFAULT_MIN_SEGMENT_TRADES, SEGMENT_CONFIDENCE_OPTIONS, DEFAULT_SEGMENT_CONFIDENCE, SEGMENT_TOP_OPTIONS, SEGMENT_DIMENSIONS,
+    search_segments,
+)
+from trade_metrics import TRADE_WINDOWS, TIME_WINDOWS, METRIC_GROUP_COLUMNS, ROLLING_METRICS, rolling_metrics
+from trade_report import REPORT_FORMATS, ReportError, build_report, check_report_font
+from trade_preview import (
+    PREVIEW_PAGE_SIZES, DEFAULT_PREVIEW_PAGE_SIZE, PREVIEW_FILTER_COLUMNS, PREVIEW_DATE_COLUMN,
+    filter_values, preview_positions, preview_page, column_summary,
+)
+from trade_warmup import warmup_enabled_by_env, warm_up
+# グラフ・Excel・レポートのライブラリ（altair・xlsxwriter・fpdf・vl-convert）は、各機能を使うときに読み込む
+_import_seconds = time.perf_counter() - _imports_started
 
 st.set_page_config(
     page_title="AI分析向けデータ加工サービス",
@@ -110,181 +149,664 @@ uploaded_files = st.file_uploader("CSVファイルをアップロードしてく
 st.markdown('</div>', unsafe_allow_html=True)
 
 # --- 共通関数群 ---
-def create_chart(df, chart_type, x_col, y_col, title, **kwargs):
-    """Altairグラフを生成する共通関数"""
-    if 'color' not in kwargs:
-        kwargs['color'] = alt.condition(
-            alt.datum[y_col] >= 0 if y_col in df.columns else alt.datum[y_col],
-            alt.value('#4CAF50'), alt.value('#F44336')
-        )
-    if chart_type == "bar":
-        chart = alt.Chart(df).mark_bar().encode(
-            x=alt.X(x_col, title=kwargs.get('x_title'), sort=kwargs.get('sort_x')),
-            y=alt.Y(y_col, title=kwargs.get('y_title'), axis=alt.Axis(format=kwargs.get('format_y', ''))),
-            color=kwargs.get('color'),
-            tooltip=kwargs.get('tooltip')
-        ).properties(title=title)
-    elif chart_type == "line":
-        chart = alt.Chart(df).mark_line().encode(
-            x=alt.X(x_col, title=kwargs.get('x_title'), sort=kwargs.get('sort_x')),
-            y=alt.Y(y_col, title=kwargs.get('y_title'), axis=alt.Axis(format=kwargs.get('format_y', ''))),
-            tooltip=kwargs.get('tooltip')
-        ).properties(title=title)
-    elif chart_type == "pie":
-        chart = alt.Chart(df).mark_arc(outerRadius=120).encode(
-            theta=alt.Theta(y_col, stack=True),
-            color=alt.Color(x_col, scale=alt.Scale(domain=kwargs.get('color_domain'), range=kwargs.get('color_range'))),
-            tooltip=kwargs.get('tooltip')
-        )
-        text = alt.Chart(df).mark_text(radius=140).encode(
-            text=alt.Text(x_col), theta=alt.Theta(y_col, stack=True)
-        )
-        return chart + text
-    elif chart_type == "heatmap":
-        chart = alt.Chart(df).mark_rect().encode(
-            x=alt.X(x_col, title=kwargs.get('x_title'), sort=kwargs.get('sort_x')),
-            y=alt.Y(y_col, title=kwargs.get('y_title'), sort=kwargs.get('sort_y')),
-            color=alt.Color(kwargs.get('color'), scale=alt.Scale(scheme=kwargs.get('scheme', 'redblue'), domain=[0, 1]), legend=alt.Legend(format=".0%")),
-            tooltip=kwargs.get('tooltip')
-        ).properties(title=title)
-    return chart
-
-def categorize_duration(seconds):
-    """取引時間をカテゴリに分類する関数"""
-    if seconds == 15:
-        return '15秒'
-    elif seconds == 30:
-        return '30秒'
-    elif seconds == 60:
-        return '60秒'
-    elif 170 <= seconds <= 190:
-        return '3分'
-    elif 290 <= seconds <= 310:
-        return '5分'
+DATA_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 加工結果キャッシュのメモリ上限
+STREAMING_THRESHOLD_BYTES = 50 * 1024 * 1024  # これ以上のアップロードは既定でストリーミング読み込み
+JOB_POLL_SECONDS = 0.5  # バックグラウンド処理の進捗表示を更新する間隔
+JOB_INLINE_WAIT_SECONDS = 1.0  # この時間内に終わる処理は進捗を表示せずに結果を待つ
+
+def estimate_size(value):
+    """キャッシュに載せる値のおおよそのメモリ使用量（バイト）を返す関数"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    if isinstance(value, dict):
+        return len(json.dumps(value, ensure_ascii=False, default=str))
+    return sys.getsizeof(value)
+
+class ProcessedDataCache:
+    """データセットのハッシュをキーに、読み込み済みデータ・加工済みデータ・集計結果を保持するLRUキャッシュ"""
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, *values):
+        """値を保存し、保存できたかどうかを返す"""
+        size = sum(estimate_size(value) for value in values)
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return False  # 上限を超える単一データはキャッシュしない
+            while self._entries and self.current_bytes + size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+            self._entries[key] = (values, size)
+            self.current_bytes += size
+            return True
+
+    def __len__(self):
+        return len(self._entries)
+
+@st.cache_resource
+def get_data_cache():
+    """セッション間で共有する加工結果キャッシュを返す関数"""
+    return ProcessedDataCache(DATA_CACHE_MAX_BYTES)
+
+def compute_upload_hash(uploaded_files):
+    """アップロードされたファイル内容からキャッシュキーを計算する関数"""
+    hasher = hashlib.sha256()
+    for uploaded_file in uploaded_files:
+        content = uploaded_file.getvalue()
+        hasher.update(len(content).to_bytes(8, 'little'))
+        hasher.update(content)
+    return hasher.hexdigest()
+
+def show_trade_data_error(e):
+    """取引データの加工エラーを表示して処理を止める関数"""
+    if isinstance(e, MissingColumnsError):
+        st.error(str(e))
+        st.info("アップロードされたCSVファイルの列名:")
+        st.code(e.columns)
+    elif isinstance(e, TradeDataError):
+        st.error(str(e))
     else:
-        return 'その他'
+        st.error(f"⚠️ データ加工中にエラーが発生しました: {e}")
+    st.stop()
 
 def process_trade_data(df):
     """データ加工の主要ロジックをまとめた関数"""
-    required_columns = ['日付', '購入金額', 'ペイアウト', '終了時刻', '判定レート', 'レート', '取引オプション', '取引銘柄', 'HIGH/LOW', '取引番号']
-    if not all(col in df.columns for col in required_columns):
-        missing_cols = [col for col in required_columns if col not in df.columns]
-        st.error(f"⚠️ エラー：CSVファイルに必要な列が見つかりません。見つからなかった列: {', '.join(missing_cols)}")
-        st.info("アップロードされたCSVファイルの列名:")
-        st.code(list(df.columns))
-        st.stop()
-    
     try:
-        df['取引日付'] = pd.to_datetime(df['日付'].str.strip('="').str.strip('"'), format="%d/%m/%Y %H:%M:%S", errors='coerce').dt.tz_localize('Asia/Tokyo')
-        df['終了日時'] = pd.to_datetime(df['終了時刻'].str.strip('="').str.strip('"'), format="%d/%m/%Y %H:%M:%S", errors='coerce').dt.tz_localize('Asia/Tokyo')
-        
-        if df['取引日付'].isna().any() or df['終了日時'].isna().any():
-            st.error("⚠️ エラー：日付または終了時刻の形式が無効です。CSVファイルを確認してください。")
-            st.stop()
-        
-        df['購入金額'] = pd.to_numeric(df['購入金額'].str.replace('¥', '').str.replace(',', ''), errors='coerce').fillna(0).astype(int)
-        df['ペイアウト'] = pd.to_numeric(df['ペイアウト'].str.replace('¥', '').str.replace(',', ''), errors='coerce').fillna(0).astype(int)
-        df['利益'] = df['ペイアウト'] - df['購入金額']
-        
-        df['結果'] = ['WIN' if x > 0 else 'LOSE' for x in df['利益']]
-        df['結果(数値)'] = df['結果'].apply(lambda x: 1 if x == 'WIN' else 0)
-        df['曜日'] = df['取引日付'].dt.day_name().astype('category')
-        df['時間帯'] = pd.cut(df['取引日付'].dt.hour, bins=[0, 6, 12, 18, 24], labels=['深夜', '午前', '午後', '夜'], right=False).astype('category')
-        
-        df['取引時間_秒'] = (df['終了日時'] - df['取引日付']).dt.total_seconds()
-        df['取引時間'] = df['取引時間_秒'].apply(categorize_duration).astype('category')
-        
-        df['累積利益'] = df['利益'].cumsum()
-        df['ピーク'] = df['累積利益'].cummax()
-        df['ドローダウン'] = df['ピーク'] - df['累積利益']
-        
-        df.sort_values(by='取引日付', inplace=True)
-        df_cleaned = df.drop(columns=['日付', '終了時刻', '判定レート', 'レート', '取引オプション', '取引時刻', '終了日時'], errors='ignore')
-        
-        st.success("✅ データの加工が完了しました！")
-        return df_cleaned
+        df_cleaned = clean_trade_data(df)
     except Exception as e:
-        st.error(f"⚠️ データ加工中にエラーが発生しました: {e}")
+        show_trade_data_error(e)
+    st.success("✅ データの加工が完了しました！")
+    return df_cleaned
+
+def snapshot_uploaded_files(uploaded_files):
+    """バックグラウンド処理に渡すため、アップロードされたファイルを読み込み位置が独立したコピーにする関数"""
+    snapshots = []
+    for uploaded_file in uploaded_files:
+        snapshot = io.BytesIO(uploaded_file.getvalue())
+        snapshot.name = uploaded_file.name
+        snapshot.size = uploaded_file.size
+        snapshots.append(snapshot)
+    return snapshots
+
+@st.cache_resource
+def get_job_registry():
+    """セッション間で共有するバックグラウンド処理の一覧を返す関数"""
+    return JobRegistry()
+
+def stream_upload_job(progress, uploaded_files):
+    """アップロードされたファイルをチャンク単位で読み込み・加工する処理（大容量ファイル向け、バックグラウンドで実行）"""
+    with progress.stage('read_preview', "プレビューを読み込み中") as record:
+        # プレビュー用には先頭ファイルの先頭チャンクだけを読み込む
+        combined_df = read_trade_csv(uploaded_files[0], nrows=STREAM_CHUNK_ROWS)
+        record['rows'] = len(combined_df)
+
+    def iter_sources():
+        # 次のファイルに進んだ時点で、前のファイルまでを処理済みとする
+        for done, uploaded_file in enumerate(uploaded_files):
+            progress.set_files_done(done)
+            yield uploaded_file
+        progress.set_files_done(len(uploaded_files))
+
+    with progress.stage('stream_files', "チャンク単位で読み込み・加工中") as record:
+        chunks = []
+        for chunk in iter_trade_chunks(iter_sources()):
+            progress.add(rows=len(chunk))
+            chunks.append(chunk)
+        df_cleaned = concat_trade_chunks(chunks)
+        record['rows'] = len(df_cleaned)
+    return {'raw': combined_df, 'df': df_cleaned, 'errors': []}
+
+def parse_upload_job(progress, uploaded_files, max_workers):
+    """アップロードされたファイルを並列に読み込み・加工する処理（バックグラウンドで実行）
+
+    読み込みや加工に失敗したファイルは errors に (ファイル名, 例外) として記録し、残りのファイルだけで処理を続ける。
+    """
+    def on_result(result):
+        progress.add(files=1, rows=0 if result['df'] is None else len(result['df']))
+
+    with progress.stage('parse_files', "ファイルを読み込み・加工中") as record:
+        results = parse_trade_files(uploaded_files, max_workers=max_workers, use_processes=max_workers > 1, keep_raw=True, on_result=on_result)
+        succeeded = [result for result in results if result['error'] is None]
+        record['rows'] = sum(len(result['df']) for result in succeeded)
+    errors = [(result['name'], result['error']) for result in results if result['error'] is not None]
+    if not succeeded:
+        return {'raw': None, 'df': None, 'errors': errors}
+    with progress.stage('merge_files', "ファイルを結合中") as record:
+        combined_df = pd.concat([result['raw'] for result in succeeded], ignore_index=True)
+        df_cleaned = merge_trade_frames([result['df'] for result in succeeded])
+        record['rows'] = len(df_cleaned)
+    return {'raw': combined_df, 'df': df_cleaned, 'errors': errors}
+
+def ingest_upload_job(progress, uploaded_files, store, upload_hash):
+    """アップロードを読み込み、取引データストアに差分追記する処理（バックグラウンドで実行）"""
+    with progress.stage('read_files', "ファイルを読み込み中") as record:
+        dfs = []
+        for uploaded_file in uploaded_files:
+            df = read_trade_csv(uploaded_file)
+            dfs.append(df)
+            progress.add(files=1, rows=len(df))
+        combined_df = pd.concat(dfs, ignore_index=True)
+        record['rows'] = len(combined_df)
+    with progress.stage('store_append', "取引データストアに追記中", len(combined_df)):
+        added, duplicates = store.append(combined_df, upload_hash)
+    return {'raw': combined_df, 'added': added, 'duplicates': duplicates}
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def show_job_progress(job):
+    """バックグラウンド処理の進捗を定期的に更新して表示し、完了したらアプリ全体を再実行する関数"""
+    if job.done:
+        st.rerun()
+    progress = job.progress.snapshot()
+    fraction = progress['files_done'] / progress['files_total'] if progress['files_total'] else 0.0
+    st.progress(
+        min(fraction, 1.0),
+        text=f"⏳ {progress['stage']}… {progress['files_done']}/{progress['files_total']} ファイル・"
+             f"{progress['rows']:,} 行を処理済み（{progress['seconds']:.0f} 秒経過）"
+    )
+    st.caption("処理はバックグラウンドで続いています。画面を操作したり再読み込みしたりしても、完了した結果が引き継がれます。")
+
+def run_in_background(job_key, target, *args, files_total, timer):
+    """処理をバックグラウンドで実行し、完了していれば結果を返す関数。実行中の場合は進捗を表示して処理を止める
+
+    同じキーの処理は再実行をまたいで引き継ぎ、完了後の再実行では最初からやり直さずに結果を返す。
+    結果をキャッシュに移したら、二重に保持しないよう呼び出し側で get_job_registry().discard(job_key) する。
+    """
+    registry = get_job_registry()
+    job_timer = StageTimer(enabled=timer.enabled, run_id=timer.run_id, log=True)
+    job = registry.get_or_start(job_key, target, *args, files_total=files_total, timer=job_timer)
+    if not job.wait(JOB_INLINE_WAIT_SECONDS):
+        show_job_progress(job)
         st.stop()
+    # 処理段階の計測結果は、結果を受け取った最初の実行でだけ表示する
+    timer.stages.extend(job.progress.timer.stages)
+    job.progress.timer.stages.clear()
+    if job.error is not None:
+        registry.discard(job_key)  # エラーの場合は次の実行でやり直す
+        show_trade_data_error(job.error)
+    return job.result
 
-def generate_summary_stats(df):
-    """要約統計量を計算する関数"""
-    if df.empty:
-        return {
-            'total_trades': 0,
-            'total_profit': 0,
-            'win_rate': 0,
-            'avg_profit': 0,
-            'avg_loss': 0,
-            'risk_reward_ratio': 0,
-            'max_wins': 0,
-            'max_losses': 0,
-            'max_drawdown': 0,
-            'monthly_avg_profit': 0
-        }
-    
-    total_trades = len(df)
-    total_profit = df['利益'].sum()
-    win_rate = df['結果(数値)'].mean()
-    avg_profit = df[df['利益'] > 0]['利益'].mean() if not df[df['利益'] > 0].empty else 0
-    avg_loss = abs(df[df['利益'] < 0]['利益'].mean()) if not df[df['利益'] < 0].empty else 0
-    risk_reward_ratio = avg_profit / avg_loss if avg_loss != 0 and not pd.isna(avg_profit) and not pd.isna(avg_loss) else 0
-    
-    win_lose_list = df['結果'].tolist()
-    max_wins, max_losses = 0, 0
-    current_wins, current_losses = 0, 0
-    for result in win_lose_list:
-        if result == 'WIN':
-            current_wins += 1
-            current_losses = 0
-            max_wins = max(max_wins, current_wins)
+def show_file_errors(errors, file_count):
+    """読み込みや加工に失敗したファイルごとにエラーを表示する関数。全ファイルが失敗した場合は処理を止める"""
+    for name, e in errors:
+        if isinstance(e, TradeDataError):
+            st.error(f"📄 {name}: {e}")
         else:
-            current_losses += 1
-            current_wins = 0
-            max_losses = max(max_losses, current_losses)
-    
-    max_drawdown = df['ドローダウン'].max() if 'ドローダウン' in df.columns else 0
-    monthly_avg_profit = df.resample('M', on='取引日付')['利益'].mean().mean() if not df.empty else 0
-    
-    return {
-        'total_trades': total_trades,
-        'total_profit': total_profit,
-        'win_rate': win_rate,
-        'avg_profit': avg_profit,
-        'avg_loss': avg_loss,
-        'risk_reward_ratio': risk_reward_ratio,
-        'max_wins': max_wins,
-        'max_losses': max_losses,
-        'max_drawdown': max_drawdown,
-        'monthly_avg_profit': monthly_avg_profit
-    }
+            st.error(f"📄 {name}: ⚠️ データ加工中にエラーが発生しました: {e}")
+        if isinstance(e, MissingColumnsError):
+            with st.expander(f"{name} の列名"):
+                st.code(e.columns)
+    if len(errors) == file_count:
+        st.stop()
+    if errors:
+        st.warning(f"⚠️ {len(errors)} 件のファイルを除外し、残り {file_count - len(errors)} 件のファイルで分析します。")
+
+def process_accounts_job(progress, accounts, max_workers):
+    """口座ごとにファイルを読み込み・加工する処理（バックグラウンドで実行）。結果は accounts と同じキーの辞書"""
+    with progress.stage('process_accounts', "口座ごとに読み込み・加工中") as record:
+        results = {}
+        for item in iter_account_results(process_account, accounts, max_workers):
+            result = item['result']
+            if result is None:
+                # 想定外の例外で口座ごと加工できなかった場合は、口座のすべてのファイルのエラーとして表示する
+                error = RuntimeError(item['error'])
+                result = {'account': item['account'], 'df': None, 'stats': None, 'errors': [(name, error) for name, _ in accounts[item['account']]]}
+            results[result['account']] = result
+            progress.add(files=len(accounts[result['account']]), rows=0 if result['df'] is None else len(result['df']))
+        record['rows'] = sum(len(result['df']) for result in results.values() if result['df'] is not None)
+    return results
+
+def get_account_results(uploaded_files, accounts, max_workers, timer):
+    """口座ごと（{口座名: ファイルの位置のリスト}）に加工済みデータと要約統計量を返す関数
+
+    結果は口座のファイル内容のハッシュごとにキャッシュし、キャッシュにない口座だけをまとめてバックグラウンドで加工する。
+    口座を追加しても、加工済みの口座は再加工しない。
+    """
+    cache = get_data_cache()
+    account_keys = {account: compute_upload_hash([uploaded_files[i] for i in positions]) for account, positions in accounts.items()}
+    results, pending = {}, {}
+    for account, account_key in account_keys.items():
+        cached = cache.get((account_key, 'account'))
+        if cached is not None:
+            df, stats = cached
+            results[account] = {'account': account, 'df': df, 'stats': stats, 'errors': []}
+        elif account_key not in pending:
+            pending[account_key] = [(uploaded_files[i].name, uploaded_files[i].getvalue()) for i in accounts[account]]
+    if pending:
+        job_key = (hashlib.sha256('|'.join(sorted(pending)).encode()).hexdigest(), 'accounts')
+        processed = run_in_background(job_key, process_accounts_job, pending, max_workers, files_total=sum(len(files) for files in pending.values()), timer=timer)
+        cached_all = True
+        for account, account_key in account_keys.items():
+            if account in results:
+                continue
+            result = processed[account_key]
+            results[account] = {**result, 'account': account}
+            # 一部のファイルが失敗した口座は、修正後の再アップロードに備えてキャッシュしない
+            cached_all &= not result['errors'] and cache.put((account_key, 'account'), result['df'], result['stats'])
+        if cached_all:
+            get_job_registry().discard(job_key)
+    return {account: results[account] for account in accounts}
+
+def show_account_comparison(uploaded_files, timer):
+    """ファイル（または口座名でまとめたファイル）ごとに別の口座として加工し、要約統計量と累積損益の推移を比較表示する関数"""
+    st.markdown('<div class="section-container">', unsafe_allow_html=True)
+    st.markdown('<h2 class="section-header">👥 口座別の比較</h2>', unsafe_allow_html=True)
+    file_names = [uploaded_file.name for uploaded_file in uploaded_files]
+    st.caption("ファイルごとに口座名を指定します。同じ口座名のファイルは1つの口座にまとめ、累積損益・ドローダウンは口座ごとに計算します。")
+    assignment_key = hashlib.sha256('\n'.join(file_names).encode()).hexdigest()[:12]
+    assignment = st.data_editor(
+        pd.DataFrame({'ファイル': file_names, '口座': [default_account_name(name) for name in file_names]}),
+        disabled=['ファイル'], hide_index=True, use_container_width=True,
+        key=f"account_assignment_{assignment_key}"
+    )
+    accounts = group_files_by_account(file_names, assignment['口座'].tolist())
+    workers = st.sidebar.number_input(
+        "⚙️ 並列処理数", min_value=1, max_value=max(os.cpu_count() or 1, 1),
+        value=min(len(accounts), os.cpu_count() or 1),
+        help="口座ごとの読み込み・加工・要約統計量の計算を、指定した数のワーカーで並列に行います。"
+    )
+    with timer.stage('process_accounts') as record:
+        results = get_account_results(uploaded_files, accounts, int(workers), timer)
+        record['rows'] = sum(len(result['df']) for result in results.values() if result['df'] is not None)
+    errors = [(f"{account} / {name}", e) for account, result in results.items() for name, e in result['errors']]
+    show_file_errors(errors, len(uploaded_files))
+
+    with timer.stage('compare_accounts', len(results)):
+        comparison = compare_accounts(results)
+    st.markdown('<h3 class="section-header">要約統計量</h3>', unsafe_allow_html=True)
+    yen = '¥{:,.0f}'
+    st.dataframe(
+        comparison.style.format({
+            '総取引数': '{:,}', '総損益': yen, '勝率': '{:.2%}', 'リスク・リワード比率': '{:.2f}', '平均利益': yen,
+            '平均損失': yen, '最大連勝数': '{:,}', '最大連敗数': '{:,}', '最大ドローダウン': yen, '月間平均利益': yen,
+        }, na_rep='N/A'),
+        use_container_width=True, hide_index=True
+    )
+    st.download_button("比較表をCSV形式でダウンロード", comparison.to_csv(index=False).encode('utf-8-sig'), file_name="account_comparison.csv", mime="text/csv")
+
+    st.markdown('<h3 class="section-header">累積損益の推移</h3>', unsafe_allow_html=True)
+    x_axis = st.radio("横軸", ["日付", "取引数"], horizontal=True, help="取引数にすると、期間の異なる口座を1件目の取引から揃えて比べられます。")
+    curves = {account: result['df'] for account, result in results.items() if result['df'] is not None}
+    with timer.stage('equity_comparison', sum(len(df) for df in curves.values())):
+        chart = build_equity_comparison_chart(curves, by_trade=x_axis == "取引数")
+    if chart is None:
+        st.info("表示できる口座がありません。")
+    else:
+        st.altair_chart(chart, use_container_width=True)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+@st.cache_resource
+def get_trade_store(account):
+    """口座ごとの取引データストアを返す関数"""
+    return TradeStore(account, TRADE_STORE_DIR)
+
+def ingest_into_store(uploaded_files, upload_hash, account, timer):
+    """アップロードを口座の取引データストアに差分追記し、その口座の保存済みの全取引を返す関数"""
+    store = get_trade_store(account)
+    cache = get_data_cache()
+    job_key = (upload_hash, 'store', store.account)
+    # 取り込んだアップロードのプレビューと件数は、処理の結果からキャッシュに移して表示する
+    ingested = cache.get(job_key)
+    if ingested is None and store.has_ingested(upload_hash) and get_job_registry().get(job_key) is None:
+        st.info("💡 このファイルは取り込み済みです。保存済みの取引データを読み込みます。")
+    else:
+        if ingested is None:
+            result = run_in_background(job_key, ingest_upload_job, snapshot_uploaded_files(uploaded_files), store, upload_hash, files_total=len(uploaded_files), timer=timer)
+            ingested = result['raw'], result['added'], result['duplicates']
+            if cache.put(job_key, *ingested):
+                get_job_registry().discard(job_key)
+        raw_df, added, duplicates = ingested
+        st.info("💡 データのプレビュー（加工前）")
+        show_paginated_dataframe(raw_df, upload_hash, 'raw', height=300)
+        st.success(f"🎉 新規取引 {added:,} 件を保存しました（重複 {duplicates:,} 件を除外）")
+
+    # 保存済みデータはストアのバージョンごとにキャッシュする
+    cache_key = ('store', store.account, store.version)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        df_cleaned = cached[0]
+    else:
+        df_cleaned = store.load()
+        if df_cleaned is None:
+            st.warning("⚠️ 取引データストアに保存済みの取引がありません。")
+            st.stop()
+        cache.put(cache_key, df_cleaned)
+    st.success(f"✅ 取引データストアから {len(df_cleaned):,} 件の取引を読み込みました！")
+    return df_cleaned, cache_key
+
+def filter_period(df_cleaned, dataset_key, period, start_date, end_date):
+    """取引日付順に並んだ加工済みデータから、期間内の行を二分探索で切り出す関数
+
+    「日付指定」以外のプリセット期間は、データセットごとに切り出し位置をキャッシュする。
+    """
+    if period == "日付指定":
+        lo, hi = period_bounds(df_cleaned['取引日付'], start_date, end_date)
+        return df_cleaned.iloc[lo:hi]
+    cache = get_data_cache()
+    cache_key = (dataset_key, 'period', start_date, end_date)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        lo, hi = cached[0]
+    else:
+        lo, hi = period_bounds(df_cleaned['取引日付'], start_date, end_date)
+        cache.put(cache_key, (lo, hi))
+    return df_cleaned.iloc[lo:hi]
+
+def get_chart_spec(graph, dataset_key, start_date, end_date, period_cube, filtered_df, zoom=None, resolution=DEFAULT_CHART_RESOLUTION):
+    """グラフのVega-Lite仕様を (データセット, 期間, グラフ名) ごとにキャッシュして返す関数。(仕様, キャッシュ利用の有無) を返す
+
+    取引ごとのグラフは、拡大範囲と解像度もキーに含める。
+    """
+    cache = get_data_cache()
+    cache_key = (dataset_key, 'chart', start_date, end_date, graph)
+    if graph in TRADE_LEVEL_GRAPHS:
+        cache_key += (zoom, resolution)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached[0], True
+    chart = build_chart(graph, period_cube, filtered_df, resolution)
+    spec = chart.to_dict() if chart is not None else None
+    cache.put(cache_key, spec)
+    return spec, False
+
+def get_rolling_metrics(filtered_df, dataset_key, start_date, end_date, window, group):
+    """移動指標を (データセット, 期間, 窓, 分割する列) ごとにキャッシュして返す関数"""
+    cache = get_data_cache()
+    cache_key = (dataset_key, 'rolling', start_date, end_date, window, group)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached[0]
+    metrics_df = rolling_metrics(filtered_df, window, group)
+    cache.put(cache_key, metrics_df)
+    return metrics_df
+
+def get_simulation(filtered_df, dataset_key, start_date, end_date, n_paths, n_trades):
+    """リスクシミュレーションの経路ごとの結果を (データセット, 期間, 経路数, 取引数) ごとにキャッシュして返す関数"""
+    cache = get_data_cache()
+    cache_key = (dataset_key, 'simulation', start_date, end_date, n_paths, n_trades)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached[0]
+    paths = simulate_trades(filtered_df['利益'].to_numpy(), filtered_df['結果(数値)'].to_numpy(), n_paths, n_trades)
+    cache.put(cache_key, paths)
+    return paths
+
+def get_segments(period_cube, dataset_key, start_date, end_date, min_trades, confidence, top_n, max_conditions):
+    """条件の組み合わせの検索結果を (データセット, 期間, 検索条件) ごとにキャッシュして返す関数"""
+    cache = get_data_cache()
+    cache_key = (dataset_key, 'segments', start_date, end_date, min_trades, confidence, top_n, max_conditions)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached[0]
+    segments = search_segments(period_cube, min_trades, confidence, top_n, max_conditions)
+    cache.put(cache_key, segments)
+    return segments
+
+def get_export_bytes(cache, df_cleaned, dataset_key, download_format, compress, timer):
+    """ダウンロード用のバイト列を作成し、(データセット, 形式, 圧縮の有無) ごとにキャッシュする関数
+
+    ダウンロードボタンが押されたときにスクリプトとは別のスレッドで呼ばれるため、キャッシュと計測用のタイマーは引数で受け取る。
+    """
+    with timer.stage(f"export:{download_format}{' (gzip)' if compress else ''}", len(df_cleaned)):
+        cache_key = (dataset_key, 'export', download_format, compress)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached[0]
+        data = export_trade_data(df_cleaned, download_format, compress)
+        cache.put(cache_key, data)
+        return data
+
+def get_report_bytes(cache, filtered_df, period_cube, dataset_key, start_date, end_date, graphs, report_format, timer):
+    """レポート（PDFかグラフ画像のZIP）を作成し、(データセット, 期間, グラフ, 形式) ごとにキャッシュする関数
+
+    ダウンロードボタンが押されたときにスクリプトとは別のスレッドで呼ばれるため、キャッシュと計測用のタイマーは引数で受け取る。
+    """
+    with timer.stage(f"report:{report_format}", len(filtered_df)):
+        cache_key = (dataset_key, 'report', start_date, end_date, tuple(graphs), report_format)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached[0]
+        period_label = f"{start_date:%Y-%m-%d}〜{end_date:%Y-%m-%d}"
+        data = build_report(filtered_df, period_cube, period_label, graphs, report_format)
+        cache.put(cache_key, data)
+        return data
+
+@st.cache_data(show_spinner=False)
+def get_report_font_error():
+    """レポート用の日本語フォントを読み込めない場合にエラーメッセージを返す関数（読み込めればNone）"""
+    try:
+        check_report_font()
+    except ReportError as e:
+        return str(e)
+    return None
+
+@st.cache_resource(show_spinner=False)
+def start_warm_up():
+    """ウォームアップをプロセスごとに1回だけ、バックグラウンドのスレッドで開始する関数"""
+    warmup_timer = StageTimer(enabled=instrumentation_enabled_by_env(), run_id='warmup', log=True)
+    thread = threading.Thread(target=warm_up, kwargs={'timer': warmup_timer}, daemon=True)
+    thread.start()
+    return thread
+
+def get_preview_info(df, dataset_key, view):
+    """プレビューの列の統計・絞り込みの選択肢・日付の範囲を、データセットごとに1回だけ計算する関数"""
+    cache = get_data_cache()
+    cache_key = (dataset_key, 'preview', view)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+    summary = column_summary(df)
+    options = {column: filter_values(df, column) for column in PREVIEW_FILTER_COLUMNS if column in df.columns}
+    date_bounds = None
+    if PREVIEW_DATE_COLUMN in df.columns and not df.empty:
+        date_bounds = (df[PREVIEW_DATE_COLUMN].min().date(), df[PREVIEW_DATE_COLUMN].max().date())
+    cache.put(cache_key, summary, options, date_bounds)
+    return summary, options, date_bounds
+
+def show_paginated_dataframe(df, dataset_key, view, height='auto'):
+    """データフレームを1ページ分ずつ表示する関数。絞り込み・並べ替えはサーバー側で行い、表示中のページだけを送る
+
+    絞り込み・並べ替えの結果（行の位置）は条件ごとに、列の統計はデータセットごとにキャッシュする。
+    """
+    cache = get_data_cache()
+    summary, options, date_bounds = get_preview_info(df, dataset_key, view)
+    filters, date_range = {}, None
+    with st.expander("🔎 絞り込み・並べ替え"):
+        if options:
+            for col, (column, values) in zip(st.columns(len(options)), options.items()):
+                with col:
+                    filters[column] = tuple(st.multiselect(column, values, key=f"{view}_filter_{column}"))
+        if date_bounds is not None and date_bounds[0] < date_bounds[1]:
+            selected = st.slider(PREVIEW_DATE_COLUMN, min_value=date_bounds[0], max_value=date_bounds[1], value=date_bounds, key=f"{view}_dates")
+            if selected != date_bounds:
+                date_range = (
+                    pd.Timestamp(selected[0], tz='Asia/Tokyo'),
+                    pd.Timestamp(selected[1], tz='Asia/Tokyo').replace(hour=23, minute=59, second=59, microsecond=999999)
+                )
+        col_sort, col_order = st.columns(2)
+        with col_sort:
+            sort_column = st.selectbox("並べ替える列", [None] + list(df.columns), format_func=lambda column: "（並べ替えなし）" if column is None else column, key=f"{view}_sort")
+        with col_order:
+            ascending = st.toggle("昇順", value=True, key=f"{view}_ascending")
+
+    conditions = (tuple((column, values) for column, values in filters.items() if values), date_range, sort_column, ascending if sort_column else None)
+    positions = None
+    if any(conditions[:3]):
+        cache_key = (dataset_key, 'preview', view, conditions)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            positions = cached[0]
+        else:
+            positions = preview_positions(df, dict(conditions[0]), date_range, sort_column, ascending)
+            cache.put(cache_key, positions)
+
+    total = len(df) if positions is None else len(positions)
+    col_size, col_page = st.columns(2)
+    with col_size:
+        page_size = st.selectbox("1ページの行数", PREVIEW_PAGE_SIZES, index=PREVIEW_PAGE_SIZES.index(DEFAULT_PREVIEW_PAGE_SIZE), key=f"{view}_page_size")
+    pages = max(1, -(-total // page_size))
+    with col_page:
+        page = min(int(st.number_input(f"ページ（全 {pages:,} ページ）", min_value=1, value=1, step=1, key=f"{view}_page")), pages)
+    start = (page - 1) * page_size
+    matched = f"（全 {len(df):,} 行から絞り込み）" if positions is not None and total != len(df) else ""
+    st.caption(f"{total:,} 行中 {min(start + 1, total):,}〜{min(start + page_size, total):,} 行目を表示{matched}")
+    st.dataframe(preview_page(df, positions, page - 1, page_size), use_container_width=True, height=height)
+    with st.expander("📋 列の統計"):
+        st.caption(f"全 {len(df):,} 行 / {len(df.columns)} 列")
+        st.dataframe(summary, use_container_width=True, hide_index=True)
+
+def show_stage_timings(timer, export_stages):
+    """処理段階ごとの所要時間・行数・メモリ増減を表で表示する関数。ダウンロード時の計測は直近5件を表示する"""
+    records = timer.stages + export_stages[-5:]
+    if not records:
+        return
+    timings = pd.DataFrame({
+        '段階': [record['stage'] for record in records],
+        '時間 (ms)': [record['seconds'] * 1000 for record in records],
+        '行数': [record['rows'] for record in records],
+        'メモリ増減 (MB)': [record['memory_delta_mb'] for record in records],
+    })
+    st.caption(f"今回の実行: 合計 {timer.total_seconds() * 1000:,.0f} ms（{len(timer.stages)} 段階）")
+    st.dataframe(
+        timings.style.format({'時間 (ms)': '{:,.1f}', '行数': '{:,.0f}', 'メモリ増減 (MB)': '{:+,.1f}'}, na_rep='-'),
+        use_container_width=True, hide_index=True
+    )
+
+def get_rollup(df_cleaned, dataset_key):
+    """データセットごとの集計キューブをキャッシュから取得し、なければ作成する関数"""
+    cache = get_data_cache()
+    cache_key = (dataset_key, 'rollup')
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached[0]
+    cube = build_rollup(df_cleaned)
+    cache.put(cache_key, cube)
+    return cube
 
 # --- メインロジック ---
-def process_uploaded_files(uploaded_files):
-    """アップロードされたファイルを処理するメイン関数"""
+def process_uploaded_files(uploaded_files, timer):
+    """アップロードされたファイルを処理し、(加工済みデータ, データセットのキー) を返すメイン関数"""
     try:
         if not uploaded_files:
             st.warning("⚠️ CSVファイルをアップロードしてください。")
             st.stop()
-        dfs = []
-        for uploaded_file in uploaded_files:
-            df = pd.read_csv(uploaded_file)
-            dfs.append(df)
-        combined_df = pd.concat(dfs, ignore_index=True)
+        use_store = st.sidebar.checkbox(
+            "💽 取引データストアに蓄積する", value=False,
+            help="アップロードを口座ごとの月単位のParquetストアに追記し、取引番号が重複する取引を除外して、その口座にこれまでに保存した全取引を分析します。"
+        )
+        if use_store:
+            store_account = st.sidebar.text_input(
+                "🏦 口座名", value=default_account_name(uploaded_files[0].name),
+                help="取引データストアは口座ごとに分かれます。同じ口座のエクスポートは同じ口座名で取り込んでください。"
+            )
+            try:
+                store_account = validate_account_name(store_account)
+            except ValueError as e:
+                st.error(str(e))
+                st.stop()
+            with timer.stage('store_ingest') as record:
+                df_cleaned, cache_key = ingest_into_store(uploaded_files, compute_upload_hash(uploaded_files), store_account, timer)
+                record['rows'] = len(df_cleaned)
+            return df_cleaned, cache_key
+        total_bytes = sum(uploaded_file.size for uploaded_file in uploaded_files)
+        use_streaming = st.sidebar.checkbox(
+            "📦 ストリーミング読み込み（大容量ファイル向け）", value=total_bytes >= STREAMING_THRESHOLD_BYTES,
+            help="CSVをチャンク単位で読み込んで加工し、メモリ使用量を抑えます。プレビューは先頭部分のみ表示されます。"
+        )
+        cache = get_data_cache()
+        with timer.stage('upload_hash'):
+            cache_key = compute_upload_hash(uploaded_files)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            combined_df, df_cleaned = cached
+        else:
+            # 読み込み・加工はバックグラウンドで実行し、実行中は進捗を表示する
+            if use_streaming:
+                job_key = (cache_key, 'stream')
+                result = run_in_background(job_key, stream_upload_job, snapshot_uploaded_files(uploaded_files), files_total=len(uploaded_files), timer=timer)
+            else:
+                parse_workers = st.sidebar.number_input(
+                    "⚙️ 並列処理数", min_value=1, max_value=max(os.cpu_count() or 1, 1),
+                    value=min(len(uploaded_files), os.cpu_count() or 1),
+                    help="複数ファイルの読み込み・日付と金額の解析・列の検証を、指定した数のワーカーで並列に行います。"
+                )
+                job_key = (cache_key, 'parse')
+                result = run_in_background(job_key, parse_upload_job, snapshot_uploaded_files(uploaded_files), int(parse_workers), files_total=len(uploaded_files), timer=timer)
+            show_file_errors(result['errors'], len(uploaded_files))
+            combined_df, df_cleaned = result['raw'], result['df']
+            # 一部のファイルが失敗した場合は、修正後の再アップロードに備えてキャッシュしない
+            if not result['errors'] and cache.put(cache_key, combined_df, df_cleaned):
+                get_job_registry().discard(job_key)
         st.success("🎉 CSVファイルの読み込みに成功しました！")
         st.info("💡 データのプレビュー（加工前）")
-        st.dataframe(combined_df, use_container_width=True, height=300)  # スクロール対応
-
-        df_cleaned = process_trade_data(combined_df)
-        return df_cleaned
+        with timer.stage('render_preview', len(combined_df)):
+            show_paginated_dataframe(combined_df, cache_key, 'raw', height=300)
+        st.success("✅ データの加工が完了しました！")
+        return df_cleaned, cache_key
     except Exception as e:
         st.error(f"⚠️ 予期せぬエラーが発生しました: {e}")
         st.write("ファイル形式が正しくないか、CSVファイルに問題がある可能性があります。")
         st.stop()
 
-if uploaded_files:
-    df_cleaned = process_uploaded_files(uploaded_files)
+# --- 処理時間の計測 ---
+instrumentation_enabled = st.sidebar.toggle(
+    "⏱️ 処理時間を計測する", value=instrumentation_enabled_by_env(),
+    help="読み込み・加工・統計・グラフ・表示・エクスポートの段階ごとに、所要時間・行数・メモリ増減を計測して表示し、構造化ログに書き出します。"
+)
+timer = StageTimer(enabled=instrumentation_enabled, run_id=uuid.uuid4().hex[:12], log=True)
+# モジュールはプロセスで最初の実行時にだけ読み込まれるため、2回目以降の実行ではほぼ0秒になる
+timer.add('startup_imports', _import_seconds)
+# ダウンロードは別スレッドで後から作成されるため、セッションごとのタイマーに記録する
+export_timer = st.session_state.setdefault('export_timer', StageTimer(log=True))
+export_timer.enabled = instrumentation_enabled
+export_timer.run_id = timer.run_id
+timing_panel = st.sidebar.container()
+
+compare_mode = bool(uploaded_files) and st.sidebar.checkbox(
+    "👥 口座ごとに比較する", value=False,
+    help="ファイル（または口座名でまとめたファイル）ごとに別の口座として並列に加工し、要約統計量と累積損益の推移を並べて比較します。"
+)
+if compare_mode:
+    show_account_comparison(uploaded_files, timer)
+elif uploaded_files:
+    df_cleaned, dataset_key = process_uploaded_files(uploaded_files, timer)
+    with timer.stage('sort_by_date', len(df_cleaned)):
+        if not df_cleaned['取引日付'].is_monotonic_increasing:
+            # 期間フィルタの二分探索は取引日付順に並んでいることが前提
+            df_cleaned = df_cleaned.sort_values(by='取引日付', kind='stable')
+    data_cache = get_data_cache()
+    st.sidebar.caption(
+        f"💾 キャッシュ: ヒット {data_cache.hits} 回 / ミス {data_cache.misses} 回 / "
+        f"{len(data_cache)} 件 ({data_cache.current_bytes / 1024 ** 2:,.1f} MB / {data_cache.max_bytes / 1024 ** 2:,.0f} MB)"
+    )
     
+    if df_cleaned is not None and st.sidebar.checkbox("🧮 列ごとのメモリ使用量を表示"):
+        memory_report = memory_usage_report(df_cleaned)
+        total_before, total_after = memory_report['従来の型 (MB)'].sum(), memory_report['現在 (MB)'].sum()
+        st.sidebar.caption(f"加工済みデータ: {total_after:,.1f} MB（従来の型では {total_before:,.1f} MB、{total_before / max(total_after, 1e-9):.1f}倍）")
+        st.sidebar.dataframe(
+            memory_report.style.format({'従来の型 (MB)': '{:,.2f}', '現在 (MB)': '{:,.2f}', '削減率': '{:.0%}'}),
+            use_container_width=True, hide_index=True
+        )
+
     if df_cleaned is not None:
         # 期間フィルタ
         st.markdown('<div class="section-container">', unsafe_allow_html=True)
@@ -325,7 +847,8 @@ if uploaded_files:
             st.error("⚠️ 開始日は終了日より前でなければなりません。")
             st.stop()
         
-        filtered_df = df_cleaned[(df_cleaned['取引日付'] >= start_date) & (df_cleaned['取引日付'] <= end_date)]
+        with timer.stage('filter_period', len(df_cleaned)):
+            filtered_df = filter_period(df_cleaned, dataset_key, period, start_date, end_date)
         if filtered_df.empty:
             st.warning("⚠️ 選択した期間にデータがありません。別の期間を選択してください。")
             st.stop()
@@ -333,7 +856,16 @@ if uploaded_files:
         st.markdown('</div>', unsafe_allow_html=True)
         
         # --- 統計データ計算 ---
-        stats = generate_summary_stats(filtered_df)
+        with timer.stage('summary_stats', len(filtered_df)):
+            stats = generate_summary_stats(filtered_df)
+        # 集計表とグラフは、期間で切り出した集計キューブから作る
+        with timer.stage('rollup', len(df_cleaned)):
+            period_cube = slice_rollup(get_rollup(df_cleaned, dataset_key), start_date, end_date)
+            by_pair = rollup_by(period_cube, '取引銘柄')
+            by_direction = rollup_by(period_cube, 'HIGH/LOW')
+            by_weekday = rollup_by(period_cube, '曜日')
+            by_time_band = rollup_by(period_cube, '時間帯')
+            by_duration = rollup_by(period_cube, '取引時間')
         
         # --- 概要データ表示セクション ---
         st.markdown('<div class="section-container">', unsafe_allow_html=True)
@@ -359,237 +891,205 @@ if uploaded_files:
         
         # 詳細統計データを直接表示
         st.markdown('<h3 class="section-header">通貨ペア別総損益</h3>', unsafe_allow_html=True)
-        pair_profit = filtered_df.groupby('取引銘柄')['利益'].sum().sort_values(ascending=False).reset_index().rename(columns={'取引銘柄': '通貨ペア', '利益': '総損益'})
+        pair_profit = by_pair['損益'].sort_values(ascending=False).reset_index().rename(columns={'取引銘柄': '通貨ペア', '損益': '総損益'})
         st.dataframe(pair_profit, use_container_width=True)
 
         st.markdown('<h3 class="section-header">時間帯別・曜日別勝率</h3>', unsafe_allow_html=True)
         col_time, col_weekday = st.columns(2)
         with col_time:
             st.write("**時間帯別勝率**")
-            time_win_rate = filtered_df.groupby('時間帯')['結果(数値)'].mean().reindex(['午前', '午後', '夜', '深夜'], fill_value=0).reset_index().rename(columns={'時間帯': '時間帯', '結果(数値)': '勝率'})
+            time_win_rate = by_time_band['勝率'].reindex(['午前', '午後', '夜', '深夜'], fill_value=0).reset_index()
             st.dataframe(time_win_rate.style.format({'勝率': '{:.2%}'}), use_container_width=True)
         with col_weekday:
             st.write("**曜日別勝率**")
             weekday_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-            weekday_win_rate = filtered_df.groupby('曜日')['結果(数値)'].mean().reindex(weekday_order, fill_value=0).reset_index().rename(columns={'曜日': '曜日', '結果(数値)': '勝率'})
+            weekday_win_rate = by_weekday['勝率'].reindex(weekday_order, fill_value=0).reset_index()
             st.dataframe(weekday_win_rate.style.format({'勝率': '{:.2%}'}), use_container_width=True)
 
         st.markdown('</div>', unsafe_allow_html=True)
+
+        # --- リスクシミュレーションセクション ---
+        if st.checkbox("🎲 リスクシミュレーションを表示する") and not filtered_df.empty:
+            st.markdown('<div class="section-container">', unsafe_allow_html=True)
+            st.markdown('<h2 class="section-header">🎲 リスクシミュレーション</h2>', unsafe_allow_html=True)
+            st.caption("期間内の取引（利益と勝敗の組）を復元抽出で並べ直した経路を多数作り、最終損益・最大ドローダウン・最大連敗数のばらつきと、資金が尽きる確率を求めます。")
+            col_paths, col_trades, col_bankroll = st.columns(3)
+            with col_paths:
+                n_paths = st.selectbox("経路数", SIMULATION_PATH_OPTIONS, index=SIMULATION_PATH_OPTIONS.index(DEFAULT_SIMULATION_PATHS))
+            with col_trades:
+                n_trades = int(st.number_input("1経路あたりの取引数", min_value=1, max_value=SIMULATION_MAX_TRADES, value=min(len(filtered_df), SIMULATION_MAX_TRADES), step=100))
+            with col_bankroll:
+                bankroll = int(st.number_input("資金 (¥)", min_value=1, value=DEFAULT_BANKROLL, step=10_000))
+            with timer.stage('risk_simulation', n_paths * n_trades):
+                with st.spinner(f"{n_paths:,}経路 × {n_trades:,}取引をシミュレーションしています…"):
+                    paths = get_simulation(filtered_df, dataset_key, start_date, end_date, n_paths, n_trades)
+            summary = summarize_simulation(paths)
+            col_ruin, col_final, col_drawdown, col_streak = st.columns(4)
+            with col_ruin: st.metric("破産確率", f"{risk_of_ruin(paths, bankroll):.2%}", help="途中で累積損失が資金以上になった経路の割合")
+            with col_final: st.metric("最終損益（中央値）", f"¥{summary.loc['最終損益', '50%点']:,.0f}")
+            with col_drawdown: st.metric("最大ドローダウン（95%点）", f"¥{summary.loc['最大ドローダウン', '95%点']:,.0f}")
+            with col_streak: st.metric("最大連敗数（95%点）", f"{summary.loc['最大連敗数', '95%点']:.0f} 回")
+            st.dataframe(summary.style.format('{:,.0f}'), use_container_width=True)
+            # 経路の取引数が実際と同じ場合だけ、実際の値を分布に重ねて表示する
+            actual = n_trades == len(filtered_df)
+            col_final_chart, col_drawdown_chart, col_streak_chart = st.columns(3)
+            with col_final_chart:
+                st.altair_chart(build_distribution_chart(paths['最終損益'], '最終損益の分布', '最終損益 (¥)', reference=stats['total_profit'] if actual else None), use_container_width=True)
+            with col_drawdown_chart:
+                st.altair_chart(build_distribution_chart(paths['最大ドローダウン'], '最大ドローダウンの分布', '最大ドローダウン (¥)', reference=int(filtered_df['ドローダウン'].max()) if actual else None), use_container_width=True)
+            with col_streak_chart:
+                streak_bins = range(int(paths['最大連敗数'].min()), int(paths['最大連敗数'].max()) + 2)
+                st.altair_chart(build_distribution_chart(paths['最大連敗数'], '最大連敗数の分布', '最大連敗数', bins=streak_bins, reference=stats['max_losses'] if actual else None), use_container_width=True)
+            st.markdown('</div>', unsafe_allow_html=True)
         
         download_filename = st.text_input("ダウンロードするファイル名を入力してください", "processed_trade_data")
         show_chart = st.checkbox("📈 グラフを表示する")
+        show_rolling = st.checkbox("📉 移動指標の推移を表示する")
+        show_segments = st.checkbox("🧭 有望な条件の組み合わせを探す")
 
         # 分析グラフセクション
         if show_chart:
             st.markdown('<div class="section-container">', unsafe_allow_html=True)
             st.markdown('<h2 class="section-header">📊 取引結果の分析グラフ</h2>', unsafe_allow_html=True)
             
-            graph_options = [
-                '全体勝率', '取引方向別勝率', '取引方向別収益', '通貨ペア別勝率', '通貨ペア別収益',
-                '通貨ペア・取引方向別勝率ヒートマップ', '日時勝率推移', '累積利益/損失推移',
-                '曜日別勝率', '曜日別収益', '時間帯別勝率', '時間帯別収益', '時間帯別勝率ヒートマップ',
-                '取引ごとの利益/損失', '取引時間別勝率'
-            ]
-            
-            for graph in graph_options:
+            selected_graphs = st.multiselect("表示するグラフを選択してください", GRAPH_OPTIONS, default=GRAPH_OPTIONS[:1])
+            # 取引ごとのグラフは解像度に合わせて間引き、拡大した範囲では取引単位の詳細まで表示する
+            chart_resolution, zoom, zoom_df = DEFAULT_CHART_RESOLUTION, None, filtered_df
+            if any(graph in TRADE_LEVEL_GRAPHS for graph in selected_graphs) and not filtered_df.empty:
+                chart_resolution = st.select_slider("📐 取引ごとのグラフの解像度（横方向の点数。グラフの横幅に合わせて選択）", options=CHART_RESOLUTION_OPTIONS, value=DEFAULT_CHART_RESOLUTION)
+                first_day = filtered_df['取引日付'].iloc[0].date()
+                last_day = filtered_df['取引日付'].iloc[-1].date()
+                if first_day < last_day:
+                    zoom_range = st.slider("🔍 取引ごとのグラフで拡大表示する期間", min_value=first_day, max_value=last_day, value=(first_day, last_day))
+                    if zoom_range != (first_day, last_day):
+                        zoom = zoom_range
+                        zoom_start = pd.Timestamp(zoom_range[0], tz='Asia/Tokyo')
+                        zoom_end = pd.Timestamp(zoom_range[1], tz='Asia/Tokyo').replace(hour=23, minute=59, second=59, microsecond=999999)
+                        lo, hi = period_bounds(filtered_df['取引日付'], zoom_start, zoom_end)
+                        zoom_df = filtered_df.iloc[lo:hi]
+                st.caption(f"表示範囲の取引数: {len(zoom_df):,}件（解像度を超える場合は間引いて表示し、期間を拡大すると取引ごとに表示します）")
+            chart_timings = []
+            for graph in selected_graphs:
                 st.subheader(graph)
-                if graph == '全体勝率':
-                    result_counts = filtered_df['結果'].value_counts().reindex(['WIN', 'LOSE'], fill_value=0).reset_index()
-                    result_counts.columns = ['結果', '取引数']
-                    chart_pie = create_chart(
-                        result_counts, 'pie', '結果', '取引数', '全体勝率',
-                        color_domain=['WIN', 'LOSE'], color_range=['#4CAF50', '#F44336'],
-                        tooltip=['結果', '取引数', alt.Tooltip('取引数', format=".1%")]
-                    )
-                    st.altair_chart(chart_pie, use_container_width=True)
-                
-                elif graph == '取引方向別勝率':
-                    direction_win_rate = filtered_df.groupby('HIGH/LOW')['結果(数値)'].mean().reindex(['HIGH', 'LOW'], fill_value=0).reset_index().rename(columns={'HIGH/LOW': '取引方向', '結果(数値)': '勝率'})
-                    chart_direction = create_chart(
-                        direction_win_rate, 'bar', '取引方向', '勝率', '取引方向別勝率',
-                        color=alt.Color('取引方向', scale=alt.Scale(domain=['HIGH', 'LOW'], range=['#4CAF50', '#F44336'])),
-                        format_y=".0%", tooltip=['取引方向', alt.Tooltip('勝率', format=".1%")]
-                    )
-                    st.altair_chart(chart_direction, use_container_width=True)
-                
-                elif graph == '取引方向別収益':
-                    direction_profit = filtered_df.groupby('HIGH/LOW')['利益'].sum().reindex(['HIGH', 'LOW'], fill_value=0).reset_index()
-                    chart_direction = create_chart(
-                        direction_profit, 'bar', 'HIGH/LOW', '利益', '取引方向別収益',
-                        color=alt.Color('HIGH/LOW', scale=alt.Scale(domain=['HIGH', 'LOW'], range=['#4CAF50', '#F44336'])),
-                        format_y="s", tooltip=['HIGH/LOW', alt.Tooltip('利益', format=",")]
-                    )
-                    st.altair_chart(chart_direction, use_container_width=True)
-                
-                elif graph == '通貨ペア別勝率':
-                    pair_win_rate = filtered_df.groupby('取引銘柄')['結果(数値)'].mean().sort_values(ascending=False).reset_index().rename(columns={'取引銘柄': '通貨ペア', '結果(数値)': '勝率'})
-                    chart_pair = create_chart(
-                        pair_win_rate, 'bar', '通貨ペア', '勝率', '通貨ペア別勝率',
-                        color=alt.Color('通貨ペア', scale=alt.Scale(scheme='category10')),
-                        format_y=".0%", tooltip=['通貨ペア', alt.Tooltip('勝率', format=".1%")]
-                    )
-                    st.altair_chart(chart_pair, use_container_width=True)
-                
-                elif graph == '通貨ペア別収益':
-                    pair_profit = filtered_df.groupby('取引銘柄')['利益'].sum().sort_values(ascending=False).reset_index().rename(columns={'取引銘柄': '通貨ペア'})
-                    chart_pair = create_chart(
-                        pair_profit, 'bar', '通貨ペア', '利益', '通貨ペア別収益',
-                        color=alt.Color('通貨ペア', scale=alt.Scale(scheme='category10')),
-                        format_y="s", tooltip=['通貨ペア', alt.Tooltip('利益', format=",")]
-                    )
-                    st.altair_chart(chart_pair, use_container_width=True)
-                
-                elif graph == '通貨ペア・取引方向別勝率ヒートマップ':
-                    heatmap_data = filtered_df.groupby(['取引銘柄', 'HIGH/LOW'])['結果(数値)'].mean().reset_index().rename(columns={'取引銘柄': '通貨ペア', 'HIGH/LOW': '取引方向', '結果(数値)': '勝率'})
-                    chart_heatmap_pair_direction = create_chart(
-                        heatmap_data, 'heatmap', '取引方向', '通貨ペア', '通貨ペア・取引方向別勝率ヒートマップ',
-                        sort_x=['HIGH', 'LOW'], color='勝率', scheme='redblue',
-                        tooltip=['通貨ペア', '取引方向', alt.Tooltip('勝率', format=".1%")]
-                    )
-                    st.altair_chart(chart_heatmap_pair_direction, use_container_width=True)
-                
-                elif graph == '日時勝率推移':
-                    daily_win_rate = filtered_df.groupby(filtered_df['取引日付'].dt.date)['結果(数値)'].mean().reset_index().rename(columns={'取引日付': '日付', '結果(数値)': '勝率'})
-                    daily_win_rate['日付'] = daily_win_rate['日付'].astype(str)
-                    chart_line_daily = create_chart(
-                        daily_win_rate, 'line', '日付', '勝率', '日時勝率推移',
-                        format_y=".0%", tooltip=['日付', alt.Tooltip('勝率', format=".1%")]
-                    )
-                    st.altair_chart(chart_line_daily, use_container_width=True)
-                
-                elif graph == '累積利益/損失推移':
-                    filtered_df['取引日付(str)'] = filtered_df['取引日付'].astype(str)
-                    chart_cumulative = alt.Chart(filtered_df).mark_line().encode(
-                        x=alt.X('取引日付(str)', title='日付'),
-                        y=alt.Y('累積利益', title='累積損益 (¥)', axis=alt.Axis(format='s'), scale=alt.Scale(reverse=True)),
-                        tooltip=['取引日付(str)', '累積利益']
-                    ).properties(title='累積損益推移')
-                    st.altair_chart(chart_cumulative, use_container_width=True)
-                
-                elif graph == '曜日別勝率':
-                    weekday_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-                    weekday_win_rate = filtered_df.groupby('曜日')['結果(数値)'].mean().reindex(weekday_order, fill_value=0).reset_index().rename(columns={'曜日': '曜日', '結果(数値)': '勝率'})
-                    chart_weekday = create_chart(
-                        weekday_win_rate, 'bar', '曜日', '勝率', '曜日別勝率',
-                        sort_x=weekday_order,
-                        color=alt.Color('曜日', scale=alt.Scale(
-                            domain=['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'],
-                            range=['#4682B4', '#FF4500', '#00CED1', '#228B22', '#FFD700', '#8B4513', '#FFFF00']
-                        )),
-                        format_y=".0%", tooltip=['曜日', alt.Tooltip('勝率', format=".1%")]
-                    )
-                    st.altair_chart(chart_weekday, use_container_width=True)
-                
-                elif graph == '曜日別収益':
-                    weekday_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-                    weekday_profit = filtered_df.groupby('曜日')['利益'].sum().reindex(weekday_order, fill_value=0).reset_index()
-                    chart_weekday = create_chart(
-                        weekday_profit, 'bar', '曜日', '利益', '曜日別収益',
-                        sort_x=weekday_order,
-                        color=alt.Color('曜日', scale=alt.Scale(
-                            domain=['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'],
-                            range=['#4682B4', '#FF4500', '#00CED1', '#228B22', '#FFD700', '#8B4513', '#FFFF00']
-                        )),
-                        format_y="s", tooltip=['曜日', alt.Tooltip('利益', format=",")]
-                    )
-                    st.altair_chart(chart_weekday, use_container_width=True)
-                
-                elif graph == '時間帯別勝率':
-                    time_order = ['午前', '午後', '夜', '深夜']
-                    time_win_rate = filtered_df.groupby('時間帯')['結果(数値)'].mean().reindex(time_order, fill_value=0).reset_index().rename(columns={'時間帯': '時間帯', '結果(数値)': '勝率'})
-                    chart_time = create_chart(
-                        time_win_rate, 'bar', '時間帯', '勝率', '時間帯別勝率',
-                        sort_x=time_order,
-                        color=alt.Color('時間帯', scale=alt.Scale(
-                            domain=['午前', '午後', '夜', '深夜'],
-                            range=['#FFA500', '#F44336', '#4CAF50', '#1E90FF']
-                        )),
-                        format_y=".0%", tooltip=['時間帯', alt.Tooltip('勝率', format=".1%")]
-                    )
-                    st.altair_chart(chart_time, use_container_width=True)
-                
-                elif graph == '時間帯別収益':
-                    time_order = ['午前', '午後', '夜', '深夜']
-                    time_profit = filtered_df.groupby('時間帯')['利益'].sum().reindex(time_order, fill_value=0).reset_index()
-                    chart_time = create_chart(
-                        time_profit, 'bar', '時間帯', '利益', '時間帯別収益',
-                        sort_x=time_order,
-                        color=alt.Color('時間帯', scale=alt.Scale(
-                            domain=['午前', '午後', '夜', '深夜'],
-                            range=['#FFA500', '#F44336', '#4CAF50', '#1E90FF']
-                        )),
-                        format_y="s", tooltip=['時間帯', alt.Tooltip('利益', format=",")]
-                    )
-                    st.altair_chart(chart_time, use_container_width=True)
-                
-                elif graph == '時間帯別勝率ヒートマップ':
-                    weekday_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-                    time_order = ['午前', '午後', '夜', '深夜']
-                    heatmap_data_time = filtered_df.groupby(['曜日', '時間帯'])['結果(数値)'].mean().reset_index().rename(columns={'結果(数値)': '勝率'})
-                    heatmap_data_time = heatmap_data_time.dropna(subset=['勝率'])  # データがない行を除外
-                    if heatmap_data_time.empty:
-                        st.warning("⚠️ 時間帯別勝率ヒートマップ用のデータがありません。")
+                with timer.stage(f'chart:{graph}', len(zoom_df) if graph in TRADE_LEVEL_GRAPHS else len(filtered_df)):
+                    started = time.perf_counter()
+                    if graph in TRADE_LEVEL_GRAPHS:
+                        spec, cached = get_chart_spec(graph, dataset_key, start_date, end_date, period_cube, zoom_df, zoom, chart_resolution)
                     else:
-                        chart_heatmap_time = create_chart(
-                            heatmap_data_time, 'heatmap', '時間帯', '曜日', '曜日・時間帯別勝率ヒートマップ',
-                            sort_x=time_order, sort_y=weekday_order, color='勝率', scheme='redblue',
-                            tooltip=['曜日', '時間帯', alt.Tooltip('勝率', format=".1%")]
-                        )
-                        st.altair_chart(chart_heatmap_time, use_container_width=True)
-                
-                elif graph == '取引ごとの利益/損失':
-                    filtered_df['取引番号(str)'] = filtered_df['取引番号'].astype(str)
-                    bar_chart = alt.Chart(filtered_df).mark_bar().encode(
-                        x=alt.X('取引番号(str)', axis=None, title='取引番号 (X軸を非表示)'),
-                        y=alt.Y('利益', title='利益/損失 (¥)', axis=alt.Axis(format='s')),
-                        color=alt.Color('結果', scale=alt.Scale(domain=['WIN', 'LOSE'], range=['#4CAF50', '#F44336'])),
-                        tooltip=[
-                            alt.Tooltip('取引番号', title='取引番号'),
-                            alt.Tooltip('取引日付', title='日付', format="%Y-%m-%d %H:%M:%S"),
-                            alt.Tooltip('利益', title='利益/損失', format=","),
-                            alt.Tooltip('結果', title='結果')
-                        ]
-                    ).properties(title='各取引の利益と損失').interactive()
-                    st.altair_chart(bar_chart, use_container_width=True)
-                
-                elif graph == '取引時間別勝率':
-                    time_order = ['15秒', '30秒', '60秒', '3分', '5分', 'その他']
-                    time_win_rate = filtered_df.groupby('取引時間')['結果(数値)'].mean().reindex(time_order, fill_value=0).reset_index().rename(columns={'取引時間': '取引時間', '結果(数値)': '勝率'})
-                    chart_time_win_rate = create_chart(
-                        time_win_rate, 'bar', '取引時間', '勝率', '取引時間別勝率',
-                        sort_x=time_order,
-                        color=alt.Color('取引時間', scale=alt.Scale(scheme='category10')),
-                        format_y=".0%", tooltip=['取引時間', alt.Tooltip('勝率', format=".1%")]
-                    )
-                    st.altair_chart(chart_time_win_rate, use_container_width=True)
-            
+                        spec, cached = get_chart_spec(graph, dataset_key, start_date, end_date, period_cube, filtered_df)
+                    elapsed = time.perf_counter() - started
+                    chart_timings.append({'グラフ': graph, '作成時間 (ms)': elapsed * 1000, 'キャッシュ': '✅' if cached else ''})
+                    if spec is None:
+                        st.warning(f"⚠️ {graph}用のデータがありません。")
+                    else:
+                        st.vega_lite_chart(spec, use_container_width=True)
+            if chart_timings:
+                with st.expander("⏱️ グラフごとの作成時間"):
+                    st.dataframe(pd.DataFrame(chart_timings).style.format({'作成時間 (ms)': '{:,.1f}'}), use_container_width=True, hide_index=True)
+            st.markdown('</div>', unsafe_allow_html=True)
+
+        # 移動指標セクション
+        if show_rolling and not filtered_df.empty:
+            st.markdown('<div class="section-container">', unsafe_allow_html=True)
+            st.markdown('<h2 class="section-header">📉 移動指標の推移</h2>', unsafe_allow_html=True)
+            window_labels = {f"直近{window}取引": window for window in TRADE_WINDOWS}
+            window_labels.update({f"直近{label}": window for label, window in TIME_WINDOWS.items()})
+            col_metric, col_window, col_group = st.columns(3)
+            with col_metric:
+                rolling_metric = st.selectbox("指標", ROLLING_METRICS)
+            with col_window:
+                window_label = st.selectbox("窓", list(window_labels), index=1)
+            with col_group:
+                rolling_group = st.selectbox("分割", [None] + METRIC_GROUP_COLUMNS, format_func=lambda column: "全体" if column is None else f"{column}別")
+            st.caption("ドローダウン期間・取引数は窓によらず、直前に累積損益のピークを付けてからの経過を表します。")
+            with timer.stage('rolling_metrics', len(filtered_df)):
+                metrics_df = get_rolling_metrics(filtered_df, dataset_key, start_date, end_date, window_labels[window_label], rolling_group)
+                title = f"{window_label}の{rolling_metric}" + ("" if rolling_group is None else f"・{rolling_group}別")
+                rolling_chart = build_rolling_chart(metrics_df, rolling_metric, title, rolling_group)
+            if rolling_chart is None:
+                st.warning(f"⚠️ {rolling_metric}を計算できる取引がありません。")
+            else:
+                st.altair_chart(rolling_chart, use_container_width=True)
             st.markdown('</div>', unsafe_allow_html=True)
         
+        # 条件の組み合わせの検索セクション
+        if show_segments and not filtered_df.empty:
+            st.markdown('<div class="section-container">', unsafe_allow_html=True)
+            st.markdown('<h2 class="section-header">🧭 有望な条件の組み合わせ</h2>', unsafe_allow_html=True)
+            st.caption(f"{'・'.join(SEGMENT_DIMENSIONS)}のすべての組み合わせ（「すべて」を含む）を、1取引あたりの損益が大きい順に表示します。")
+            col_min_trades, col_confidence, col_top, col_conditions = st.columns(4)
+            with col_min_trades:
+                min_trades = st.number_input("最小取引数", min_value=1, value=DEFAULT_MIN_SEGMENT_TRADES, help="取引数がこれより少ない組み合わせは、偶然の影響が大きいため除外します。")
+            with col_confidence:
+                confidence = st.selectbox("勝率の信頼水準", SEGMENT_CONFIDENCE_OPTIONS, index=SEGMENT_CONFIDENCE_OPTIONS.index(DEFAULT_SEGMENT_CONFIDENCE), format_func=lambda value: f"{value:.0%}")
+            with col_top:
+                top_n = st.selectbox("表示件数", SEGMENT_TOP_OPTIONS, index=1)
+            with col_conditions:
+                max_conditions = st.slider("最大条件数", min_value=1, max_value=len(SEGMENT_DIMENSIONS), value=len(SEGMENT_DIMENSIONS), help="値を指定する軸の数の上限。少なくすると、より大まかな条件の組み合わせだけを表示します。")
+            with timer.stage('segment_search', len(period_cube)):
+                segments = get_segments(period_cube, dataset_key, start_date, end_date, int(min_trades), confidence, top_n, max_conditions)
+            if segments.empty:
+                st.warning("⚠️ 最小取引数を満たす組み合わせがありません。最小取引数を小さくするか、期間を広げてください。")
+            else:
+                st.dataframe(
+                    segments.style.format({
+                        '取引数': '{:,}', '勝率': '{:.2%}', '勝率下限': '{:.2%}', '勝率上限': '{:.2%}', '損益': '¥{:,.0f}', '1取引あたり損益': '¥{:,.0f}',
+                    }),
+                    use_container_width=True, hide_index=True
+                )
+                st.caption(f"勝率下限・上限は{confidence:.0%}信頼区間（ウィルソン法）です。多くの組み合わせを比べているため、上位の組み合わせほど偶然よく見えている可能性があります。")
+            st.markdown('</div>', unsafe_allow_html=True)
+
         # --- ダウンロードセクション ---
         st.markdown('<div class="section-container">', unsafe_allow_html=True)
         st.markdown('<h2 class="section-header">⬇️ 加工済みデータのダウンロード</h2>', unsafe_allow_html=True)
         
-        download_format = st.selectbox("ダウンロード形式を選択してください", ["CSV", "Excel"])
-        if download_format == "CSV":
-            csv_buffer = io.StringIO()
-            df_cleaned.to_csv(csv_buffer, index=False)
+        download_format = st.selectbox("ダウンロード形式を選択してください", list(EXPORT_FORMATS))
+        compress = download_format == "CSV" and st.checkbox("🗜️ gzipで圧縮する")
+        extension, mime = GZIP_EXPORT_FORMAT if compress else EXPORT_FORMATS[download_format]
+        if download_format == "Excel" and len(df_cleaned) > EXCEL_MAX_ROWS:
+            st.warning(f"⚠️ Excelの1シートに書き込める行数（{EXCEL_MAX_ROWS:,}行）を超えています。CSVやParquet形式を選択してください。")
+        else:
+            # ファイルの内容はボタンが押されたときに作成し、データセットと形式ごとにキャッシュする
+            data_cache = get_data_cache()
             st.download_button(
-                label="CSV形式でダウンロード",
-                data=csv_buffer.getvalue(),
-                file_name=f"{download_filename}.csv",
-                mime="text/csv"
+                label=f"{download_format}形式でダウンロード",
+                data=lambda: get_export_bytes(data_cache, df_cleaned, dataset_key, download_format, compress, export_timer),
+                file_name=f"{download_filename}.{extension}",
+                mime=mime
             )
-        elif download_format == "Excel":
-            excel_buffer = io.BytesIO()
-            with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-                df_cleaned.to_excel(writer, index=False, sheet_name='加工データ')
+
+        st.markdown('<h3 class="section-header">📄 レポートのダウンロード</h3>', unsafe_allow_html=True)
+        col_report_format, col_report_graphs = st.columns([1, 3])
+        with col_report_format:
+            report_format = st.selectbox("レポートの形式", list(REPORT_FORMATS))
+        with col_report_graphs:
+            report_graphs = st.multiselect("レポートに含めるグラフ", GRAPH_OPTIONS, default=GRAPH_OPTIONS)
+        report_font_error = get_report_font_error() if report_format == 'PDF' else None
+        if report_font_error is not None:
+            st.warning(f"⚠️ {report_font_error}")
+        elif not report_graphs and report_format != 'PDF':
+            st.warning("⚠️ レポートに含めるグラフを選択してください。")
+        else:
+            # レポートはボタンが押されたときに作成し、データセット・期間・グラフ・形式ごとにキャッシュする
+            data_cache = get_data_cache()
+            report_extension, report_mime = REPORT_FORMATS[report_format]
             st.download_button(
-                label="Excel形式でダウンロード",
-                data=excel_buffer.getvalue(),
-                file_name=f"{download_filename}.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                label=f"{report_format}形式でレポートをダウンロード",
+                data=lambda: get_report_bytes(data_cache, filtered_df, period_cube, dataset_key, start_date, end_date, report_graphs, report_format, export_timer),
+                file_name=f"{download_filename}_report_{start_date:%Y%m%d}-{end_date:%Y%m%d}.{report_extension}",
+                mime=report_mime
             )
         
         st.markdown('</div>', unsafe_allow_html=True)
         st.info("データの加工とグラフ作成が完了しました。")
-        st.dataframe(df_cleaned, use_container_width=True)
+        with timer.stage('render_processed', len(df_cleaned)):
+            show_paginated_dataframe(df_cleaned, dataset_key, 'processed')
+
+if instrumentation_enabled:
+    with timing_panel.expander("⏱️ 処理時間の計測結果", expanded=True):
+        show_stage_timings(timer, export_timer.stages)
+
+# 最初の表示が終わってから、加工・グラフ作成の処理をバックグラウンドで1回実行しておく
+if warmup_enabled_by_env():
+    start_warm_up()
@@ -0,0 +1,51 @@
+"""口座別の比較（trade_accounts）のテスト"""
+import numpy as np
+
+from trade_accounts import compare_accounts, iter_account_results, process_account, raise_for_errors
+from trade_benchmark import generate_trade_frame
+from trade_charts import build_equity_comparison_chart
+from trade_processing import TradeDataError
+
+
+def synthetic_csv(rows, seed):
+    rng = np.random.default_rng(seed)
+    offsets = np.sort(rng.integers(0, 86400, rows))
+    return generate_trade_frame(rows, rng, '2024-01-01', 1, offsets).to_csv(index=False).encode('utf-8')
+
+def raise_for_errors_of_account(account, files):
+    return raise_for_errors(process_account(account, files))
+
+
+def test_header_only_account_is_reported_as_error():
+    header_only = synthetic_csv(0, 0)
+    result = process_account('empty', [('empty.csv', header_only)])
+    assert result['df'] is None and result['stats'] is None
+    assert [name for name, _ in result['errors']] == ['empty.csv']
+    assert isinstance(result['errors'][0][1], TradeDataError)
+
+def test_comparison_skips_accounts_without_trades():
+    results = {
+        'empty': process_account('empty', [('empty.csv', synthetic_csv(0, 0))]),
+        'acct1': process_account('acct1', [('acct1.csv', synthetic_csv(200, 1))]),
+    }
+    comparison = compare_accounts(results)
+    assert comparison['口座'].tolist() == ['acct1']
+    assert comparison['総取引数'].tolist() == [200]
+
+def test_equity_comparison_chart_without_curves():
+    assert build_equity_comparison_chart({}) is None
+
+def test_process_account_reads_paths(tmp_path):
+    paths = []
+    for i in range(2):
+        path = tmp_path / f"{i}.csv"
+        path.write_bytes(synthetic_csv(100, i))
+        paths.append(str(path))
+    result = process_account('acct1', paths)
+    assert not result['errors'] and len(result['df']) == 200
+
+def test_account_results_capture_errors_per_account():
+    accounts = {'acct1': [('acct1.csv', synthetic_csv(100, 1))], 'bad': [('bad.csv', b'x,y\n1,2\n')]}
+    results = {item['account']: item for item in iter_account_results(raise_for_errors_of_account, accounts, workers=1)}
+    assert results['acct1']['error'] is None and len(results['acct1']['result']['df']) == 100
+    assert results['bad']['result'] is None and results['bad']['error'].startswith('bad.csv: ')
@@ -0,0 +1,9 @@
+"""ベンチマーク（trade_benchmark）の起動時の読み込み対象のテスト"""
+from trade_benchmark import DEFERRED_MODULES, startup_modules
+
+
+def test_startup_modules_follow_app_imports():
+    modules = startup_modules()
+    assert {'streamlit', 'trade_processing', 'trade_accounts', 'trade_segments', 'trade_report'} <= set(modules)
+    # 関数の中で読み込むライブラリは起動時の読み込みに含めない
+    assert not set(modules) & set(DEFERRED_MODULES)
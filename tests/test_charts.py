@@ -0,0 +1,72 @@
+"""グラフ（build_chart）のデータが、取引データを直接集計していた従来のグラフと同じ値になることを確かめるテスト"""
+import io
+
+import numpy as np
+import pytest
+
+from trade_benchmark import generate_trade_frame
+from trade_charts import GRAPH_OPTIONS, build_chart
+from trade_processing import read_trade_file, merge_trade_frames
+from trade_rollup import build_rollup
+
+WEEKDAY_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+TIME_ORDER = ['午前', '午後', '夜', '深夜']
+DURATION_ORDER = ['15秒', '30秒', '60秒', '3分', '5分', 'その他']
+
+
+@pytest.fixture(scope='module')
+def trades():
+    rng = np.random.default_rng(11)
+    offsets = np.sort(rng.integers(0, 30 * 86400, 5_000))
+    csv_bytes = generate_trade_frame(5_000, rng, '2024-01-01', 1, offsets).to_csv(index=False).encode('utf-8')
+    return merge_trade_frames([read_trade_file(io.BytesIO(csv_bytes))[1]])
+
+def chart_values(chart, key, value):
+    return dict(zip(chart.data[key].astype(str), chart.data[value]))
+
+def legacy_values(series):
+    return {str(key): value for key, value in series.items()}
+
+
+# (グラフ名, 従来の集計, グラフのデータでの軸の列, 値の列)
+LEGACY_CHARTS = [
+    ('取引方向別勝率', lambda df: df.groupby('HIGH/LOW', observed=True)['結果(数値)'].mean().reindex(['HIGH', 'LOW'], fill_value=0), '取引方向', '勝率'),
+    ('取引方向別収益', lambda df: df.groupby('HIGH/LOW', observed=True)['利益'].sum().reindex(['HIGH', 'LOW'], fill_value=0), 'HIGH/LOW', '利益'),
+    ('通貨ペア別勝率', lambda df: df.groupby('取引銘柄', observed=True)['結果(数値)'].mean(), '通貨ペア', '勝率'),
+    ('通貨ペア別収益', lambda df: df.groupby('取引銘柄', observed=True)['利益'].sum(), '通貨ペア', '利益'),
+    ('日時勝率推移', lambda df: df.groupby(df['取引日付'].dt.strftime('%Y-%m-%d'))['結果(数値)'].mean(), '日付', '勝率'),
+    ('曜日別勝率', lambda df: df.groupby('曜日', observed=True)['結果(数値)'].mean().reindex(WEEKDAY_ORDER, fill_value=0), '曜日', '勝率'),
+    ('曜日別収益', lambda df: df.groupby('曜日', observed=True)['利益'].sum().reindex(WEEKDAY_ORDER, fill_value=0), '曜日', '利益'),
+    ('時間帯別勝率', lambda df: df.groupby('時間帯', observed=True)['結果(数値)'].mean().reindex(TIME_ORDER, fill_value=0), '時間帯', '勝率'),
+    ('時間帯別収益', lambda df: df.groupby('時間帯', observed=True)['利益'].sum().reindex(TIME_ORDER, fill_value=0), '時間帯', '利益'),
+    ('取引時間別勝率', lambda df: df.groupby('取引時間', observed=True)['結果(数値)'].mean().reindex(DURATION_ORDER, fill_value=0), '取引時間', '勝率'),
+]
+
+@pytest.mark.parametrize('graph, legacy, key, value', LEGACY_CHARTS, ids=[graph for graph, *_ in LEGACY_CHARTS])
+def test_chart_data_matches_legacy_aggregation(trades, graph, legacy, key, value):
+    actual = chart_values(build_chart(graph, build_rollup(trades), trades), key, value)
+    expected = legacy_values(legacy(trades))
+    assert actual.keys() == expected.keys()
+    np.testing.assert_allclose([actual[k] for k in expected], list(expected.values()))
+
+def test_win_rate_pie_counts_wins_and_losses(trades):
+    actual = chart_values(build_chart('全体勝率', build_rollup(trades), trades), '結果', '取引数')
+    wins = int(trades['結果(数値)'].sum())
+    assert actual == {'WIN': wins, 'LOSE': len(trades) - wins}
+
+def test_heatmaps_match_legacy_aggregation(trades):
+    cube = build_rollup(trades)
+    pair_direction = build_chart('通貨ペア・取引方向別勝率ヒートマップ', cube, trades).data
+    expected = trades.groupby(['取引銘柄', 'HIGH/LOW'], observed=True)['結果(数値)'].mean()
+    np.testing.assert_allclose(pair_direction.set_index(['通貨ペア', '取引方向'])['勝率'].reindex(expected.index), expected)
+    weekday_time = build_chart('時間帯別勝率ヒートマップ', cube, trades).data
+    expected = trades.groupby(['曜日', '時間帯'], observed=True)['結果(数値)'].mean()
+    np.testing.assert_allclose(weekday_time.set_index(['曜日', '時間帯'])['勝率'].reindex(expected.index), expected)
+
+@pytest.mark.parametrize('graph', GRAPH_OPTIONS)
+def test_every_graph_builds_a_vega_lite_spec(trades, graph):
+    spec = build_chart(graph, build_rollup(trades), trades).to_dict()
+    assert spec['$schema'].startswith('https://vega.github.io/schema/vega-lite/')
+
+def test_empty_heatmap_is_skipped(trades):
+    assert build_chart('時間帯別勝率ヒートマップ', build_rollup(trades).iloc[:0], trades.iloc[:0]) is None
@@ -0,0 +1,53 @@
+"""コマンドラインツールの口座のまとめ方のテスト"""
+import json
+import os
+
+import numpy as np
+import pytest
+
+from trade_benchmark import generate_trade_frame
+from trade_cli import AccountNameConflictError, group_by_account, main
+
+
+def test_group_by_file_name():
+    accounts = group_by_account(['/data/a/acct1.csv', '/data/b/acct2.csv'])
+    assert accounts == {'acct1': ['/data/a/acct1.csv'], 'acct2': ['/data/b/acct2.csv']}
+
+def test_group_by_directory():
+    paths = ['/data/acct1/2024-01.csv', '/data/acct1/2024-02.csv', '/data/acct2/2024-01.csv']
+    accounts = group_by_account(paths, account_from_dir=True)
+    assert accounts == {'acct1': paths[:2], 'acct2': paths[2:]}
+
+def test_same_file_name_in_different_directories_conflicts():
+    with pytest.raises(AccountNameConflictError) as excinfo:
+        group_by_account(['/data/a/2024-01.csv', '/data/b/2024-01.csv', '/data/b/2024-02.csv'])
+    assert excinfo.value.conflicts == {'2024-01': ['/data/a/2024-01.csv', '/data/b/2024-01.csv']}
+
+def test_same_directory_name_in_different_parents_conflicts():
+    with pytest.raises(AccountNameConflictError) as excinfo:
+        group_by_account(['/x/acct1/2024-01.csv', '/y/acct1/2024-01.csv', '/y/acct1/2024-02.csv'], account_from_dir=True)
+    assert excinfo.value.conflicts == {'acct1': ['/x/acct1', '/y/acct1']}
+
+def test_main_reports_conflicts_without_writing(tmp_path, capsys):
+    for directory in ['a', 'b']:
+        os.makedirs(tmp_path / directory)
+        (tmp_path / directory / '2024-01.csv').write_text('', encoding='utf-8')
+    output_dir = tmp_path / 'processed'
+    assert main([str(tmp_path / 'a'), str(tmp_path / 'b'), '-o', str(output_dir)]) == 1
+    assert '2024-01' in capsys.readouterr().err
+    assert not output_dir.exists()
+
+def test_main_writes_accounts_and_reports_failures(tmp_path, capsys):
+    rng = np.random.default_rng(0)
+    offsets = np.sort(rng.integers(0, 86400, 200))
+    for account in ['acct1', 'acct2']:
+        os.makedirs(tmp_path / 'in' / account)
+        generate_trade_frame(200, rng, '2024-01-01', 1, offsets).to_csv(tmp_path / 'in' / account / '2024-01.csv', index=False)
+    os.makedirs(tmp_path / 'in' / 'broken')
+    (tmp_path / 'in' / 'broken' / '2024-01.csv').write_text('x,y\n1,2\n', encoding='utf-8')
+    output_dir = tmp_path / 'processed'
+    assert main([str(tmp_path / 'in'), '--account-from-dir', '-o', str(output_dir), '-w', '2']) == 1
+    assert 'broken' in capsys.readouterr().err
+    assert sorted(os.listdir(output_dir)) == ['acct1.json', 'acct1.parquet', 'acct2.json', 'acct2.parquet']
+    with open(output_dir / 'acct1.json', encoding='utf-8') as f:
+        assert json.load(f)['stats']['total_trades'] == 200
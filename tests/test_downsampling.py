@@ -0,0 +1,62 @@
+"""取引ごとのグラフの間引き（downsample_minmax / bucket_trade_profits）が、点数の上限と区間ごとの最小・最大を守ることを確かめるテスト"""
+import io
+
+import numpy as np
+import pytest
+
+from trade_benchmark import generate_trade_frame
+from trade_charts import (
+    CHART_MAX_POINTS, CHART_RESOLUTION_OPTIONS, TRADE_LEVEL_GRAPHS, _bucket_bounds, build_chart, bucket_trade_profits, downsample_minmax,
+)
+from trade_processing import read_trade_file, merge_trade_frames
+from trade_rollup import build_rollup
+
+RESOLUTIONS = CHART_RESOLUTION_OPTIONS + [CHART_MAX_POINTS, 10 * CHART_MAX_POINTS]
+
+
+@pytest.fixture(scope='module')
+def trades():
+    rng = np.random.default_rng(5)
+    offsets = np.sort(rng.integers(0, 90 * 86400, 30_000))
+    csv_bytes = generate_trade_frame(30_000, rng, '2024-01-01', 1, offsets).to_csv(index=False).encode('utf-8')
+    return merge_trade_frames([read_trade_file(io.BytesIO(csv_bytes))[1]]).reset_index(drop=True)
+
+
+@pytest.mark.parametrize('resolution', RESOLUTIONS)
+def test_downsample_keeps_bucket_extremes_within_limit(trades, resolution):
+    line_df = downsample_minmax(trades[['取引日付', '累積利益']], '累積利益', resolution)
+    assert len(line_df) <= CHART_MAX_POINTS
+    assert line_df.index.is_monotonic_increasing
+    assert line_df.index[0] == 0 and line_df.index[-1] == len(trades) - 1
+    values = trades['累積利益'].to_numpy()
+    kept = line_df.index.to_numpy()
+    # 区間ごとに、元のデータの最小値・最大値が残っている
+    _, starts, ends = _bucket_bounds(len(trades), min(resolution, (CHART_MAX_POINTS - 2) // 2))
+    for start, end in zip(starts, ends):
+        kept_values = values[kept[(kept >= start) & (kept < end)]]
+        assert kept_values.min() == values[start:end].min()
+        assert kept_values.max() == values[start:end].max()
+
+def test_downsample_leaves_small_frames_unchanged(trades):
+    small = trades[['取引日付', '累積利益']].iloc[:500]
+    assert downsample_minmax(small, '累積利益', 250) is small
+
+@pytest.mark.parametrize('resolution', RESOLUTIONS)
+def test_bucket_profits_match_brute_force_sums(trades, resolution):
+    bucket_df = bucket_trade_profits(trades, resolution)
+    assert len(bucket_df) <= CHART_MAX_POINTS
+    wins, losses = bucket_df[bucket_df['結果'] == 'WIN'], bucket_df[bucket_df['結果'] == 'LOSE']
+    assert wins['取引数'].sum() == len(trades)
+    profit = trades['利益'].to_numpy(dtype=np.int64)
+    win = trades['結果(数値)'].to_numpy() == 1
+    starts = wins['取引数'].cumsum().to_numpy() - wins['取引数'].to_numpy()
+    assert wins['利益'].tolist() == np.add.reduceat(np.where(win, profit, 0), starts).tolist()
+    assert losses['利益'].tolist() == np.add.reduceat(np.where(win, 0, profit), starts).tolist()
+    assert wins['勝数'].tolist() == np.add.reduceat(win.astype(np.int64), starts).tolist()
+    assert wins['純損益'].tolist() == np.add.reduceat(profit, starts).tolist()
+
+@pytest.mark.parametrize('graph', TRADE_LEVEL_GRAPHS)
+@pytest.mark.parametrize('resolution', RESOLUTIONS)
+def test_trade_level_charts_respect_point_limit(trades, graph, resolution):
+    chart = build_chart(graph, build_rollup(trades), trades, resolution)
+    assert len(chart.data) <= CHART_MAX_POINTS
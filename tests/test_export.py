@@ -0,0 +1,61 @@
+"""ダウンロード形式（trade_export）の書き出しと読み戻しのテスト"""
+import gzip
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import trade_export
+from trade_benchmark import generate_trade_frame
+from trade_export import EXCEL_MAX_ROWS, EXCEL_SHEET_NAME, export_csv, export_excel, export_trade_data, read_exported
+from trade_processing import PROCESSED_SCHEMA, read_trade_file, merge_trade_frames
+
+
+@pytest.fixture(scope='module')
+def trades():
+    rng = np.random.default_rng(13)
+    offsets = np.sort(rng.integers(0, 20 * 86400, 3_000))
+    csv_bytes = generate_trade_frame(3_000, rng, '2024-01-01', 1, offsets).to_csv(index=False).encode('utf-8')
+    return merge_trade_frames([read_trade_file(io.BytesIO(csv_bytes))[1]])
+
+
+@pytest.mark.parametrize('download_format', ['Parquet', 'Feather'])
+def test_columnar_round_trip_keeps_schema(trades, download_format):
+    restored = read_exported(io.BytesIO(export_trade_data(trades, download_format)), download_format)
+    assert restored.dtypes.to_dict() == PROCESSED_SCHEMA
+    pd.testing.assert_frame_equal(restored, trades.reset_index(drop=True))
+
+def test_csv_chunks_match_single_write(trades):
+    expected = trades.to_csv(index=False).encode('utf-8')
+    assert export_csv(trades, chunk_rows=700) == expected
+    assert gzip.decompress(export_csv(trades, compress=True, chunk_rows=700)) == expected
+
+def test_excel_writes_tokyo_wall_time(trades):
+    openpyxl = pytest.importorskip('openpyxl')
+    head = trades.iloc[:200]
+    sheet = openpyxl.load_workbook(io.BytesIO(export_excel(head, chunk_rows=30)), read_only=True)[EXCEL_SHEET_NAME]
+    rows = list(sheet.iter_rows(values_only=True))
+    assert list(rows[0]) == list(head.columns)
+    assert len(rows) == len(head) + 1
+    # タイムゾーン付きの日時は、日本時間の日時として書き込まれる
+    date_col = list(head.columns).index('取引日付')
+    written = pd.Series([row[date_col] for row in rows[1:]]).dt.round('s')
+    assert written.tolist() == head['取引日付'].dt.tz_localize(None).tolist()
+    profit_col = list(head.columns).index('利益')
+    assert [row[profit_col] for row in rows[1:]] == head['利益'].tolist()
+
+def test_excel_row_limit(monkeypatch):
+    with pytest.raises(ValueError):
+        export_excel(pd.DataFrame({'利益': np.zeros(EXCEL_MAX_ROWS + 1, dtype=np.int8)}))
+    # 上限ちょうどの行数は書き出せる（上限を小さくして確かめる）
+    monkeypatch.setattr(trade_export, 'EXCEL_MAX_ROWS', 10)
+    export_excel(pd.DataFrame({'利益': np.arange(10)}))
+    with pytest.raises(ValueError):
+        export_excel(pd.DataFrame({'利益': np.arange(11)}))
+
+def test_unknown_format_raises(trades):
+    with pytest.raises(ValueError):
+        export_trade_data(trades, 'JSON')
+    with pytest.raises(ValueError):
+        read_exported(io.BytesIO(b''), 'CSV')
@@ -0,0 +1,39 @@
+"""バックグラウンド処理（trade_jobs）と、そこから起動するプロセスプールのテスト"""
+import io
+
+import numpy as np
+
+from trade_benchmark import generate_trade_frame
+from trade_accounts import iter_account_results, process_account
+from trade_jobs import BackgroundJob
+from trade_processing import POOL_START_METHOD, parse_trade_files
+
+
+def synthetic_upload(name, rows, seed):
+    rng = np.random.default_rng(seed)
+    offsets = np.sort(rng.integers(0, 86400, rows))
+    upload = io.BytesIO(generate_trade_frame(rows, rng, '2024-01-01', seed * rows + 1, offsets).to_csv(index=False).encode('utf-8'))
+    upload.name = name
+    return upload
+
+
+def test_pools_do_not_fork():
+    # fork はスレッドの保持するロックごと複製するため、スレッドから起動するプロセスプールでは使わない
+    assert POOL_START_METHOD in ('forkserver', 'spawn')
+
+def test_parse_in_processes_from_background_thread():
+    uploads = [synthetic_upload(f"{i}.csv", 500, i) for i in range(3)]
+    job = BackgroundJob(lambda progress: parse_trade_files(uploads, max_workers=2, use_processes=True)).start()
+    assert job.wait(timeout=120)
+    assert job.error is None
+    assert [result['name'] for result in job.result] == ['0.csv', '1.csv', '2.csv']
+    assert all(result['error'] is None and len(result['df']) == 500 for result in job.result)
+
+def test_process_accounts_in_processes_from_background_thread():
+    accounts = {f"acct{i}": [(f"{i}.csv", synthetic_upload(f"{i}.csv", 300, i).getvalue())] for i in range(3)}
+    job = BackgroundJob(lambda progress: list(iter_account_results(process_account, accounts, workers=2))).start()
+    assert job.wait(timeout=120)
+    assert job.error is None
+    assert sorted(item['account'] for item in job.result) == ['acct0', 'acct1', 'acct2']
+    assert all(item['error'] is None for item in job.result)
+    assert all(not item['result']['errors'] and len(item['result']['df']) == 300 for item in job.result)
@@ -0,0 +1,77 @@
+"""移動指標（rolling_metrics）が、行ごとに窓の取引を直接集計した値と一致することを確かめるテスト"""
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from trade_benchmark import generate_trade_frame
+from trade_metrics import NS_PER_HOUR, rolling_metrics
+from trade_processing import read_trade_file, merge_trade_frames
+
+
+@pytest.fixture(scope='module')
+def trades():
+    rng = np.random.default_rng(23)
+    # 同じ秒の取引と、数日あく期間を含める
+    offsets = np.sort(np.concatenate([rng.integers(0, 2 * 86400, 500), rng.integers(5 * 86400, 6 * 86400, 300)]))
+    csv_bytes = generate_trade_frame(800, rng, '2024-01-01', 1, offsets).to_csv(index=False).encode('utf-8')
+    return merge_trade_frames([read_trade_file(io.BytesIO(csv_bytes))[1]])
+
+def brute_force_metrics(df, window, group=None):
+    # 取引日付順（groupを指定した場合はグループごと）に並べ、行ごとに窓の取引を取り出して集計する
+    keys = pd.Series(0, index=df.index) if group is None else df[group]
+    rows = []
+    for _, part in df.groupby(keys, observed=True, sort=False):
+        times = part['取引日付'].array.asi8
+        profits = part['利益'].to_numpy(dtype=np.int64)
+        wins = part['結果(数値)'].to_numpy()
+        cumulative = np.cumsum(profits)
+        is_peak = cumulative == np.maximum.accumulate(cumulative)
+        for i in range(len(part)):
+            if isinstance(window, int):
+                in_window = np.arange(max(0, i + 1 - window), i + 1)
+            else:
+                in_window = np.flatnonzero(times[:i + 1] > times[i] - pd.Timedelta(window).value)
+            p = profits[in_window]
+            gains, losses = p[p > 0], -p[p < 0]
+            last_peak = np.flatnonzero(is_peak[:i + 1])[-1]
+            rows.append({
+                'index': part.index[i],
+                '取引数': len(in_window),
+                '勝率': wins[in_window].mean(),
+                'プロフィットファクター': gains.sum() / losses.sum() if losses.sum() > 0 else np.nan,
+                'リスクリワード': gains.mean() / losses.mean() if len(gains) and len(losses) else np.nan,
+                'ドローダウン期間 (時間)': (times[i] - times[last_peak]) / NS_PER_HOUR,
+                'ドローダウン取引数': i - last_peak,
+            })
+    return pd.DataFrame(rows).set_index('index')
+
+
+@pytest.mark.parametrize('window', [20, 50, '1h', '1D'])
+@pytest.mark.parametrize('group', [None, '取引銘柄', 'HIGH/LOW'])
+def test_rolling_metrics_match_brute_force(trades, window, group):
+    actual = rolling_metrics(trades, window, group)
+    expected = brute_force_metrics(trades, window, group).loc[actual.index]
+    assert actual['取引数'].tolist() == expected['取引数'].tolist()
+    assert actual['ドローダウン取引数'].tolist() == expected['ドローダウン取引数'].tolist()
+    for col in ['勝率', 'プロフィットファクター', 'リスクリワード', 'ドローダウン期間 (時間)']:
+        np.testing.assert_allclose(actual[col].to_numpy(dtype=float), expected[col].to_numpy(dtype=float), equal_nan=True, err_msg=col)
+
+def test_rows_are_ordered_by_date_within_groups(trades):
+    result = rolling_metrics(trades, 50, '取引銘柄')
+    for _, part in result.groupby('取引銘柄', observed=True):
+        assert part['取引日付'].is_monotonic_increasing
+    assert sorted(result.index) == sorted(trades.index)
+
+def test_unsorted_input_gives_same_metrics(trades):
+    # 同じ時刻の取引は並べ替え後の順序が決まらないため、時刻の重複しない取引で比べる。
+    # グループの並びは入力に現れた順になるため、元の行のインデックスでそろえて比べる
+    unique = trades.drop_duplicates('取引日付')
+    expected = rolling_metrics(unique, '1D', 'HIGH/LOW')
+    actual = rolling_metrics(unique.sample(frac=1, random_state=0), '1D', 'HIGH/LOW')
+    pd.testing.assert_frame_equal(actual.sort_index(), expected.sort_index())
+
+def test_empty_frame(trades):
+    result = rolling_metrics(trades.iloc[:0], 20)
+    assert result.empty
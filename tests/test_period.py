@@ -0,0 +1,51 @@
+"""期間の切り出し（period_bounds）が、取引日付を直接比較した絞り込みと同じ行を返すことを確かめるテスト"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from trade_processing import period_bounds
+
+
+@pytest.fixture(scope='module')
+def timestamps():
+    rng = np.random.default_rng(3)
+    # 同じ時刻の取引と、日付の境界ちょうどの取引を含める
+    offsets = np.sort(np.concatenate([rng.integers(0, 10 * 86400, 500), np.arange(1, 10) * 86400, [86400 - 1] * 3]))
+    return pd.Series(pd.Timestamp('2024-03-01', tz='Asia/Tokyo') + pd.to_timedelta(offsets, unit='s'))
+
+def day_range(start_day, end_day):
+    # アプリと同じく、開始日の0時から終了日の23:59:59.999999までを期間とする
+    start = pd.Timestamp(start_day, tz='Asia/Tokyo')
+    end = pd.Timestamp(end_day, tz='Asia/Tokyo').replace(hour=23, minute=59, second=59, microsecond=999999)
+    return start, end
+
+def assert_matches_mask(timestamps, start, end):
+    lo, hi = period_bounds(timestamps, start, end)
+    expected = np.flatnonzero(((timestamps >= start) & (timestamps <= end)).to_numpy())
+    assert np.arange(lo, hi).tolist() == expected.tolist()
+    return lo, hi
+
+
+@pytest.mark.parametrize('start_day, end_day', [
+    ('2024-03-01', '2024-03-10'), ('2024-03-02', '2024-03-02'), ('2024-03-03', '2024-03-05'), ('2024-02-01', '2024-03-01'),
+])
+def test_period_bounds_match_mask(timestamps, start_day, end_day):
+    assert_matches_mask(timestamps, *day_range(start_day, end_day))
+
+def test_end_day_is_inclusive(timestamps):
+    # 終了日の23:59:59の取引と、翌日0時ちょうどの取引の境目で区切られる
+    lo, hi = assert_matches_mask(timestamps, *day_range('2024-03-01', '2024-03-01'))
+    assert timestamps.iloc[hi - 1] == pd.Timestamp('2024-03-01 23:59:59', tz='Asia/Tokyo')
+    assert timestamps.iloc[hi] == pd.Timestamp('2024-03-02', tz='Asia/Tokyo')
+
+def test_range_before_first_trade_is_empty(timestamps):
+    assert assert_matches_mask(timestamps, *day_range('2024-01-01', '2024-02-28')) == (0, 0)
+
+def test_range_after_last_trade_is_empty(timestamps):
+    assert assert_matches_mask(timestamps, *day_range('2024-04-01', '2024-04-30')) == (len(timestamps), len(timestamps))
+
+def test_reversed_range_is_empty(timestamps):
+    start, _ = day_range('2024-03-05', '2024-03-05')
+    _, end = day_range('2024-03-03', '2024-03-03')
+    lo, hi = period_bounds(timestamps, start, end)
+    assert len(timestamps.iloc[lo:hi]) == 0
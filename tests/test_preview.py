@@ -0,0 +1,77 @@
+"""データのプレビュー（trade_preview）の絞り込み・並べ替え・ページ分割のテスト"""
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from trade_benchmark import generate_trade_frame
+from trade_preview import column_summary, filter_values, preview_page, preview_positions
+from trade_processing import read_trade_file, merge_trade_frames
+
+
+@pytest.fixture(scope='module')
+def trades():
+    rng = np.random.default_rng(19)
+    offsets = np.sort(rng.integers(0, 10 * 86400, 2_345))
+    csv_bytes = generate_trade_frame(2_345, rng, '2024-01-01', 1, offsets).to_csv(index=False).encode('utf-8')
+    return merge_trade_frames([read_trade_file(io.BytesIO(csv_bytes))[1]])
+
+def collect_pages(df, positions, page_size):
+    pages = []
+    page = 0
+    while True:
+        rows = preview_page(df, positions, page, page_size)
+        if rows.empty:
+            return pages
+        pages.append(rows)
+        page += 1
+
+
+def test_without_conditions_pages_cover_all_rows(trades):
+    assert preview_positions(trades) is None
+    assert preview_positions(trades, {'取引銘柄': []}) is None  # 何も選んでいない絞り込みは条件にしない
+    pages = collect_pages(trades, None, 100)
+    assert [len(page) for page in pages] == [100] * 23 + [45]
+    pd.testing.assert_frame_equal(pd.concat(pages), trades)
+    assert preview_page(trades, None, 10_000, 100).empty
+
+def test_filters_match_direct_mask(trades):
+    pair = filter_values(trades, '取引銘柄')[0]
+    start = pd.Timestamp('2024-01-03', tz='Asia/Tokyo')
+    end = pd.Timestamp('2024-01-05', tz='Asia/Tokyo').replace(hour=23, minute=59, second=59, microsecond=999999)
+    filters = {'取引銘柄': [pair], 'HIGH/LOW': ['HIGH'], '結果(数値)': [1]}
+    positions = preview_positions(trades, filters, (start, end))
+    mask = ((trades['取引銘柄'] == pair) & (trades['HIGH/LOW'] == 'HIGH') & (trades['結果(数値)'] == 1)
+            & (trades['取引日付'] >= start) & (trades['取引日付'] <= end))
+    assert positions.tolist() == np.flatnonzero(mask.to_numpy()).tolist()
+    pages = collect_pages(trades, positions, 50)
+    pd.testing.assert_frame_equal(pd.concat(pages), trades[mask])
+    assert all(len(page) == 50 for page in pages[:-1]) and 0 < len(pages[-1]) <= 50
+
+def test_date_range_bounds_are_inclusive(trades):
+    first, last = trades['取引日付'].iloc[0], trades['取引日付'].iloc[-1]
+    assert len(preview_positions(trades, date_range=(first, last))) == len(trades)
+    assert preview_positions(trades, date_range=(last, last)).tolist() == np.flatnonzero((trades['取引日付'] == last).to_numpy()).tolist()
+    before = first - pd.Timedelta(days=1)
+    assert len(preview_positions(trades, date_range=(before, before))) == 0
+    assert collect_pages(trades, preview_positions(trades, date_range=(before, before)), 100) == []
+
+@pytest.mark.parametrize('ascending', [True, False])
+def test_sort_matches_stable_sort_values(trades, ascending):
+    filters = {'HIGH/LOW': ['LOW']}
+    positions = preview_positions(trades, filters, sort_column='利益', ascending=ascending)
+    expected = trades[trades['HIGH/LOW'] == 'LOW'].sort_values('利益', ascending=ascending, kind='stable')
+    pd.testing.assert_frame_equal(pd.concat(collect_pages(trades, positions, 100)), expected)
+
+def test_filter_values_follow_category_order(trades):
+    pairs = filter_values(trades, '取引銘柄')
+    assert pairs == [pair for pair in trades['取引銘柄'].cat.categories if pair in set(trades['取引銘柄'])]
+    assert filter_values(trades, '結果(数値)') == [0, 1]
+
+def test_column_summary_lists_every_column(trades):
+    summary = column_summary(trades)
+    assert summary['列'].tolist() == list(trades.columns)
+    assert (summary['件数'] == len(trades)).all()
+    row = summary.set_index('列').loc['利益']
+    assert row['最小値'] == str(trades['利益'].min()) and row['最大値'] == str(trades['利益'].max())
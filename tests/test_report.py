@@ -0,0 +1,63 @@
+"""レポート（trade_report）のフォントの確認・期間・画像のZIPのテスト"""
+import io
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from trade_benchmark import generate_trade_frame
+from trade_processing import read_trade_file, merge_trade_frames, generate_summary_stats
+from trade_report import ReportError, build_report, build_report_pdf, check_report_font, report_period
+from trade_rollup import build_rollup
+
+# リポジトリに同梱しているフォントファイル（中身のないプレースホルダー）
+SHIPPED_FONT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'NotoSerifJP-VariableFont_wght.ttf')
+
+
+@pytest.fixture(scope='module')
+def trades():
+    rng = np.random.default_rng(37)
+    offsets = np.sort(rng.integers(0, 14 * 86400, 1_000))
+    csv_bytes = generate_trade_frame(1_000, rng, '2024-01-01', 1, offsets).to_csv(index=False).encode('utf-8')
+    return merge_trade_frames([read_trade_file(io.BytesIO(csv_bytes))[1]])
+
+
+def test_shipped_placeholder_font_is_rejected():
+    with pytest.raises(ReportError):
+        check_report_font(SHIPPED_FONT)
+
+def test_missing_font_is_rejected(tmp_path):
+    with pytest.raises(ReportError):
+        check_report_font(str(tmp_path / 'missing.ttf'))
+
+def test_truetype_header_is_accepted(tmp_path):
+    font = tmp_path / 'font.ttf'
+    font.write_bytes(b'\x00\x01\x00\x00' + b'\x00' * 60)
+    check_report_font(str(font))
+
+def test_pdf_with_placeholder_font_raises_report_error(trades):
+    stats = generate_summary_stats(trades)
+    with pytest.raises(ReportError):
+        build_report_pdf('取引分析レポート', '2024-01-01〜2024-01-14', stats, [], [], font_path=SHIPPED_FONT)
+
+def test_default_period_ends_on_last_trade_day(trades):
+    start, end = report_period(trades, days=7)
+    last_day = trades['取引日付'].iloc[-1].date()
+    assert end == pd.Timestamp(last_day, tz='Asia/Tokyo').replace(hour=23, minute=59, second=59, microsecond=999999)
+    assert start == pd.Timestamp(last_day - pd.Timedelta(days=6), tz='Asia/Tokyo')
+    start, end = report_period(trades, start='2024-01-03', end='2024-01-05')
+    assert (start.date(), end.date()) == (pd.Timestamp('2024-01-03').date(), pd.Timestamp('2024-01-05').date())
+
+def test_empty_period_raises(trades):
+    with pytest.raises(ReportError):
+        build_report(trades.iloc[:0], build_rollup(trades).iloc[:0], '2023-01-01〜2023-01-07')
+
+def test_svg_archive_contains_selected_charts(trades):
+    graphs = ['全体勝率', '曜日別勝率']
+    archive = build_report(trades, build_rollup(trades), '2024-01-01〜2024-01-14', graphs, 'SVG (ZIP)', max_workers=1)
+    with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+        names = zf.namelist()
+        assert names == ['01_全体勝率.svg', '02_曜日別勝率.svg']
+        assert all(zf.read(name).lstrip().startswith(b'<svg') for name in names)
@@ -0,0 +1,58 @@
+"""集計キューブ（build_rollup / slice_rollup / rollup_by）が、取引データを直接集計した場合と同じ値になることを確かめるテスト"""
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from trade_benchmark import generate_trade_frame
+from trade_processing import read_trade_file, merge_trade_frames, period_bounds
+from trade_rollup import build_rollup, slice_rollup, rollup_by
+
+
+@pytest.fixture(scope='module')
+def trades():
+    rng = np.random.default_rng(7)
+    offsets = np.sort(rng.integers(0, 60 * 86400, 20_000))
+    csv_bytes = generate_trade_frame(20_000, rng, '2024-01-01', 1, offsets).to_csv(index=False).encode('utf-8')
+    return merge_trade_frames([read_trade_file(io.BytesIO(csv_bytes))[1]])
+
+def direct_rollup(df, keys):
+    # キューブ導入前のグラフと同じく、取引データを軸ごとに直接集計する
+    grouped = df.groupby(keys, observed=True)
+    return pd.DataFrame({
+        '取引数': grouped.size(),
+        '勝数': grouped['結果(数値)'].sum(),
+        '損益': grouped['利益'].sum(),
+        '勝率': grouped['結果(数値)'].mean(),
+    })
+
+def assert_rollup_matches(actual, expected):
+    expected = expected[expected['取引数'] > 0]
+    assert actual.index.tolist() == expected.index.tolist()
+    for col in ['取引数', '勝数', '損益']:
+        assert actual[col].to_numpy().tolist() == expected[col].to_numpy().tolist()
+    np.testing.assert_allclose(actual['勝率'].to_numpy(), expected['勝率'].to_numpy())
+
+
+@pytest.mark.parametrize('keys', [
+    'HIGH/LOW', '取引銘柄', '曜日', '時間帯', '取引時間', ['取引銘柄', 'HIGH/LOW'], ['曜日', '時間帯'],
+])
+def test_rollup_matches_direct_groupby(trades, keys):
+    assert_rollup_matches(rollup_by(build_rollup(trades), keys), direct_rollup(trades, keys))
+
+def test_daily_rollup_matches_direct_groupby(trades):
+    actual = rollup_by(build_rollup(trades), '日付')
+    expected = direct_rollup(trades.assign(日付=trades['取引日付'].dt.normalize()), '日付')
+    assert_rollup_matches(actual, expected)
+
+def test_sliced_rollup_matches_filtered_trades(trades):
+    cube = build_rollup(trades)
+    start = pd.Timestamp('2024-01-15', tz='Asia/Tokyo')
+    end = pd.Timestamp('2024-02-03', tz='Asia/Tokyo').replace(hour=23, minute=59, second=59, microsecond=999999)
+    lo, hi = period_bounds(trades['取引日付'], start, end)
+    filtered = trades.iloc[lo:hi]
+    period_cube = slice_rollup(cube, start, end)
+    assert int(period_cube['取引数'].sum()) == len(filtered)
+    for keys in ['取引銘柄', ['曜日', '時間帯']]:
+        assert_rollup_matches(rollup_by(period_cube, keys), direct_rollup(filtered, keys))
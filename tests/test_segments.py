@@ -0,0 +1,76 @@
+"""条件の組み合わせの探索（search_segments）が、取引データを直接絞り込んで集計した値と一致することを確かめるテスト"""
+import io
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from trade_benchmark import generate_trade_frame
+from trade_processing import read_trade_file, merge_trade_frames
+from trade_rollup import build_rollup
+from trade_segments import SEGMENT_ALL_LABEL, SEGMENT_DIMENSIONS, search_segments, wilson_interval
+
+
+@pytest.fixture(scope='module')
+def trades():
+    rng = np.random.default_rng(41)
+    offsets = np.sort(rng.integers(0, 60 * 86400, 8_000))
+    csv_bytes = generate_trade_frame(8_000, rng, '2024-01-01', 1, offsets).to_csv(index=False).encode('utf-8')
+    return merge_trade_frames([read_trade_file(io.BytesIO(csv_bytes))[1]])
+
+def brute_force_segments(df, min_trades, max_conditions=None):
+    # 指定する軸の組み合わせごとに取引データを直接集計し、条件を満たす組み合わせをすべて並べる
+    rows = []
+    for count in range(1, (max_conditions or len(SEGMENT_DIMENSIONS)) + 1):
+        for dimensions in combinations(SEGMENT_DIMENSIONS, count):
+            grouped = df.groupby(list(dimensions), observed=True)
+            totals = pd.DataFrame({'取引数': grouped.size(), '勝数': grouped['結果(数値)'].sum(), '損益': grouped['利益'].sum()})
+            for key, total in totals[totals['取引数'] >= min_trades].iterrows():
+                key = key if isinstance(key, tuple) else (key,)
+                segment = dict.fromkeys(SEGMENT_DIMENSIONS, SEGMENT_ALL_LABEL)
+                segment.update({dimension: str(value) for dimension, value in zip(dimensions, key)})
+                rows.append({**segment, '条件数': count, **total.to_dict()})
+    result = pd.DataFrame(rows)
+    result['1取引あたり損益'] = result['損益'] / result['取引数']
+    return result.sort_values(['1取引あたり損益', '取引数'], ascending=False, kind='stable')
+
+def segment_mask(df, row):
+    mask = np.ones(len(df), dtype=bool)
+    for dimension in SEGMENT_DIMENSIONS:
+        if row[dimension] != SEGMENT_ALL_LABEL:
+            mask &= (df[dimension].astype(str) == row[dimension]).to_numpy()
+    return mask
+
+
+@pytest.mark.parametrize('min_trades, max_conditions', [(30, None), (100, 2), (1, 1)])
+def test_top_segments_match_brute_force(trades, min_trades, max_conditions):
+    actual = search_segments(build_rollup(trades), min_trades=min_trades, top_n=25, max_conditions=max_conditions)
+    expected = brute_force_segments(trades, min_trades, max_conditions).head(25)
+    assert len(actual) == len(expected)
+    np.testing.assert_allclose(actual['1取引あたり損益'], expected['1取引あたり損益'])
+    assert actual['取引数'].tolist() == expected['取引数'].astype(np.int64).tolist()
+
+def test_each_segment_matches_direct_mask(trades):
+    result = search_segments(build_rollup(trades), min_trades=20, top_n=50)
+    for _, row in result.iterrows():
+        mask = segment_mask(trades, row)
+        matched = trades[mask]
+        assert row['条件数'] == sum(row[dimension] != SEGMENT_ALL_LABEL for dimension in SEGMENT_DIMENSIONS)
+        assert row['取引数'] == len(matched) >= 20
+        assert row['損益'] == matched['利益'].sum()
+        assert row['勝率'] == pytest.approx(matched['結果(数値)'].mean())
+        assert row['勝率下限'] <= row['勝率'] <= row['勝率上限']
+
+def test_results_are_sorted_by_expected_profit(trades):
+    result = search_segments(build_rollup(trades), top_n=100)
+    assert result['1取引あたり損益'].is_monotonic_decreasing
+    assert (result['条件数'] >= 1).all()
+
+def test_wilson_interval_known_value():
+    lower, upper = wilson_interval(np.array([8.0]), np.array([10.0]), 0.95)
+    assert lower[0] == pytest.approx(0.4902, abs=1e-4)
+    assert upper[0] == pytest.approx(0.9433, abs=1e-4)
+
+def test_empty_cube(trades):
+    assert search_segments(build_rollup(trades.iloc[:0])).empty
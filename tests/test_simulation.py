@@ -0,0 +1,76 @@
+"""モンテカルロ・シミュレーション（trade_simulation）のテスト"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import trade_simulation
+from trade_simulation import SIMULATION_CHUNK_PATHS, path_statistics, risk_of_ruin, simulate_trades, summarize_simulation
+
+
+@pytest.fixture(scope='module')
+def history():
+    rng = np.random.default_rng(29)
+    is_win = (rng.random(300) < 0.55).astype(np.int8)
+    profit = np.where(is_win == 1, rng.integers(500, 1_500, 300), -rng.integers(500, 1_500, 300))
+    return profit, is_win
+
+def brute_force_path(profits, losses):
+    cumulative, peak, drawdown, streak, longest = 0, 0, 0, 0, 0
+    lowest = None
+    for profit, loss in zip(profits, losses):
+        cumulative += int(profit)
+        peak = max(peak, cumulative) if lowest is not None else cumulative
+        lowest = cumulative if lowest is None else min(lowest, cumulative)
+        drawdown = max(drawdown, peak - cumulative)
+        streak = streak + 1 if loss else 0
+        longest = max(longest, streak)
+    return cumulative, drawdown, longest, lowest
+
+
+def test_path_statistics_match_brute_force():
+    rng = np.random.default_rng(31)
+    profits = rng.integers(-1_000, 1_000, size=(50, 40))
+    losses = profits <= 0
+    actual = np.column_stack(path_statistics(profits, losses))
+    expected = np.array([brute_force_path(p, l) for p, l in zip(profits, losses)])
+    np.testing.assert_array_equal(actual, expected)
+
+def test_same_seed_gives_same_paths(history):
+    profit, is_win = history
+    first = simulate_trades(profit, is_win, n_paths=2_500, seed=42)
+    pd.testing.assert_frame_equal(first, simulate_trades(profit, is_win, n_paths=2_500, seed=42))
+    assert not first.equals(simulate_trades(profit, is_win, n_paths=2_500, seed=43))
+
+def test_shape_and_columns(history):
+    profit, is_win = history
+    # チャンクの大きさで割り切れない経路数と、元の取引数と異なる取引数
+    paths = simulate_trades(profit, is_win, n_paths=SIMULATION_CHUNK_PATHS + 17, n_trades=120, seed=1)
+    assert paths.shape == (SIMULATION_CHUNK_PATHS + 17, 4)
+    assert paths.columns.tolist() == ['最終損益', '最大ドローダウン', '最大連敗数', '最低損益']
+    assert (paths.dtypes == np.int64).all()
+    assert (paths['最大連敗数'] <= 120).all() and (paths['最大ドローダウン'] >= 0).all()
+    assert (paths['最低損益'] <= paths['最終損益']).all()
+
+def test_parallel_run_matches_serial_run(history, monkeypatch):
+    profit, is_win = history
+    serial = simulate_trades(profit, is_win, n_paths=2_000, seed=7, max_workers=1)
+    monkeypatch.setattr(trade_simulation, 'SIMULATION_PARALLEL_ELEMENTS', 0)
+    pd.testing.assert_frame_equal(simulate_trades(profit, is_win, n_paths=2_000, seed=7, max_workers=2), serial)
+
+def test_all_winning_history_never_ruins():
+    paths = simulate_trades([100, 200], [1, 1], n_paths=100, n_trades=50, seed=0)
+    assert (paths['最大連敗数'] == 0).all() and (paths['最大ドローダウン'] == 0).all()
+    assert risk_of_ruin(paths, 1) == 0.0
+
+def test_risk_of_ruin_counts_paths_reaching_bankroll():
+    paths = pd.DataFrame({'最低損益': [-100_000, -99_999, -150_000, 0]})
+    assert risk_of_ruin(paths, 100_000) == 0.5
+
+def test_summary_has_mean_and_percentiles(history):
+    summary = summarize_simulation(simulate_trades(*history, n_paths=1_000, seed=3))
+    assert summary.index.tolist() == ['最終損益', '最大ドローダウン', '最大連敗数']
+    assert summary.columns.tolist() == ['平均', '5%点', '25%点', '50%点', '75%点', '95%点']
+
+def test_empty_history_raises():
+    with pytest.raises(ValueError):
+        simulate_trades([], [])
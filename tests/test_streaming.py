@@ -0,0 +1,38 @@
+"""チャンク単位の読み込み（stream_trade_data）が一括読み込みと同じ結果になることを確かめるテスト"""
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from trade_benchmark import generate_trade_frame
+from trade_processing import (
+    CUMULATIVE_COLUMNS, PROCESSED_SCHEMA, TradeDataError, read_trade_file, merge_trade_frames, stream_trade_data,
+)
+
+
+def synthetic_csv(rows, seed, first_trade_number=1):
+    rng = np.random.default_rng(seed)
+    # 同じ秒の取引（同順位）を多く含め、並べ替えの順序まで比べる
+    offsets = np.sort(rng.integers(0, 3 * 86400, rows))
+    return generate_trade_frame(rows, rng, '2024-01-01', first_trade_number, offsets).to_csv(index=False).encode('utf-8')
+
+
+def test_stream_matches_one_shot():
+    files = [synthetic_csv(5_000, 0), synthetic_csv(3_000, 1, 5_001)]
+    expected = merge_trade_frames([read_trade_file(content)[1] for content in files])
+    actual = stream_trade_data([io.BytesIO(content) for content in files], chunksize=700)
+    pd.testing.assert_frame_equal(actual, expected)
+
+def test_stream_without_rows_raises():
+    with pytest.raises(TradeDataError):
+        stream_trade_data([])
+
+def test_processed_frames_follow_schema():
+    files = [synthetic_csv(2_000, 2), synthetic_csv(1_000, 3, 2_001)]
+    _, prepared = read_trade_file(files[0])
+    assert prepared.dtypes.to_dict() == {col: dtype for col, dtype in PROCESSED_SCHEMA.items() if col not in CUMULATIVE_COLUMNS}
+    for df in [merge_trade_frames([read_trade_file(content)[1] for content in files]),
+               stream_trade_data([io.BytesIO(content) for content in files], chunksize=700)]:
+        assert list(df.columns) == list(PROCESSED_SCHEMA)
+        assert df.dtypes.to_dict() == PROCESSED_SCHEMA
@@ -0,0 +1,72 @@
+"""日時の解析（parse_broker_timestamps）が、従来の pd.to_datetime による解析と同じ結果になることを確かめるテスト"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from trade_processing import parse_broker_timestamps
+
+
+def legacy_parse(series):
+    # 固定幅の解析を導入する前の実装
+    parsed = pd.to_datetime(series.str.strip('="').str.strip('"'), format="%d/%m/%Y %H:%M:%S", errors='coerce')
+    return parsed.dt.tz_localize('Asia/Tokyo')
+
+def assert_matches_legacy(values):
+    series = pd.Series(values, dtype=object)
+    pd.testing.assert_series_equal(parse_broker_timestamps(series), legacy_parse(series))
+
+
+def test_random_valid_timestamps_match_legacy():
+    rng = np.random.default_rng(17)
+    seconds = rng.integers(0, 40 * 365 * 86400, 50_000)
+    timestamps = pd.Timestamp('1995-01-01') + pd.to_timedelta(seconds, unit='s')
+    assert_matches_legacy(('="' + timestamps.strftime('%d/%m/%Y %H:%M:%S') + '"').tolist())
+
+# 固定幅の形式に合わない値は従来の解析に回し、解析できない値はNaTのままにする
+INVALID_VALUES = [
+    '="31/02/2024 10:00:00"',  # 存在しない日付
+    '="29/02/2023 10:00:00"',  # 閏年でない年の2月29日
+    '="00/01/2024 10:00:00"',
+    '="15/13/2024 10:00:00"',
+    '="15/01/2024 24:00:00"',  # 24時
+    '="15/01/2024 10:60:00"',
+    '="15/01/2024 10:00:00"x',  # 末尾に余分な文字
+    '="15/01/2024 10:00:00 "',
+    '="15-01-2024 10:00:00"',
+    '="１５/01/2024 10:00:00"',  # 全角数字
+    '',
+    'abc',
+]
+EDGE_VALUES = [
+    '="29/02/2024 23:59:59"',  # 閏年の2月29日
+    '="31/12/1999 23:59:59"',
+    '="01/01/2000 00:00:00"',
+    '="1/2/2024 3:04:05"',  # 1桁の日・月・時
+    '="15/01/2024 10:00:60"',  # 閏秒（従来の解析では次の分として読む）
+    '15/01/2024 10:00:00',  # 「="」で囲まれていない値
+    '"15/01/2024 10:00:00"',
+]
+
+@pytest.mark.parametrize('value', INVALID_VALUES + EDGE_VALUES)
+def test_edge_cases_match_legacy(value):
+    assert_matches_legacy(['="15/01/2024 10:00:00"', value])
+
+@pytest.mark.parametrize('value', INVALID_VALUES[:6])
+def test_impossible_dates_stay_nat(value):
+    assert parse_broker_timestamps(pd.Series([value], dtype=object)).isna().all()
+
+def test_leap_day_and_unquoted_values_are_parsed():
+    parsed = parse_broker_timestamps(pd.Series(['="29/02/2024 23:59:59"', '15/01/2024 10:00:00'], dtype=object))
+    assert parsed.tolist() == [
+        pd.Timestamp('2024-02-29 23:59:59', tz='Asia/Tokyo'), pd.Timestamp('2024-01-15 10:00:00', tz='Asia/Tokyo'),
+    ]
+
+def test_missing_values_stay_nat():
+    values = ['="15/01/2024 10:00:00"', None, np.nan, '="16/01/2024 11:00:00"']
+    assert_matches_legacy(values)
+    assert parse_broker_timestamps(pd.Series(values, dtype=object)).isna().tolist() == [False, True, True, False]
+
+def test_mixed_rows_keep_their_positions():
+    values = ['="15/01/2024 10:00:00"', '="31/02/2024 10:00:00"', '="1/2/2024 3:04:05"', None, '="29/02/2024 23:59:59"'] * 200
+    series = pd.Series(values, index=pd.RangeIndex(1_000, 2_000), dtype=object)
+    pd.testing.assert_series_equal(parse_broker_timestamps(series), legacy_parse(series))
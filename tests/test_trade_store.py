@@ -0,0 +1,100 @@
+"""取引データストア（TradeStore）の差分追記のテスト"""
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from trade_benchmark import generate_trade_frame
+from trade_processing import PROCESSED_SCHEMA, read_trade_csv, merge_trade_frames, prepare_trade_frame
+from trade_store import TradeStore
+
+
+def raw_trades(start, first_trade_number, seed, rows=100, days=20):
+    rng = np.random.default_rng(seed)
+    offsets = np.sort(rng.integers(0, days * 86400, rows))
+    csv_bytes = generate_trade_frame(rows, rng, start, first_trade_number, offsets).to_csv(index=False).encode('utf-8')
+    return read_trade_csv(io.BytesIO(csv_bytes))
+
+def assert_cumulative_consistent(df):
+    cumulative = df['利益'].astype(np.int64).cumsum()
+    assert df['取引日付'].is_monotonic_increasing
+    assert (df['累積利益'] == cumulative).all()
+    assert (df['ピーク'] == cumulative.cummax()).all()
+    assert (df['ドローダウン'] == df['ピーク'] - df['累積利益']).all()
+
+
+def test_append_in_order(tmp_path):
+    store = TradeStore('acct1', str(tmp_path))
+    january, february = raw_trades('2024-01-01', 1, 0), raw_trades('2024-02-01', 1_000, 1)
+    assert store.append(january) == (100, 0)
+    assert store.append(february) == (100, 0)
+    df = store.load()
+    assert len(df) == 200
+    assert_cumulative_consistent(df)
+
+def test_append_skips_stored_trades(tmp_path):
+    store = TradeStore('acct1', str(tmp_path))
+    january = raw_trades('2024-01-01', 1, 0)
+    store.append(january)
+    assert store.append(january) == (0, 100)
+    assert len(store.load()) == 100
+
+def test_append_out_of_order_recomputes_cumulative_columns(tmp_path):
+    store = TradeStore('acct1', str(tmp_path))
+    january, february, march = raw_trades('2024-01-01', 1, 0), raw_trades('2024-02-01', 1_000, 1), raw_trades('2024-03-01', 2_000, 2)
+    store.append(january)
+    store.append(march)
+    # 保存済みの期間の間に入る過去分と、期間の重なるエクスポート（1月の一部と2月）
+    assert store.append(pd.concat([january.iloc[50:], february], ignore_index=True)) == (100, 50)
+    df = store.load()
+    assert len(df) == 300
+    assert_cumulative_consistent(df)
+    expected = merge_trade_frames([prepare_trade_frame(raw.copy()) for raw in [january, february, march]])
+    pd.testing.assert_series_equal(df['累積利益'], expected['累積利益'].reset_index(drop=True), check_index_type=False)
+    state = store.read_state()
+    assert state['last_cumulative_profit'] == df['累積利益'].iloc[-1]
+    assert state['last_peak'] == df['ピーク'].iloc[-1]
+    assert state['row_count'] == 300
+
+def test_append_after_backfill_continues_from_latest(tmp_path):
+    store = TradeStore('acct1', str(tmp_path))
+    store.append(raw_trades('2024-02-01', 1_000, 1))
+    store.append(raw_trades('2024-01-01', 1, 0))
+    store.append(raw_trades('2024-03-01', 2_000, 2))
+    assert_cumulative_consistent(store.load())
+
+def test_append_matches_integer_ids_from_older_partitions(tmp_path):
+    store = TradeStore('acct1', str(tmp_path))
+    january = raw_trades('2024-01-01', 1, 0)
+    store.append(january)
+    # 取引番号を整数で保存し、WIN/LOSEの結果の列も持っていた以前の形式のパーティションに書き換える
+    path = store._partition_path('2024-01')
+    partition = pd.read_parquet(path)
+    partition['取引番号'] = partition['取引番号'].astype(np.int64)
+    partition.insert(7, '結果', np.where(partition['結果(数値)'] == 1, 'WIN', 'LOSE'))
+    partition.to_parquet(path, index=False)
+
+    assert store.append(january) == (0, 100)
+    assert store.append(raw_trades('2024-01-21', 1_000, 1, days=5)) == (100, 0)
+    df = store.load()
+    assert len(df) == 200
+    assert df.dtypes.to_dict() == PROCESSED_SCHEMA
+    assert_cumulative_consistent(df)
+
+def test_accounts_are_stored_separately(tmp_path):
+    # 口座が違えば、取引番号が同じでも別の取引として扱い、累積列も口座ごとに計算する
+    first, second = TradeStore('acct1', str(tmp_path)), TradeStore('acct2', str(tmp_path))
+    assert first.append(raw_trades('2024-01-01', 1, 0)) == (100, 0)
+    assert second.append(raw_trades('2024-01-01', 1, 1)) == (100, 0)
+    assert second.append(raw_trades('2024-02-01', 1_000, 2)) == (100, 0)
+    assert len(first.load()) == 100 and len(second.load()) == 200
+    assert_cumulative_consistent(first.load())
+    assert_cumulative_consistent(second.load())
+    assert first.read_state()['account'] == 'acct1'
+    assert second.read_state()['row_count'] == 200
+
+def test_account_name_must_be_a_directory_name(tmp_path):
+    for account in ['', ' ', '..', 'a/b']:
+        with pytest.raises(ValueError):
+            TradeStore(account, str(tmp_path))
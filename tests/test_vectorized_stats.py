@@ -0,0 +1,113 @@
+"""取引時間の区分と最大連勝・連敗数のベクトル版が、従来のループ版と同じ結果になることを確かめるテスト"""
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from trade_processing import categorize_durations, max_streaks
+
+HISTORY_ROWS = 1_000_000
+MIN_SPEEDUP = 5  # ベクトル版に求める最低限の速度向上（倍）
+
+
+def legacy_categorize_duration(seconds):
+    """従来の取引時間の分類（1件ずつ判定する）"""
+    if seconds == 15:
+        return '15秒'
+    elif seconds == 30:
+        return '30秒'
+    elif seconds == 60:
+        return '60秒'
+    elif 170 <= seconds <= 190:
+        return '3分'
+    elif 290 <= seconds <= 310:
+        return '5分'
+    else:
+        return 'その他'
+
+def legacy_categorize_durations(seconds):
+    return pd.Series(seconds).apply(legacy_categorize_duration).astype('category')
+
+def legacy_max_streaks(results):
+    """従来の最大連勝数・最大連敗数の計算（'WIN'/'LOSE' のリストを1件ずつ走査する）"""
+    max_wins, max_losses = 0, 0
+    current_wins, current_losses = 0, 0
+    for result in results:
+        if result == 'WIN':
+            current_wins += 1
+            current_losses = 0
+            max_wins = max(max_wins, current_wins)
+        else:
+            current_losses += 1
+            current_wins = 0
+            max_losses = max(max_losses, current_losses)
+    return max_wins, max_losses
+
+def assert_same_durations(seconds):
+    expected = legacy_categorize_durations(seconds)
+    actual = categorize_durations(seconds)
+    # 空の場合、従来版はカテゴリの型が入力の数値型になるため、ラベルとカテゴリの並びで比べる
+    assert list(actual.categories) == list(expected.cat.categories)
+    np.testing.assert_array_equal(np.asarray(actual, dtype=object), expected.to_numpy(dtype=object))
+
+def assert_same_streaks(is_win):
+    assert max_streaks(is_win) == legacy_max_streaks(np.where(is_win, 'WIN', 'LOSE').tolist())
+
+
+@pytest.fixture(scope='module')
+def history():
+    """区分の境界付近の取引時間と、連勝・連敗の偏りを含む合成の1M件の取引履歴"""
+    rng = np.random.default_rng(20240101)
+    seconds = rng.choice(np.array([0, 14, 15, 16, 30, 60, 169, 170, 180, 190, 191, 289, 290, 300, 310, 311, 900]), HISTORY_ROWS)
+    seconds = np.where(rng.random(HISTORY_ROWS) < 0.5, seconds, rng.integers(0, 400, HISTORY_ROWS)).astype(np.int32)
+    # 勝率が時期によって変わるようにして、長い連勝・連敗を作る
+    win_rate = np.repeat(rng.uniform(0.05, 0.95, HISTORY_ROWS // 1000), 1000)
+    is_win = rng.random(HISTORY_ROWS) < win_rate
+    return seconds, is_win
+
+
+def test_durations_match_legacy_on_history(history):
+    assert_same_durations(history[0])
+
+def test_streaks_match_legacy_on_history(history):
+    assert_same_streaks(history[1])
+
+@pytest.mark.parametrize('seconds', [
+    np.array([], dtype=np.int32),
+    np.array([15, 15, 15], dtype=np.int32),
+    np.array([1, 2, 3], dtype=np.int32),
+    np.array([310, 170, 60, 30, 15, 190, 290], dtype=np.int32),
+    np.array([15.0, np.nan, 180.5, 310.0]),
+], ids=['empty', 'single-bin', 'all-other', 'bin-edges', 'float-and-nan'])
+def test_durations_match_legacy_edge_cases(seconds):
+    assert_same_durations(seconds)
+
+@pytest.mark.parametrize('is_win', [
+    np.array([], dtype=bool),
+    np.ones(1000, dtype=bool),
+    np.zeros(1000, dtype=bool),
+    np.array([True]),
+    np.array([False]),
+    np.array([True, False] * 500),
+], ids=['empty', 'all-win', 'all-loss', 'single-win', 'single-loss', 'alternating'])
+def test_streaks_match_legacy_edge_cases(is_win):
+    assert_same_streaks(is_win)
+
+def test_vectorized_is_faster_than_legacy(history):
+    seconds, is_win = history
+    results = np.where(is_win, 'WIN', 'LOSE').tolist()
+
+    started = time.perf_counter()
+    legacy_categorize_durations(seconds)
+    legacy_max_streaks(results)
+    legacy_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    categorize_durations(seconds)
+    max_streaks(is_win)
+    vectorized_seconds = time.perf_counter() - started
+
+    speedup = legacy_seconds / vectorized_seconds
+    print(f"\n従来版 {legacy_seconds:.3f}秒 / ベクトル版 {vectorized_seconds:.3f}秒（{speedup:.1f}倍）")
+    assert speedup >= MIN_SPEEDUP
@@ -0,0 +1,109 @@
+import io
+import os
+import time
+from concurrent.futures import as_completed
+
+import pandas as pd
+
+from trade_processing import TradeDataError, process_pool, parse_trade_files, merge_trade_frames, generate_summary_stats
+
+# 比較表に並べる要約統計量（キー: 列名）
+ACCOUNT_METRICS = {
+    'total_trades': '総取引数',
+    'total_profit': '総損益',
+    'win_rate': '勝率',
+    'risk_reward_ratio': 'リスク・リワード比率',
+    'avg_profit': '平均利益',
+    'avg_loss': '平均損失',
+    'max_wins': '最大連勝数',
+    'max_losses': '最大連敗数',
+    'max_drawdown': '最大ドローダウン',
+    'monthly_avg_profit': '月間平均利益',
+}
+
+
+def default_account_name(file_name):
+    """ファイル名から既定の口座名（拡張子を除いたファイル名）を返す関数"""
+    return os.path.splitext(os.path.basename(file_name))[0]
+
+def group_files_by_account(file_names, account_names):
+    """ファイルの位置を口座ごとにまとめる関数。口座名が空のファイルは、ファイル名を口座名とする（口座は最初に出現した順）"""
+    accounts = {}
+    for position, (file_name, account) in enumerate(zip(file_names, account_names)):
+        account = str(account).strip() if account is not None and not pd.isna(account) else ''
+        accounts.setdefault(account or default_account_name(file_name), []).append(position)
+    return accounts
+
+def process_account(account, files):
+    """1口座分のファイルを読み込んで加工し、結果を辞書で返す関数（ワーカーで実行する）
+
+    files は (ファイル名, 内容のバイト列) かCSVファイルのパスのリスト。累積利益・ドローダウンは口座の中の
+    取引だけで計算する。読み込みや加工に失敗したファイルは errors に (ファイル名, 例外) として記録し、
+    残りのファイルで続ける。すべて失敗した場合と、取引が1件もない場合（見出し行だけのCSVなど）は、df と stats はNone。
+    """
+    sources = []
+    for file in files:
+        if isinstance(file, str):
+            sources.append(file)
+            continue
+        name, content = file
+        source = io.BytesIO(content)
+        source.name = name
+        sources.append(source)
+    results = parse_trade_files(sources, max_workers=1)
+    frames = [result['df'] for result in results if result['error'] is None]
+    errors = [(result['name'], result['error']) for result in results if result['error'] is not None]
+    df = merge_trade_frames(frames) if frames else None
+    if df is not None and df.empty:
+        errors.extend((result['name'], TradeDataError("⚠️ エラー：CSVファイルにデータがありません。")) for result in results if result['error'] is None)
+        df = None
+    stats = generate_summary_stats(df) if df is not None else None
+    return {'account': account, 'df': df, 'stats': stats, 'errors': errors}
+
+def raise_for_errors(result):
+    """process_account の結果に加工できなかったファイルがあれば、ファイル名とエラーをまとめた TradeDataError を送出する関数
+
+    コマンドラインツールでは、一部のファイルの取引だけを書き出さないよう、口座全体を失敗とする。
+    """
+    if result['errors']:
+        raise TradeDataError("\n".join(f"{os.path.basename(name)}: {error}" for name, error in result['errors']))
+    return result
+
+def run_account(func, account, files):
+    """1口座分の func(口座名, ファイルのリスト) を実行し、結果・所要時間・エラーを辞書で返す関数（ワーカーで実行する）
+
+    例外はプロセスをまたいで返せるよう文字列にし、他の口座の処理は続ける。
+    """
+    started = time.perf_counter()
+    try:
+        result, error = func(account, files), None
+    except Exception as e:
+        result, error = None, str(e)
+    return {'account': account, 'result': result, 'seconds': time.perf_counter() - started, 'error': error}
+
+def iter_account_results(func, accounts, workers=None):
+    """口座ごと（{口座名: ファイルのリスト}）の func をワーカープロセスで並列に実行し、終わった順に run_account の結果を返すジェネレータ
+
+    func はワーカープロセスへ渡すため、モジュールの最上位の関数か、それを functools.partial で包んだものにする。
+    """
+    workers = min(workers or os.cpu_count() or 1, len(accounts))
+    if workers <= 1:
+        for account, files in accounts.items():
+            yield run_account(func, account, files)
+        return
+    with process_pool(workers) as executor:
+        futures = [executor.submit(run_account, func, account, files) for account, files in accounts.items()]
+        for future in as_completed(futures):
+            yield future.result()
+
+def compare_accounts(results):
+    """口座ごとの結果（{口座名: process_account の結果}）から、1口座1行の比較表を作る関数。加工できなかった口座は含めない"""
+    rows = []
+    for account, result in results.items():
+        if result['df'] is None:
+            continue
+        dates = result['df']['取引日付']
+        row = {'口座': account, '最初の取引': dates.min().strftime('%Y-%m-%d'), '最後の取引': dates.max().strftime('%Y-%m-%d')}
+        row.update({label: result['stats'][key] for key, label in ACCOUNT_METRICS.items()})
+        rows.append(row)
+    return pd.DataFrame(rows, columns=['口座', '最初の取引', '最後の取引'] + list(ACCOUNT_METRICS.values()))
@@ -0,0 +1,381 @@
+"""取引データ加工のベンチマーク
+
+証券会社の取引履歴CSVと同じ形式の合成データを作成し、読み込みからグラフ作成・エクスポートまでの
+処理段階ごとに所要時間とピークメモリを計測してJSONに保存する。
+
+使い方:
+    python trade_benchmark.py generate --rows 1000000 --files 4 -o benchmark_data
+    python trade_benchmark.py run --rows 1000 100000 1000000 -o results.json
+    python trade_benchmark.py run --rows 100000 -o new.json --baseline results.json
+    python trade_benchmark.py imports -o imports.json --baseline imports_baseline.json
+"""
+import argparse
+import ast
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from trade_processing import (
+    DROP_COLUMNS, read_trade_csv, validate_columns, parse_trade_timestamps, parse_trade_amounts,
+    add_trade_features, add_cumulative_columns, generate_summary_stats, period_bounds,
+)
+from trade_rollup import build_rollup, slice_rollup
+from trade_metrics import TRADE_WINDOWS, TIME_WINDOWS, METRIC_GROUP_COLUMNS, rolling_metrics
+from trade_simulation import simulate_trades
+from trade_segments import search_segments
+from trade_charts import GRAPH_OPTIONS, build_chart
+from trade_export import EXCEL_MAX_ROWS, export_csv, export_excel, export_parquet, export_feather
+from trade_instrumentation import StageTimer
+
+BENCHMARK_DATA_DIR = "benchmark_data"
+GENERATOR_CHUNK_ROWS = 500_000  # 合成データを書き出す際の1チャンクあたりの行数
+BENCHMARK_PAIRS = ['USD/JPY', 'EUR/JPY', 'GBP/JPY', 'AUD/JPY', 'EUR/USD', 'GBP/USD']
+BENCHMARK_DURATIONS = [15, 30, 60, 180, 300, 600]  # 秒。600秒は「その他」に分類される
+BENCHMARK_AMOUNTS = [1000, 2000, 5000, 10000, 50000]
+BENCHMARK_PAYOUT_RATES = [1.8, 1.85, 1.9, 1.95]
+TRADES_PER_DAY = 300
+FILTER_DAYS = 30  # フィルタ・グラフの計測に使う期間（データ末尾からの日数）
+SIMULATION_PATHS = 1_000  # リスクシミュレーションの計測に使う経路数
+SIMULATION_TRADES = 10_000  # リスクシミュレーションの計測に使う1経路あたりの取引数の上限
+IMPORT_RUNS = 5  # 起動時の読み込み時間を計測する回数（中央値を使う）
+# 起動時に読み込むモジュールを調べるアプリのスクリプト（モジュールの最上位で読み込むものが起動時の読み込み）
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+# 機能を使うときまで読み込みを遅らせるライブラリ。起動時に読み込まれていたら劣化として扱う
+DEFERRED_MODULES = ['altair', 'openpyxl', 'xlsxwriter', 'fpdf', 'vl_convert', 'PIL', 'matplotlib', 'plotly']
+MIN_REGRESSION_SECONDS = 0.05  # 差がこれより小さい段階は計測誤差として劣化に数えない
+
+
+# --- 合成データ ---
+def _format_timestamps(timestamps):
+    """日時を証券会社CSVの「="dd/mm/YYYY HH:MM:SS"」形式の文字列にする"""
+    return '="' + timestamps.strftime('%d/%m/%Y %H:%M:%S') + '"'
+
+def _format_amounts(values):
+    """金額を「¥1,000」形式の文字列にする（出現する金額ごとに1回だけ書式化する）"""
+    uniques, inverse = np.unique(values, return_inverse=True)
+    labels = np.array([f"¥{value:,}" for value in uniques], dtype=object)
+    return labels[inverse]
+
+def generate_trade_frame(n_rows, rng, start, first_trade_number, offsets):
+    """取引履歴CSVと同じ列・書式の合成データを作成する関数。offsetsは開始日時からの秒数（昇順）"""
+    opened = pd.DatetimeIndex(pd.Timestamp(start) + pd.to_timedelta(offsets, unit='s'))
+    durations = rng.choice(BENCHMARK_DURATIONS, n_rows)
+    closed = opened + pd.to_timedelta(durations, unit='s')
+    direction = rng.choice(['HIGH', 'LOW'], n_rows)
+    rate = np.round(150 + rng.normal(0, 2, n_rows), 3)
+    judged = np.round(rate + rng.normal(0, 0.05, n_rows), 3)
+    win = np.where(direction == 'HIGH', judged > rate, judged < rate)
+    amount = rng.choice(BENCHMARK_AMOUNTS, n_rows)
+    payout = np.where(win, (amount * rng.choice(BENCHMARK_PAYOUT_RATES, n_rows)).astype(np.int64), 0)
+    return pd.DataFrame({
+        '取引番号': np.arange(first_trade_number, first_trade_number + n_rows),
+        '取引銘柄': rng.choice(BENCHMARK_PAIRS, n_rows),
+        'HIGH/LOW': direction,
+        '取引オプション': 'Turbo',
+        '日付': _format_timestamps(opened),
+        '購入金額': _format_amounts(amount),
+        'レート': rate,
+        '判定レート': judged,
+        '終了時刻': _format_timestamps(closed),
+        'ペイアウト': _format_amounts(payout),
+    })
+
+def generate_trade_files(n_rows, output_dir, files=1, seed=0, start='2024-01-01'):
+    """合成の取引履歴CSVを files 個に分けて書き出し、パスのリストを返す関数
+
+    取引は時系列順に並び、各ファイルは連続した期間（月ごとのエクスポートのような分割）になる。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    span_seconds = max(30, -(-n_rows // TRADES_PER_DAY)) * 86400
+    offsets = np.sort(rng.integers(0, span_seconds, n_rows))
+    bounds = np.linspace(0, n_rows, files + 1).astype(np.int64)
+    paths = []
+    for file_num in range(files):
+        path = os.path.join(output_dir, f"trades_{n_rows}_{files}_{seed}_{file_num + 1}.csv")
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            for chunk_start in range(bounds[file_num], bounds[file_num + 1], GENERATOR_CHUNK_ROWS):
+                chunk_end = min(chunk_start + GENERATOR_CHUNK_ROWS, bounds[file_num + 1])
+                chunk = generate_trade_frame(chunk_end - chunk_start, rng, start, 1_000_000 + chunk_start, offsets[chunk_start:chunk_end])
+                chunk.to_csv(f, index=False, header=chunk_start == bounds[file_num])
+        paths.append(path)
+    return paths
+
+def ensure_trade_files(n_rows, data_dir, files=1, seed=0):
+    """合成データが作成済みであれば再利用し、なければ作成してパスのリストを返す関数"""
+    paths = [os.path.join(data_dir, f"trades_{n_rows}_{files}_{seed}_{file_num + 1}.csv") for file_num in range(files)]
+    if all(os.path.exists(path) for path in paths):
+        return paths
+    return generate_trade_files(n_rows, data_dir, files, seed)
+
+
+# --- 計測 ---
+def run_pipeline(paths, timer, skip_excel=False):
+    """アプリと同じ順序で加工・集計・グラフ作成・エクスポートを行い、各段階を計測する関数"""
+    with timer.stage('read_csv') as record:
+        df = pd.concat([read_trade_csv(path) for path in paths], ignore_index=True)
+        record['rows'] = rows = len(df)
+    validate_columns(df)
+    with timer.stage('parse_dates', rows):
+        parse_trade_timestamps(df)
+    with timer.stage('parse_amounts', rows):
+        parse_trade_amounts(df)
+    with timer.stage('derived_columns', rows):
+        add_trade_features(df)
+    with timer.stage('cumulative_sort', rows):
+        add_cumulative_columns(df)
+        df.sort_values(by='取引日付', inplace=True)
+        df = df.drop(columns=DROP_COLUMNS, errors='ignore')
+    with timer.stage('summary_stats', rows):
+        generate_summary_stats(df)
+    with timer.stage('rollup', rows):
+        cube = build_rollup(df)
+    with timer.stage('rolling_metrics', rows):
+        # 全体・列ごとに、すべての取引数と期間の窓で移動指標を計算する
+        for group in [None] + METRIC_GROUP_COLUMNS:
+            for window in TRADE_WINDOWS + list(TIME_WINDOWS.values()):
+                rolling_metrics(df, window, group)
+    simulation_trades = min(rows, SIMULATION_TRADES)
+    with timer.stage('risk_simulation', SIMULATION_PATHS * simulation_trades):
+        simulate_trades(df['利益'].to_numpy(), df['結果(数値)'].to_numpy(), SIMULATION_PATHS, simulation_trades)
+
+    end_date = df['取引日付'].iloc[-1]
+    start_date = (end_date - pd.Timedelta(days=FILTER_DAYS)).normalize()
+    with timer.stage('filter_period', rows):
+        lo, hi = period_bounds(df['取引日付'], start_date, end_date)
+        filtered_df = df.iloc[lo:hi]
+        period_cube = slice_rollup(cube, start_date, end_date)
+    with timer.stage('segment_search', rows):
+        search_segments(cube)
+    for graph in GRAPH_OPTIONS:
+        with timer.stage(f'chart:{graph}', len(filtered_df)):
+            chart = build_chart(graph, period_cube, filtered_df)
+            if chart is not None:
+                chart.to_dict()
+
+    with timer.stage('export_csv', rows):
+        export_csv(df)
+    with timer.stage('export_csv_gzip', rows):
+        export_csv(df, compress=True)
+    if not skip_excel and rows <= EXCEL_MAX_ROWS:
+        with timer.stage('export_excel', rows):
+            export_excel(df)
+    with timer.stage('export_parquet', rows):
+        export_parquet(df)
+    with timer.stage('export_feather', rows):
+        export_feather(df)
+    return rows
+
+def run_benchmarks(sizes, files=1, data_dir=BENCHMARK_DATA_DIR, seed=0, trace_memory=False, skip_excel=False):
+    """行数ごとに合成データを用意してパイプラインを計測し、結果の辞書を返す関数"""
+    results = {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'memory': 'tracemalloc' if trace_memory else 'peak_rss',
+        },
+        'runs': [],
+    }
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        for n_rows in sizes:
+            paths = ensure_trade_files(n_rows, data_dir, files, seed)
+            timer = StageTimer(trace_memory=trace_memory, track_peak=True)
+            started = time.perf_counter()
+            run_pipeline(paths, timer, skip_excel)
+            results['runs'].append({
+                'rows': n_rows,
+                'files': files,
+                'total_seconds': time.perf_counter() - started,
+                'peak_mb': max((stage['peak_mb'] for stage in timer.stages if stage['peak_mb'] is not None), default=None),
+                'stages': timer.stages,
+            })
+            print_run(results['runs'][-1])
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return results
+
+
+def _parse_importtime(output, top=10):
+    """python -X importtime の出力から、直接読み込んだモジュールを読み込み時間（配下を含む）の長い順に返す"""
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if not name[1:].startswith(' '):
+            modules.append({'module': name.strip(), 'seconds': int(cumulative) / 1_000_000})
+    return sorted(modules, key=lambda module: module['seconds'], reverse=True)[:top]
+
+def startup_modules(app_script=APP_SCRIPT):
+    """アプリのスクリプトの最上位の import 文から、起動時（ファイルのアップロード前）に読み込むモジュールを順に返す関数
+
+    関数の中で読み込むモジュールは、機能を使うときに読み込むものとして含めない。
+    """
+    with open(app_script, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=app_script)
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+def measure_startup_imports(modules=None, runs=IMPORT_RUNS):
+    """アプリの起動時に読み込むモジュール（省略時は startup_modules()）を新しいPythonプロセスで読み込み、
+    所要時間の中央値・読み込み時間の長いモジュール・起動時に読み込まれてしまった遅延読み込みのライブラリを返す関数
+    """
+    modules = modules or startup_modules()
+    code = (
+        "import json, sys, time\n"
+        "started = time.perf_counter()\n"
+        + "".join(f"import {module}\n" for module in modules)
+        + f"print(json.dumps({{'seconds': time.perf_counter() - started, 'loaded': [m for m in {DEFERRED_MODULES!r} if m in sys.modules]}}))\n"
+    )
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    # 1回目はバイトコードのキャッシュを作るため計測に含めない
+    subprocess.run([sys.executable, '-c', code], cwd=cwd, capture_output=True, check=True)
+    seconds, result = [], None
+    for _ in range(runs):
+        completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=cwd, capture_output=True, text=True, check=True)
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        seconds.append(result['seconds'])
+    return {
+        'modules': modules,
+        'seconds': statistics.median(seconds),
+        'runs': seconds,
+        'top_modules': _parse_importtime(completed.stderr),
+        'deferred_loaded': result['loaded'],
+    }
+
+def print_imports(imports):
+    """起動時の読み込み時間の計測結果を表示する関数"""
+    print(f"\n## 起動時のモジュール読み込み: {imports['seconds']:.3f}秒（{len(imports['runs'])}回の中央値）")
+    print(f"{'モジュール':<32}{'秒':>10}")
+    for module in imports['top_modules']:
+        print(f"{module['module']:<32}{module['seconds']:>10.3f}")
+
+def compare_imports(current, baseline, threshold=1.2):
+    """起動時の読み込み時間をベースラインと比較し、threshold倍より遅くなったかどうかを返す関数（差が MIN_REGRESSION_SECONDS 未満は除く）"""
+    ratio = current['seconds'] / baseline['seconds']
+    print(f"\n起動時の読み込み: 基準 {baseline['seconds']:.3f}秒 / 今回 {current['seconds']:.3f}秒 ({ratio:.2f}倍)")
+    return ratio > threshold and current['seconds'] - baseline['seconds'] >= MIN_REGRESSION_SECONDS
+
+
+# --- 結果の表示・比較 ---
+def print_run(run):
+    """1回分の計測結果を表形式で表示する関数"""
+    peak = f" / ピークメモリ {run['peak_mb']:,.1f} MB" if run['peak_mb'] is not None else ''
+    print(f"\n## {run['rows']:,}行 / {run['files']}ファイル: 合計 {run['total_seconds']:.2f}秒{peak}")
+    print(f"{'段階':<32}{'秒':>10}{'行/秒':>14}{'ピーク(MB)':>12}")
+    for stage in run['stages']:
+        rate = f"{stage['rows'] / stage['seconds']:,.0f}" if stage['rows'] and stage['seconds'] > 0 else '-'
+        peak = f"{stage['peak_mb']:,.1f}" if stage['peak_mb'] is not None else '-'
+        print(f"{stage['stage']:<32}{stage['seconds']:>10.3f}{rate:>14}{peak:>12}")
+
+def compare_results(current, baseline, threshold=1.2):
+    """ベースラインと同じ行数・ファイル数・段階の所要時間を比較し、threshold倍より遅くなった段階を返す関数
+
+    差が MIN_REGRESSION_SECONDS 未満の段階は、計測誤差として劣化に数えない。
+    """
+    base_times = {
+        (run['rows'], run['files'], stage['stage']): stage['seconds']
+        for run in baseline['runs'] for stage in run['stages']
+    }
+    regressions = []
+    print(f"\n{'行数':>12} {'段階':<32}{'基準(秒)':>10}{'今回(秒)':>10}{'比率':>8}")
+    for run in current['runs']:
+        for stage in run['stages']:
+            base_seconds = base_times.get((run['rows'], run['files'], stage['stage']))
+            if not base_seconds:
+                continue
+            ratio = stage['seconds'] / base_seconds
+            regressed = ratio > threshold and stage['seconds'] - base_seconds >= MIN_REGRESSION_SECONDS
+            mark = ' ⚠️' if regressed else ''
+            print(f"{run['rows']:>12,} {stage['stage']:<32}{base_seconds:>10.3f}{stage['seconds']:>10.3f}{ratio:>8.2f}{mark}")
+            if regressed:
+                regressions.append({'rows': run['rows'], 'stage': stage['stage'], 'ratio': ratio})
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="取引データ加工のベンチマークを実行します。")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    generate_parser = subparsers.add_parser('generate', help="合成の取引履歴CSVを作成する")
+    generate_parser.add_argument('--rows', type=int, required=True, help="行数")
+    generate_parser.add_argument('--files', type=int, default=1, help="分割するファイル数")
+    generate_parser.add_argument('--seed', type=int, default=0, help="乱数シード")
+    generate_parser.add_argument('-o', '--output-dir', default=BENCHMARK_DATA_DIR, help=f"出力先ディレクトリ（既定: {BENCHMARK_DATA_DIR}）")
+
+    run_parser = subparsers.add_parser('run', help="処理段階ごとの所要時間とメモリを計測する")
+    run_parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 10_000, 100_000], help="計測する行数（複数指定可。1,000〜10,000,000行を想定）")
+    run_parser.add_argument('--files', type=int, default=1, help="合成データを分割するファイル数")
+    run_parser.add_argument('--seed', type=int, default=0, help="乱数シード")
+    run_parser.add_argument('--data-dir', default=BENCHMARK_DATA_DIR, help="合成データの保存先（作成済みのデータは再利用する）")
+    run_parser.add_argument('-o', '--output', default='benchmark_results.json', help="結果を保存するJSONファイル")
+    run_parser.add_argument('--baseline', help="比較するベースラインの結果JSON")
+    run_parser.add_argument('--threshold', type=float, default=1.2, help="この倍率より遅くなった段階を劣化として扱う（既定: 1.2）")
+    run_parser.add_argument('--trace-memory', action='store_true', help="段階ごとのピークメモリをtracemallocで計測する（所要時間は大きく増える）")
+    run_parser.add_argument('--skip-excel', action='store_true', help="Excelエクスポートを計測しない")
+    imports_parser = subparsers.add_parser('imports', help="アプリの起動時のモジュール読み込み時間を計測する")
+    imports_parser.add_argument('--runs', type=int, default=IMPORT_RUNS, help=f"計測する回数（既定: {IMPORT_RUNS}）")
+    imports_parser.add_argument('-o', '--output', default='import_results.json', help="結果を保存するJSONファイル")
+    imports_parser.add_argument('--baseline', help="比較するベースラインの結果JSON")
+    imports_parser.add_argument('--threshold', type=float, default=1.2, help="この倍率より遅くなった場合を劣化として扱う（既定: 1.2）")
+    args = parser.parse_args(argv)
+
+    if args.command == 'imports':
+        imports = measure_startup_imports(runs=args.runs)
+        print_imports(imports)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(imports, f, ensure_ascii=False, indent=2)
+        print(f"\n結果を {args.output} に保存しました。")
+        failed = bool(imports['deferred_loaded'])
+        if failed:
+            print(f"\n⚠️ 遅延読み込みのライブラリが起動時に読み込まれています: {', '.join(imports['deferred_loaded'])}", file=sys.stderr)
+        if args.baseline:
+            with open(args.baseline, encoding='utf-8') as f:
+                if compare_imports(imports, json.load(f), args.threshold):
+                    print(f"\n⚠️ 起動時の読み込み時間がベースラインの{args.threshold}倍より遅くなりました。", file=sys.stderr)
+                    failed = True
+        return 1 if failed else 0
+
+    if args.command == 'generate':
+        started = time.perf_counter()
+        paths = generate_trade_files(args.rows, args.output_dir, args.files, args.seed)
+        print(f"{args.rows:,}行を{len(paths)}ファイルに書き出しました（{time.perf_counter() - started:.1f}秒）")
+        for path in paths:
+            print(path)
+        return 0
+
+    results = run_benchmarks(args.rows, args.files, args.data_dir, args.seed, args.trace_memory, args.skip_excel)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n結果を {args.output} に保存しました。")
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n⚠️ {len(regressions)}段階がベースラインの{args.threshold}倍より遅くなりました。", file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,386 @@
+import numpy as np
+import pandas as pd
+
+from trade_rollup import rollup_by
+
+GRAPH_OPTIONS = [
+    '全体勝率', '取引方向別勝率', '取引方向別収益', '通貨ペア別勝率', '通貨ペア別収益',
+    '通貨ペア・取引方向別勝率ヒートマップ', '日時勝率推移', '累積利益/損失推移',
+    '曜日別勝率', '曜日別収益', '時間帯別勝率', '時間帯別収益', '時間帯別勝率ヒートマップ',
+    '取引ごとの利益/損失', '取引時間別勝率'
+]
+# 取引1件ごとのデータを描くグラフ。取引数が多い場合は間引いてから描く
+TRADE_LEVEL_GRAPHS = ['累積利益/損失推移', '取引ごとの利益/損失']
+CHART_RESOLUTION_OPTIONS = [250, 500, 1000, 2000]  # 横方向の点数（グラフの横幅のピクセル数の目安）
+DEFAULT_CHART_RESOLUTION = 1000
+CHART_MAX_POINTS = 4000  # 1つのグラフでブラウザに送る点数の上限
+
+
+def create_chart(df, chart_type, x_col, y_col, title, **kwargs):
+    """Altairグラフを生成する共通関数"""
+    import altair as alt  # 読み込みに時間がかかるため、グラフを作るときに読み込む
+    if 'color' not in kwargs:
+        kwargs['color'] = alt.condition(
+            alt.datum[y_col] >= 0 if y_col in df.columns else alt.datum[y_col],
+            alt.value('#4CAF50'), alt.value('#F44336')
+        )
+    if chart_type == "bar":
+        chart = alt.Chart(df).mark_bar().encode(
+            x=alt.X(x_col, title=kwargs.get('x_title'), sort=kwargs.get('sort_x')),
+            y=alt.Y(y_col, title=kwargs.get('y_title'), axis=alt.Axis(format=kwargs.get('format_y', ''))),
+            color=kwargs.get('color'),
+            tooltip=kwargs.get('tooltip')
+        ).properties(title=title)
+    elif chart_type == "line":
+        chart = alt.Chart(df).mark_line().encode(
+            x=alt.X(x_col, title=kwargs.get('x_title'), sort=kwargs.get('sort_x')),
+            y=alt.Y(y_col, title=kwargs.get('y_title'), axis=alt.Axis(format=kwargs.get('format_y', ''))),
+            tooltip=kwargs.get('tooltip')
+        ).properties(title=title)
+    elif chart_type == "pie":
+        chart = alt.Chart(df).mark_arc(outerRadius=120).encode(
+            theta=alt.Theta(y_col, stack=True),
+            color=alt.Color(x_col, scale=alt.Scale(domain=kwargs.get('color_domain'), range=kwargs.get('color_range'))),
+            tooltip=kwargs.get('tooltip')
+        )
+        text = alt.Chart(df).mark_text(radius=140).encode(
+            text=alt.Text(x_col), theta=alt.Theta(y_col, stack=True)
+        )
+        return chart + text
+    elif chart_type == "heatmap":
+        chart = alt.Chart(df).mark_rect().encode(
+            x=alt.X(x_col, title=kwargs.get('x_title'), sort=kwargs.get('sort_x')),
+            y=alt.Y(y_col, title=kwargs.get('y_title'), sort=kwargs.get('sort_y')),
+            color=alt.Color(kwargs.get('color'), scale=alt.Scale(scheme=kwargs.get('scheme', 'redblue'), domain=[0, 1]), legend=alt.Legend(format=".0%")),
+            tooltip=kwargs.get('tooltip')
+        ).properties(title=title)
+    return chart
+
+def _bucket_bounds(n, resolution):
+    """取引日付順のn件を横方向の区間に均等に分け、(区間番号, 各区間の開始位置, 各区間の終了位置) を返す関数"""
+    buckets = max(1, min(resolution, n))
+    bucket = np.arange(n, dtype=np.int64) * buckets // n
+    starts = np.searchsorted(bucket, np.arange(buckets), side='left')
+    ends = np.append(starts[1:], n)
+    return bucket, starts, ends
+
+def downsample_minmax(df, value_col, resolution):
+    """取引日付順のデータを区間に分け、各区間で値が最小・最大になる行だけを残す関数（ドローダウンの山と谷を保つ）"""
+    # 区間ごとの最小・最大の行に先頭・末尾の行を加えても、CHART_MAX_POINTS を超えないようにする
+    resolution = min(resolution, (CHART_MAX_POINTS - 2) // 2)
+    n = len(df)
+    if n <= 2 * resolution:
+        return df
+    bucket, starts, ends = _bucket_bounds(n, resolution)
+    # 区間ごとに値の昇順で並べ、先頭を最小値、末尾を最大値の行とする
+    order = np.lexsort((df[value_col].to_numpy(), bucket))
+    keep = np.unique(np.concatenate([order[starts], order[ends - 1], [0, n - 1]]))
+    return df.iloc[keep]
+
+def bucket_trade_profits(df, resolution):
+    """取引日付順のデータを区間に分け、区間ごとの勝ち取引・負け取引の損益合計を縦長の形式で返す関数"""
+    resolution = min(resolution, CHART_MAX_POINTS // 2)
+    bucket, starts, ends = _bucket_bounds(len(df), resolution)
+    profit = df['利益'].to_numpy(dtype=np.int64)
+    win = df['結果(数値)'].to_numpy() == 1
+    buckets = len(starts)
+    win_profit = np.bincount(bucket, weights=np.where(win, profit, 0), minlength=buckets)
+    lose_profit = np.bincount(bucket, weights=np.where(win, 0, profit), minlength=buckets)
+    win_count = np.bincount(bucket, weights=win, minlength=buckets)
+    trade_dates = df['取引日付'].astype(str).to_numpy()
+    bucket_info = pd.DataFrame({
+        '区間': np.arange(buckets),
+        '開始日時': trade_dates[starts],
+        '終了日時': trade_dates[ends - 1],
+        '取引数': ends - starts,
+        '勝数': win_count.astype(np.int64),
+        '純損益': (win_profit + lose_profit).astype(np.int64),
+    })
+    return pd.concat([
+        bucket_info.assign(結果='WIN', 利益=win_profit.astype(np.int64)),
+        bucket_info.assign(結果='LOSE', 利益=lose_profit.astype(np.int64)),
+    ], ignore_index=True)
+
+def build_chart(graph, period_cube, filtered_df, resolution=DEFAULT_CHART_RESOLUTION):
+    """分析グラフを1つ作成する関数。期間の集計キューブと取引データから作り、データがない場合はNoneを返す
+
+    取引ごとのグラフは、取引数がresolutionを超える場合に間引いたデータで描く。
+    """
+    import altair as alt
+    if graph == '全体勝率':
+        total_wins = int(period_cube['勝数'].sum())
+        result_counts = pd.DataFrame({'結果': ['WIN', 'LOSE'], '取引数': [total_wins, int(period_cube['取引数'].sum()) - total_wins]})
+        chart_pie = create_chart(
+            result_counts, 'pie', '結果', '取引数', '全体勝率',
+            color_domain=['WIN', 'LOSE'], color_range=['#4CAF50', '#F44336'],
+            tooltip=['結果', '取引数', alt.Tooltip('取引数', format=".1%")]
+        )
+        return chart_pie
+
+    elif graph == '取引方向別勝率':
+        direction_win_rate = rollup_by(period_cube, 'HIGH/LOW')['勝率'].reindex(['HIGH', 'LOW'], fill_value=0).reset_index().rename(columns={'HIGH/LOW': '取引方向'})
+        chart_direction = create_chart(
+            direction_win_rate, 'bar', '取引方向', '勝率', '取引方向別勝率',
+            color=alt.Color('取引方向', scale=alt.Scale(domain=['HIGH', 'LOW'], range=['#4CAF50', '#F44336'])),
+            format_y=".0%", tooltip=['取引方向', alt.Tooltip('勝率', format=".1%")]
+        )
+        return chart_direction
+
+    elif graph == '取引方向別収益':
+        direction_profit = rollup_by(period_cube, 'HIGH/LOW')['損益'].reindex(['HIGH', 'LOW'], fill_value=0).reset_index().rename(columns={'損益': '利益'})
+        chart_direction = create_chart(
+            direction_profit, 'bar', 'HIGH/LOW', '利益', '取引方向別収益',
+            color=alt.Color('HIGH/LOW', scale=alt.Scale(domain=['HIGH', 'LOW'], range=['#4CAF50', '#F44336'])),
+            format_y="s", tooltip=['HIGH/LOW', alt.Tooltip('利益', format=",")]
+        )
+        return chart_direction
+
+    elif graph == '通貨ペア別勝率':
+        pair_win_rate = rollup_by(period_cube, '取引銘柄')['勝率'].sort_values(ascending=False).reset_index().rename(columns={'取引銘柄': '通貨ペア'})
+        chart_pair = create_chart(
+            pair_win_rate, 'bar', '通貨ペア', '勝率', '通貨ペア別勝率',
+            color=alt.Color('通貨ペア', scale=alt.Scale(scheme='category10')),
+            format_y=".0%", tooltip=['通貨ペア', alt.Tooltip('勝率', format=".1%")]
+        )
+        return chart_pair
+
+    elif graph == '通貨ペア別収益':
+        pair_profit = rollup_by(period_cube, '取引銘柄')['損益'].sort_values(ascending=False).reset_index().rename(columns={'取引銘柄': '通貨ペア', '損益': '利益'})
+        chart_pair = create_chart(
+            pair_profit, 'bar', '通貨ペア', '利益', '通貨ペア別収益',
+            color=alt.Color('通貨ペア', scale=alt.Scale(scheme='category10')),
+            format_y="s", tooltip=['通貨ペア', alt.Tooltip('利益', format=",")]
+        )
+        return chart_pair
+
+    elif graph == '通貨ペア・取引方向別勝率ヒートマップ':
+        heatmap_data = rollup_by(period_cube, ['取引銘柄', 'HIGH/LOW'])['勝率'].reset_index().rename(columns={'取引銘柄': '通貨ペア', 'HIGH/LOW': '取引方向'})
+        chart_heatmap_pair_direction = create_chart(
+            heatmap_data, 'heatmap', '取引方向', '通貨ペア', '通貨ペア・取引方向別勝率ヒートマップ',
+            sort_x=['HIGH', 'LOW'], color='勝率', scheme='redblue',
+            tooltip=['通貨ペア', '取引方向', alt.Tooltip('勝率', format=".1%")]
+        )
+        return chart_heatmap_pair_direction
+
+    elif graph == '日時勝率推移':
+        daily_win_rate = rollup_by(period_cube, '日付')['勝率'].reset_index()
+        daily_win_rate['日付'] = daily_win_rate['日付'].dt.strftime('%Y-%m-%d')
+        chart_line_daily = create_chart(
+            daily_win_rate, 'line', '日付', '勝率', '日時勝率推移',
+            format_y=".0%", tooltip=['日付', alt.Tooltip('勝率', format=".1%")]
+        )
+        return chart_line_daily
+
+    elif graph == '累積利益/損失推移':
+        line_df = downsample_minmax(filtered_df[['取引日付', '累積利益']], '累積利益', resolution)
+        title = '累積損益推移'
+        if len(line_df) < len(filtered_df):
+            title += f'（{len(filtered_df):,}件中{len(line_df):,}点を表示）'
+        cumulative_df = pd.DataFrame({'取引日付(str)': line_df['取引日付'].astype(str), '累積利益': line_df['累積利益']})
+        chart_cumulative = alt.Chart(cumulative_df).mark_line().encode(
+            x=alt.X('取引日付(str)', title='日付'),
+            y=alt.Y('累積利益', title='累積損益 (¥)', axis=alt.Axis(format='s'), scale=alt.Scale(reverse=True)),
+            tooltip=['取引日付(str)', '累積利益']
+        ).properties(title=title)
+        return chart_cumulative
+
+    elif graph == '曜日別勝率':
+        weekday_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+        weekday_win_rate = rollup_by(period_cube, '曜日')['勝率'].reindex(weekday_order, fill_value=0).reset_index()
+        chart_weekday = create_chart(
+            weekday_win_rate, 'bar', '曜日', '勝率', '曜日別勝率',
+            sort_x=weekday_order,
+            color=alt.Color('曜日', scale=alt.Scale(
+                domain=['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'],
+                range=['#4682B4', '#FF4500', '#00CED1', '#228B22', '#FFD700', '#8B4513', '#FFFF00']
+            )),
+            format_y=".0%", tooltip=['曜日', alt.Tooltip('勝率', format=".1%")]
+        )
+        return chart_weekday
+
+    elif graph == '曜日別収益':
+        weekday_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+        weekday_profit = rollup_by(period_cube, '曜日')['損益'].reindex(weekday_order, fill_value=0).reset_index().rename(columns={'損益': '利益'})
+        chart_weekday = create_chart(
+            weekday_profit, 'bar', '曜日', '利益', '曜日別収益',
+            sort_x=weekday_order,
+            color=alt.Color('曜日', scale=alt.Scale(
+                domain=['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'],
+                range=['#4682B4', '#FF4500', '#00CED1', '#228B22', '#FFD700', '#8B4513', '#FFFF00']
+            )),
+            format_y="s", tooltip=['曜日', alt.Tooltip('利益', format=",")]
+        )
+        return chart_weekday
+
+    elif graph == '時間帯別勝率':
+        time_order = ['午前', '午後', '夜', '深夜']
+        time_win_rate = rollup_by(period_cube, '時間帯')['勝率'].reindex(time_order, fill_value=0).reset_index()
+        chart_time = create_chart(
+            time_win_rate, 'bar', '時間帯', '勝率', '時間帯別勝率',
+            sort_x=time_order,
+            color=alt.Color('時間帯', scale=alt.Scale(
+                domain=['午前', '午後', '夜', '深夜'],
+                range=['#FFA500', '#F44336', '#4CAF50', '#1E90FF']
+            )),
+            format_y=".0%", tooltip=['時間帯', alt.Tooltip('勝率', format=".1%")]
+        )
+        return chart_time
+
+    elif graph == '時間帯別収益':
+        time_order = ['午前', '午後', '夜', '深夜']
+        time_profit = rollup_by(period_cube, '時間帯')['損益'].reindex(time_order, fill_value=0).reset_index().rename(columns={'損益': '利益'})
+        chart_time = create_chart(
+            time_profit, 'bar', '時間帯', '利益', '時間帯別収益',
+            sort_x=time_order,
+            color=alt.Color('時間帯', scale=alt.Scale(
+                domain=['午前', '午後', '夜', '深夜'],
+                range=['#FFA500', '#F44336', '#4CAF50', '#1E90FF']
+            )),
+            format_y="s", tooltip=['時間帯', alt.Tooltip('利益', format=",")]
+        )
+        return chart_time
+
+    elif graph == '時間帯別勝率ヒートマップ':
+        weekday_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+        time_order = ['午前', '午後', '夜', '深夜']
+        heatmap_data_time = rollup_by(period_cube, ['曜日', '時間帯'])['勝率'].reset_index()
+        if heatmap_data_time.empty:
+            return None  # データがない場合はグラフを作らない
+        else:
+            chart_heatmap_time = create_chart(
+                heatmap_data_time, 'heatmap', '時間帯', '曜日', '曜日・時間帯別勝率ヒートマップ',
+                sort_x=time_order, sort_y=weekday_order, color='勝率', scheme='redblue',
+                tooltip=['曜日', '時間帯', alt.Tooltip('勝率', format=".1%")]
+            )
+            return chart_heatmap_time
+
+    elif graph == '取引ごとの利益/損失':
+        if len(filtered_df) > min(resolution, CHART_MAX_POINTS // 2):
+            bucket_df = bucket_trade_profits(filtered_df, resolution)
+            bar_chart = alt.Chart(bucket_df).mark_bar().encode(
+                x=alt.X('区間:O', axis=None, title='取引の区間 (X軸を非表示)'),
+                y=alt.Y('利益', title='利益/損失 (¥)', axis=alt.Axis(format='s')),
+                color=alt.Color('結果', scale=alt.Scale(domain=['WIN', 'LOSE'], range=['#4CAF50', '#F44336'])),
+                tooltip=[
+                    alt.Tooltip('開始日時', title='開始日時'),
+                    alt.Tooltip('終了日時', title='終了日時'),
+                    alt.Tooltip('取引数', title='取引数', format=","),
+                    alt.Tooltip('勝数', title='勝数', format=","),
+                    alt.Tooltip('結果', title='結果'),
+                    alt.Tooltip('利益', title='利益/損失', format=","),
+                    alt.Tooltip('純損益', title='純損益', format=",")
+                ]
+            ).properties(title=f'各取引の利益と損失（{len(filtered_df):,}件を{bucket_df["区間"].nunique():,}区間に集計）').interactive()
+            return bar_chart
+        trade_df = filtered_df[['取引番号', '取引日付', '利益']].assign(**{
+            '結果': np.where(filtered_df['結果(数値)'].to_numpy() == 1, 'WIN', 'LOSE'),
+            '取引番号(str)': filtered_df['取引番号'].astype(str),
+        })
+        bar_chart = alt.Chart(trade_df).mark_bar().encode(
+            x=alt.X('取引番号(str)', axis=None, title='取引番号 (X軸を非表示)'),
+            y=alt.Y('利益', title='利益/損失 (¥)', axis=alt.Axis(format='s')),
+            color=alt.Color('結果', scale=alt.Scale(domain=['WIN', 'LOSE'], range=['#4CAF50', '#F44336'])),
+            tooltip=[
+                alt.Tooltip('取引番号', title='取引番号'),
+                alt.Tooltip('取引日付', title='日付', format="%Y-%m-%d %H:%M:%S"),
+                alt.Tooltip('利益', title='利益/損失', format=","),
+                alt.Tooltip('結果', title='結果')
+            ]
+        ).properties(title='各取引の利益と損失').interactive()
+        return bar_chart
+
+    elif graph == '取引時間別勝率':
+        time_order = ['15秒', '30秒', '60秒', '3分', '5分', 'その他']
+        time_win_rate = rollup_by(period_cube, '取引時間')['勝率'].reindex(time_order, fill_value=0).reset_index()
+        chart_time_win_rate = create_chart(
+            time_win_rate, 'bar', '取引時間', '勝率', '取引時間別勝率',
+            sort_x=time_order,
+            color=alt.Color('取引時間', scale=alt.Scale(scheme='category10')),
+            format_y=".0%", tooltip=['取引時間', alt.Tooltip('勝率', format=".1%")]
+        )
+        return chart_time_win_rate
+
+def build_rolling_chart(metrics_df, metric, title, group=None, resolution=DEFAULT_CHART_RESOLUTION):
+    """移動指標の推移を折れ線で描く関数。グループごとに区間の最小・最大の点だけを残して間引き、データがない場合はNoneを返す"""
+    import altair as alt
+    # プロフィットファクターなどは窓内に損失がないと計算できないため、その点は描かない
+    data = metrics_df[metrics_df[metric].notna()]
+    if data.empty:
+        return None
+    groups = [data] if group is None else [group_df for _, group_df in data.groupby(group, observed=True)]
+    # 全グループの合計がブラウザに送る点数の上限に収まるように、グループごとの解像度を決める
+    group_resolution = max(1, min(resolution, CHART_MAX_POINTS // (2 * len(groups)) - 1))
+    line_df = pd.concat([downsample_minmax(group_df, metric, group_resolution) for group_df in groups])
+    if len(line_df) < len(data):
+        title += f'（{len(data):,}件中{len(line_df):,}点を表示）'
+    chart_df = pd.DataFrame({'取引日付': line_df['取引日付'].dt.tz_localize(None), metric: line_df[metric]})
+    value_format = '.0%' if metric == '勝率' else '.2f'
+    tooltip = [alt.Tooltip('取引日付', title='日付', format="%Y-%m-%d %H:%M:%S"), alt.Tooltip(metric, format=value_format)]
+    encoding = {}
+    if group is not None:
+        chart_df[group] = line_df[group].astype(str)
+        encoding['color'] = alt.Color(group, scale=alt.Scale(scheme='category10'))
+        tooltip.insert(0, group)
+    return alt.Chart(chart_df).mark_line().encode(
+        x=alt.X('取引日付:T', title='日付'),
+        y=alt.Y(metric, title=metric, axis=alt.Axis(format=value_format)),
+        tooltip=tooltip,
+        **encoding
+    ).properties(title=title).interactive()
+
+def build_distribution_chart(values, title, x_title, bins=40, reference=None, reference_title='実績'):
+    """シミュレーション結果などの分布をヒストグラムで描く関数。度数はサーバー側で集計し、区間の数だけの行を送る
+
+    reference を指定すると、その値（実際の取引での値など）に縦線を引く。
+    """
+    import altair as alt
+    counts, edges = np.histogram(values, bins=bins)
+    hist_df = pd.DataFrame({'下限': edges[:-1], '上限': edges[1:], '経路数': counts})
+    chart = alt.Chart(hist_df).mark_bar().encode(
+        x=alt.X('下限', bin='binned', title=x_title, axis=alt.Axis(format='s')),
+        x2='上限',
+        y=alt.Y('経路数', title='経路数'),
+        tooltip=[alt.Tooltip('下限', format=','), alt.Tooltip('上限', format=','), alt.Tooltip('経路数', format=',')]
+    ).properties(title=title)
+    if reference is None:
+        return chart
+    rule = alt.Chart(pd.DataFrame({x_title: [reference], '区分': [reference_title]})).mark_rule(color='#F44336', strokeWidth=2).encode(
+        x=x_title, tooltip=['区分', alt.Tooltip(x_title, format=',')]
+    )
+    return chart + rule
+
+def build_equity_comparison_chart(curves, by_trade=False, resolution=DEFAULT_CHART_RESOLUTION):
+    """口座ごとの累積損益の推移を重ねて描く関数。口座ごとに区間の最小・最大の点だけを残して間引く
+
+    curves は {口座名: 取引日付順の加工済みデータ}。by_trade=True の場合は、横軸を日付ではなく
+    口座ごとの取引数（1件目からの通し番号）にして、取引の期間が異なる口座を並べて比べられるようにする。
+    描く口座がない場合はNoneを返す。
+    """
+    curves = {account: df for account, df in curves.items() if not df.empty}
+    if not curves:
+        return None
+    import altair as alt
+    # 全口座の合計がブラウザに送る点数の上限に収まるように、口座ごとの解像度を決める
+    account_resolution = max(1, min(resolution, CHART_MAX_POINTS // (2 * max(len(curves), 1)) - 1))
+    frames = []
+    total_trades = 0
+    for account, df in curves.items():
+        total_trades += len(df)
+        curve_df = pd.DataFrame({'取引日付': df['取引日付'].dt.tz_localize(None), '取引数': np.arange(1, len(df) + 1), '累積損益': df['累積利益'].to_numpy()})
+        frames.append(downsample_minmax(curve_df, '累積損益', account_resolution).assign(口座=account))
+    line_df = pd.concat(frames, ignore_index=True)
+    title = '口座別の累積損益推移'
+    if len(line_df) < total_trades:
+        title += f'（{total_trades:,}件中{len(line_df):,}点を表示）'
+    x = alt.X('取引数:Q', title='取引数') if by_trade else alt.X('取引日付:T', title='日付')
+    return alt.Chart(line_df).mark_line().encode(
+        x=x,
+        y=alt.Y('累積損益', title='累積損益 (¥)', axis=alt.Axis(format='s')),
+        color=alt.Color('口座', scale=alt.Scale(scheme='category20')),
+        tooltip=[
+            '口座',
+            alt.Tooltip('取引日付', title='日付', format="%Y-%m-%d %H:%M:%S"),
+            alt.Tooltip('取引数', format=","),
+            alt.Tooltip('累積損益', format=","),
+        ]
+    ).properties(title=title).interactive()
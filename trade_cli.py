@@ -0,0 +1,125 @@
+"""取引履歴CSVをStreamlitを使わずに一括で加工するコマンドラインツール
+
+口座ごとに加工済みデータのParquetと要約統計量のJSONを出力ディレクトリに書き出す。
+
+使い方:
+    python trade_cli.py exports/ "archive/**/*.csv" -o processed --workers 8
+    python trade_cli.py exports/ --account-from-dir   # exports/<口座>/*.csv を口座ごとにまとめる
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import sys
+import time
+from functools import partial
+
+import numpy as np
+
+from trade_accounts import iter_account_results, process_account, raise_for_errors
+
+
+class AccountNameConflictError(ValueError):
+    """異なる場所のファイルが同じ口座名にまとめられてしまう場合の例外"""
+    def __init__(self, conflicts):
+        lines = [f"  {account}: {', '.join(sources)}" for account, sources in conflicts.items()]
+        super().__init__(
+            "⚠️ エラー：異なるファイル（--account-from-dir の場合はディレクトリ）が同じ口座名になります。"
+            "名前を変えるか、入力を分けて実行してください。\n" + "\n".join(lines)
+        )
+        self.conflicts = conflicts
+
+
+def find_trade_files(inputs):
+    """ファイル・ディレクトリ・globパターンの指定から、CSVファイルのパスを重複なく返す関数"""
+    paths = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, '**', '*.csv'), recursive=True)
+        else:
+            matches = glob.glob(pattern, recursive=True)
+        paths.extend(sorted(matches))
+    return list(dict.fromkeys(os.path.abspath(path) for path in paths))
+
+def group_by_account(paths, account_from_dir=False):
+    """CSVファイルを口座ごとにまとめる関数。口座名はファイル名（account_from_dir=Trueの場合は親ディレクトリ名）
+
+    異なるファイル（account_from_dir=Trueの場合は異なるディレクトリ）が同じ口座名になる場合は、
+    別の口座の取引を混ぜてしまわないよう AccountNameConflictError を送出する。
+    """
+    accounts, sources = {}, {}
+    for path in paths:
+        source = os.path.dirname(path) if account_from_dir else path
+        account = os.path.basename(source) if account_from_dir else os.path.splitext(os.path.basename(path))[0]
+        accounts.setdefault(account, []).append(path)
+        sources.setdefault(account, {})[source] = None
+    conflicts = {account: list(found) for account, found in sources.items() if len(found) > 1}
+    if conflicts:
+        raise AccountNameConflictError(conflicts)
+    return accounts
+
+def _to_json_value(value):
+    """要約統計量の値をJSONに書き込める型に変換する（NaNはnull）"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+def write_account_outputs(account, paths, output_dir):
+    """1口座分のCSVを process_account で加工し、Parquetと要約統計量のJSONを書き出して行数を返す関数（ワーカーで実行する）"""
+    result = raise_for_errors(process_account(account, paths))
+    df = result['df']
+    df.to_parquet(os.path.join(output_dir, f"{account}.parquet"), index=False, engine='pyarrow')
+    stats = {key: _to_json_value(value) for key, value in result['stats'].items()}
+    summary = {'account': account, 'source_files': paths, 'stats': stats}
+    with open(os.path.join(output_dir, f"{account}.json"), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    return len(df)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="取引履歴CSVを加工し、口座ごとのParquetと要約統計量のJSONを書き出します。")
+    parser.add_argument('inputs', nargs='+', help="CSVファイル・ディレクトリ・globパターン（ディレクトリは配下のCSVをすべて読み込む）")
+    parser.add_argument('-o', '--output-dir', default='processed', help="出力先ディレクトリ（既定: processed）")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1, help="並列に処理するプロセス数（既定: CPUコア数）")
+    parser.add_argument('--account-from-dir', action='store_true', help="親ディレクトリ名を口座名とし、同じディレクトリのCSVをまとめて加工する")
+    args = parser.parse_args(argv)
+
+    paths = find_trade_files(args.inputs)
+    if not paths:
+        print("⚠️ CSVファイルが見つかりません。", file=sys.stderr)
+        return 1
+    try:
+        accounts = group_by_account(paths, args.account_from_dir)
+    except AccountNameConflictError as e:
+        print(e, file=sys.stderr)
+        return 1
+    workers = max(1, min(args.workers, len(accounts)))
+    os.makedirs(args.output_dir, exist_ok=True)
+    print(f"{len(paths):,}ファイル / {len(accounts):,}口座を{workers}プロセスで加工します。", flush=True)
+
+    started = time.perf_counter()
+    total_rows, failures = 0, 0
+    write_outputs = partial(write_account_outputs, output_dir=args.output_dir)
+    for done, result in enumerate(iter_account_results(write_outputs, accounts, workers), start=1):
+        elapsed = time.perf_counter() - started
+        if result['error'] is not None:
+            failures += 1
+            print(f"[{done}/{len(accounts)}] ❌ {result['account']}: {result['error']}", file=sys.stderr, flush=True)
+            continue
+        total_rows += result['result']
+        print(
+            f"[{done}/{len(accounts)}] ✅ {result['account']}: {result['result']:,}行 ({result['seconds']:.2f}秒) "
+            f"/ 累計 {total_rows:,}行 ({total_rows / elapsed:,.0f}行/秒)",
+            flush=True
+        )
+    elapsed = time.perf_counter() - started
+    print(f"完了: {len(accounts) - failures:,}口座 / {total_rows:,}行 / {elapsed:.1f}秒 ({total_rows / elapsed:,.0f}行/秒)")
+    if failures:
+        print(f"⚠️ {failures:,}口座の加工に失敗しました。", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
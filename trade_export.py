@@ -0,0 +1,104 @@
+import gzip
+import io
+
+import pandas as pd
+
+from trade_processing import enforce_processed_schema
+
+# ダウンロード形式ごとの (拡張子, MIMEタイプ)
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'Excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'Feather': ('feather', 'application/vnd.apache.arrow.file'),
+}
+GZIP_EXPORT_FORMAT = ('csv.gz', 'application/gzip')
+EXPORT_CHUNK_ROWS = 50_000  # CSV・Excelを書き出す際の1チャンクあたりの行数
+EXCEL_MAX_ROWS = 1_048_575  # Excelの1シートに書き込めるデータ行数（見出し行を除く）
+EXCEL_SHEET_NAME = '加工データ'
+EXCEL_EPOCH = pd.Timestamp('1899-12-30')  # Excelのシリアル値の起点
+
+
+def export_csv(df, compress=False, chunk_rows=EXPORT_CHUNK_ROWS):
+    """取引データをチャンクごとにCSVへ書き出し、バイト列で返す関数。compress=Trueの場合はgzipで圧縮する"""
+    buffer = io.BytesIO()
+    stream = gzip.GzipFile(fileobj=buffer, mode='wb', mtime=0) if compress else buffer
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    for start in range(0, max(len(df), 1), chunk_rows):
+        df.iloc[start:start + chunk_rows].to_csv(text, index=False, header=start == 0)
+    text.flush()
+    text.detach()
+    if compress:
+        stream.close()
+    return buffer.getvalue()
+
+def _excel_column_values(series):
+    """列をxlsxwriterで書き込める値のリストに変換する関数（日時は日本時間のシリアル値、欠損はNone）"""
+    values = series
+    if isinstance(series.dtype, pd.DatetimeTZDtype):
+        values = series.dt.tz_localize(None)
+    if pd.api.types.is_datetime64_dtype(values.dtype):
+        values = (values - EXCEL_EPOCH) / pd.Timedelta(days=1)
+    return values.astype(object).where(series.notna(), None).tolist()
+
+def export_excel(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    """取引データをxlsxwriterの省メモリモードでExcelへ書き出し、バイト列で返す関数
+
+    省メモリモードでは行の順に書き込む必要があるため、pandasを介さず1行ずつ書き込む。
+    Excelはタイムゾーン付きの日時を扱えないため、日時は日本時間の値で書き込む。
+    """
+    if len(df) > EXCEL_MAX_ROWS:
+        raise ValueError(f"Excelの1シートに書き込める行数（{EXCEL_MAX_ROWS:,}行）を超えています。CSVやParquet形式を選択してください。")
+    import xlsxwriter  # Excel形式を選んだときだけ読み込む
+    buffer = io.BytesIO()
+    workbook = xlsxwriter.Workbook(buffer, {'constant_memory': True})
+    worksheet = workbook.add_worksheet(EXCEL_SHEET_NAME)
+    header_format = workbook.add_format({'bold': True})
+    date_format = workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'})
+    for col_num, col in enumerate(df.columns):
+        if pd.api.types.is_datetime64_any_dtype(df[col].dtype):
+            worksheet.set_column(col_num, col_num, 20, date_format)
+    worksheet.write_row(0, 0, list(df.columns), header_format)
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        columns = [_excel_column_values(chunk[col]) for col in chunk.columns]
+        for offset, row in enumerate(zip(*columns), start=start + 1):
+            worksheet.write_row(offset, 0, row)
+    workbook.close()
+    return buffer.getvalue()
+
+def export_parquet(df):
+    """取引データを列の型を保ったままParquetへ書き出し、バイト列で返す関数"""
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False, engine='pyarrow')
+    return buffer.getvalue()
+
+def export_feather(df):
+    """取引データを列の型を保ったままFeatherへ書き出し、バイト列で返す関数"""
+    buffer = io.BytesIO()
+    df.reset_index(drop=True).to_feather(buffer)
+    return buffer.getvalue()
+
+def read_exported(source, download_format):
+    """ParquetかFeatherで書き出した取引データを読み込み、列の型を加工済みデータと同じにそろえて返す関数
+
+    pandasのメタデータには文字列列の保存形式が残らず、取引番号が string[python] で読み込まれるため、
+    読み込んだ後に PROCESSED_SCHEMA の型へ戻す。
+    """
+    if download_format == 'Parquet':
+        return enforce_processed_schema(pd.read_parquet(source, engine='pyarrow'))
+    if download_format == 'Feather':
+        return enforce_processed_schema(pd.read_feather(source))
+    raise ValueError(f"読み込みに対応していない形式です: {download_format}")
+
+def export_trade_data(df, download_format, compress=False):
+    """取引データを指定した形式のバイト列に変換する関数。compressはCSVの場合だけ使う"""
+    if download_format == 'CSV':
+        return export_csv(df, compress=compress)
+    if download_format == 'Excel':
+        return export_excel(df)
+    if download_format == 'Parquet':
+        return export_parquet(df)
+    if download_format == 'Feather':
+        return export_feather(df)
+    raise ValueError(f"未対応のダウンロード形式です: {download_format}")
@@ -0,0 +1,125 @@
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+INSTRUMENTATION_ENV = "TRADE_INSTRUMENTATION"  # 1 にすると計測を既定で有効にする
+INSTRUMENTATION_LOG_ENV = "TRADE_INSTRUMENTATION_LOG"  # 計測ログの出力先ファイル（未指定なら標準エラー出力）
+LOGGER_NAME = "trade_instrumentation"
+
+
+def instrumentation_enabled_by_env():
+    """環境変数で計測が有効にされているかどうかを返す関数"""
+    return os.environ.get(INSTRUMENTATION_ENV, '').lower() in ('1', 'true', 'yes', 'on')
+
+def get_instrumentation_logger():
+    """計測結果を1行1JSONで書き出すロガーを返す関数（初回呼び出し時に出力先を設定する）"""
+    logger = logging.getLogger(LOGGER_NAME)
+    if not logger.handlers:
+        log_path = os.environ.get(INSTRUMENTATION_LOG_ENV)
+        handler = logging.FileHandler(log_path, encoding='utf-8') if log_path else logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+# --- メモリ ---
+def _read_proc_status(field):
+    """/proc/self/status の値 (MB) を返す（Linux以外ではNone）"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def current_rss_mb():
+    """プロセスの現在の常駐メモリ (MB) を返す関数（取得できない環境ではNone）"""
+    return _read_proc_status('VmRSS:')
+
+def peak_rss_mb():
+    """前回のリセット以降の最大常駐メモリ (MB) を返す関数（取得できない環境ではNone）"""
+    return _read_proc_status('VmHWM:')
+
+def reset_peak_rss():
+    """プロセスの最大常駐メモリ (VmHWM) を現在値に戻す関数（Linux以外では何もしない）"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+class StageTimer:
+    """処理段階ごとの所要時間・行数・メモリ増減を記録するクラス
+
+    enabled=False の場合は何も計測しない。メモリは既定では常駐メモリの増減で、trace_memory=True の場合は
+    tracemallocで追跡した割り当ての増減とピークを記録する（計測のオーバーヘッドが大きい）。
+    track_peak=True の場合は段階ごとの最大常駐メモリも記録する（プロセス全体のVmHWMをリセットする）。
+    log=True の場合は、段階ごとの記録を構造化ログとして書き出す。
+    """
+    def __init__(self, enabled=True, trace_memory=False, track_peak=False, run_id=None, log=False):
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self.track_peak = track_peak
+        self.run_id = run_id
+        self.log = log
+        self.stages = []
+
+    def _memory_mb(self):
+        if self.trace_memory:
+            return tracemalloc.get_traced_memory()[0] / 1024 ** 2
+        return current_rss_mb()
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """with文の範囲を1段階として計測する。行数が後で決まる場合は、返される記録の rows を書き換える"""
+        record = {'stage': name, 'seconds': None, 'rows': rows, 'memory_delta_mb': None, 'peak_mb': None}
+        if not self.enabled:
+            yield record
+            return
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        elif self.track_peak:
+            reset_peak_rss()
+        memory_before = self._memory_mb()
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - started
+            memory_after = self._memory_mb()
+            if memory_before is not None and memory_after is not None:
+                record['memory_delta_mb'] = memory_after - memory_before
+            if self.trace_memory:
+                record['peak_mb'] = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+            elif self.track_peak:
+                record['peak_mb'] = peak_rss_mb()
+            self.stages.append(record)
+            if self.log:
+                self._log_record(record)
+
+    def add(self, name, seconds, rows=None):
+        """with文の外で計測した段階（起動時のモジュールの読み込みなど）を記録する"""
+        if not self.enabled:
+            return
+        record = {'stage': name, 'seconds': seconds, 'rows': rows, 'memory_delta_mb': None, 'peak_mb': None}
+        self.stages.append(record)
+        if self.log:
+            self._log_record(record)
+
+    def _log_record(self, record):
+        entry = {'event': 'stage', 'timestamp': datetime.now().isoformat(timespec='milliseconds'), 'run_id': self.run_id}
+        entry.update(record)
+        get_instrumentation_logger().info(json.dumps(entry, ensure_ascii=False, default=str))
+
+    def total_seconds(self):
+        """記録した段階の所要時間の合計を返す"""
+        return sum(record['seconds'] for record in self.stages)
@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from trade_instrumentation import StageTimer
+
+MAX_FINISHED_JOBS = 4  # 結果を取りに来るまで保持しておく完了済みジョブの数
+
+
+class JobProgress:
+    """バックグラウンド処理の進捗（処理段階・処理済みファイル数・行数）をスレッド間で共有するクラス"""
+    def __init__(self, files_total=0, timer=None):
+        self.files_total = files_total
+        self.timer = timer or StageTimer(enabled=False)
+        self._lock = threading.Lock()
+        self._stage = '開始待ち'
+        self._files_done = 0
+        self._rows = 0
+        self._started = time.monotonic()
+
+    @contextmanager
+    def stage(self, name, label, rows=None):
+        """with文の範囲を1段階として、表示用の段階名を切り替えながら計測する"""
+        with self._lock:
+            self._stage = label
+        with self.timer.stage(name, rows) as record:
+            yield record
+
+    def add(self, files=0, rows=0):
+        """処理済みのファイル数・行数を加算する"""
+        with self._lock:
+            self._files_done += files
+            self._rows += rows
+
+    def set_files_done(self, files_done):
+        """処理済みのファイル数を設定する"""
+        with self._lock:
+            self._files_done = files_done
+
+    def snapshot(self):
+        """現在の進捗を辞書で返す"""
+        with self._lock:
+            return {
+                'stage': self._stage,
+                'files_done': self._files_done,
+                'files_total': self.files_total,
+                'rows': self._rows,
+                'seconds': time.monotonic() - self._started,
+            }
+
+
+class BackgroundJob:
+    """関数をデーモンスレッドで実行し、結果・例外・進捗を保持するクラス
+
+    target は第1引数に JobProgress を受け取り、進捗を書き込みながら処理する。
+    """
+    def __init__(self, target, *args, files_total=0, timer=None):
+        self.progress = JobProgress(files_total, timer)
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(target, args), daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self, target, args):
+        try:
+            self.result = target(self.progress, *args)
+        except Exception as e:
+            self.error = e
+        finally:
+            self._done.set()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """完了するまで（最大 timeout 秒）待ち、完了したかどうかを返す"""
+        return self._done.wait(timeout)
+
+
+class JobRegistry:
+    """キーごとにバックグラウンド処理を保持し、同じキーの処理を重複して起動しないようにするクラス
+
+    再実行やページの再読み込みの後でも、同じキーで問い合わせれば実行中・完了済みの処理を引き継げる。
+    完了済みの処理は、新しい順に MAX_FINISHED_JOBS 件まで保持する。結果を別の場所（キャッシュなど）に移した処理は、
+    結果を二重に保持しないよう discard で取り除く。
+    """
+    def __init__(self, max_finished=MAX_FINISHED_JOBS):
+        self.max_finished = max_finished
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._jobs.get(key)
+
+    def get_or_start(self, key, target, *args, files_total=0, timer=None):
+        """キーに対応する処理を返す。まだなければ起動する"""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                self._jobs.move_to_end(key)
+                return job
+            job = BackgroundJob(target, *args, files_total=files_total, timer=timer).start()
+            self._jobs[key] = job
+            finished = [k for k, j in self._jobs.items() if j.done]
+            for k in finished[:max(len(finished) - self.max_finished, 0)]:
+                del self._jobs[k]
+            return job
+
+    def discard(self, key):
+        """キーに対応する処理を取り除く（実行中の処理は止めない）"""
+        with self._lock:
+            self._jobs.pop(key, None)
+
+    def __len__(self):
+        return len(self._jobs)
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+TRADE_WINDOWS = [20, 50, 100]  # 取引数の窓
+TIME_WINDOWS = {'1時間': '1h', '1日': '1D', '1週間': '7D'}  # 時間の窓（表示名: pandasの期間表記）
+METRIC_GROUP_COLUMNS = ['取引銘柄', 'HIGH/LOW']  # 移動指標を分けて計算できる列
+ROLLING_METRICS = ['勝率', 'プロフィットファクター', 'リスクリワード', 'ドローダウン期間 (時間)', 'ドローダウン取引数']
+NS_PER_HOUR = 3_600_000_000_000
+
+
+def _timestamps_ns(series):
+    """日時の列をint64のナノ秒（UTC基準）の配列で返す"""
+    return series.dt.as_unit('ns').array.asi8
+
+def _group_order(df, group):
+    """グループごとに取引日付順で並べた行の位置と、並べた後の各行が属するグループの先頭位置を返す"""
+    times = _timestamps_ns(df['取引日付'])
+    # 取引日付順に並んでいれば（通常の加工済みデータ）、グループ番号だけの安定ソートで済む
+    is_sorted = df['取引日付'].is_monotonic_increasing
+    if group is None:
+        order = np.arange(len(df)) if is_sorted else np.argsort(times, kind='stable')
+        return order, np.zeros(len(df), dtype=np.int64)
+    codes, _ = pd.factorize(df[group])
+    order = np.argsort(codes, kind='stable') if is_sorted else np.lexsort((times, codes))
+    sorted_codes = codes[order]
+    group_starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]]) if len(df) else np.array([], dtype=np.int64)
+    group_sizes = np.diff(np.append(group_starts, len(df)))
+    return order, np.repeat(group_starts, group_sizes)
+
+def window_starts(times, group_start, window):
+    """各行を末尾とする窓の先頭位置を返す関数。windowは取引数（整数）か期間（'1h'など）
+
+    times はグループごと・時刻順に並べた日時（int64のナノ秒）、group_start は各行が属するグループの先頭位置。
+    期間の窓は (時刻 - 期間, 時刻] の範囲で、グループごとの二分探索で先頭を求める。
+    """
+    positions = np.arange(len(times))
+    if isinstance(window, (int, np.integer)):
+        return np.maximum(group_start, positions + 1 - window)
+    width = pd.Timedelta(window).value
+    starts = np.empty(len(times), dtype=np.int64)
+    block_starts = group_start[np.r_[True, group_start[1:] != group_start[:-1]]] if len(times) else group_start
+    for first, last in zip(block_starts, np.append(block_starts[1:], len(times))):
+        block = times[first:last]
+        starts[first:last] = first + np.searchsorted(block, block - width, side='right')
+    return starts
+
+def window_sums(values, starts):
+    """累積和の差で、各行を末尾とする窓 [starts, 行] の合計を一括で求める関数"""
+    prefix = np.concatenate(([0], np.cumsum(values)))
+    return prefix[1:] - prefix[starts]
+
+def rolling_metrics(df, window, group=None):
+    """移動勝率・移動プロフィットファクター・移動リスクリワードとドローダウン期間を、行ごとに一括で計算する関数
+
+    窓は取引数（例: 50）か期間（例: '1D'）で指定し、group を指定するとその列の値ごとに別々に計算する。
+    ドローダウン期間・取引数は窓によらず、グループ内で直前に累積損益のピークを付けてからの経過を表す。
+    結果は取引日付順（group指定時はグループ内で取引日付順）に並び、元の行のインデックスを持つ。
+    """
+    order, group_start = _group_order(df, group)
+    n = len(order)
+    times = _timestamps_ns(df['取引日付'])[order]
+    profit = df['利益'].to_numpy(dtype=np.int64)[order]
+    is_win = df['結果(数値)'].to_numpy(dtype=np.int64)[order]
+    starts = window_starts(times, group_start, window)
+
+    trades = np.arange(1, n + 1) - starts
+    gross_profit = window_sums(np.where(profit > 0, profit, 0), starts)
+    gross_loss = window_sums(np.where(profit < 0, -profit, 0), starts)
+    profit_trades = window_sums(profit > 0, starts)
+    loss_trades = window_sums(profit < 0, starts)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        win_rate = window_sums(is_win, starts) / trades
+        profit_factor = np.where(gross_loss > 0, gross_profit / gross_loss, np.nan)
+        risk_reward = np.where(
+            (profit_trades > 0) & (loss_trades > 0),
+            (gross_profit / profit_trades) / (gross_loss / loss_trades), np.nan
+        )
+
+    # グループ内の累積損益とピーク。各グループの先頭行は必ずピークになるため、
+    # 直前のピークの位置は全体の累積最大で求められる
+    cumulative = window_sums(profit, group_start)
+    peak = pd.Series(cumulative).groupby(group_start).cummax().to_numpy()
+    positions = np.arange(n)
+    last_peak = np.maximum.accumulate(np.where(cumulative >= peak, positions, 0)) if n else positions
+
+    result = pd.DataFrame({
+        '取引日付': df['取引日付'].array[order],
+        '取引数': trades,
+        '勝率': win_rate,
+        'プロフィットファクター': profit_factor,
+        'リスクリワード': risk_reward,
+        'ドローダウン期間 (時間)': (times - times[last_peak]) / NS_PER_HOUR,
+        'ドローダウン取引数': positions - last_peak,
+    }, index=df.index[order])
+    if group is not None:
+        result.insert(1, group, df[group].array[order])
+    return result
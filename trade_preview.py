@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+PREVIEW_PAGE_SIZES = [50, 100, 500, 1000]
+DEFAULT_PREVIEW_PAGE_SIZE = 100
+PREVIEW_FILTER_COLUMNS = ['取引銘柄', 'HIGH/LOW', '結果(数値)']  # 値を選んで絞り込める列
+PREVIEW_DATE_COLUMN = '取引日付'
+
+
+def filter_values(df, column):
+    """絞り込みの選択肢として、列に出現する値を並べて返す関数"""
+    values = df[column].dropna()
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        present = set(values.unique())
+        return [value for value in values.cat.categories if value in present]
+    return sorted(values.unique().tolist())
+
+def preview_positions(df, filters=None, date_range=None, sort_column=None, ascending=True):
+    """絞り込み・並べ替えを適用した行の位置を返す関数。条件がない場合はNone（先頭から順に表示）
+
+    filters は {列名: 選択した値のリスト}、date_range は取引日付の (開始, 終了)。
+    """
+    mask = None
+    for column, selected in (filters or {}).items():
+        if selected:
+            column_mask = df[column].isin(selected).to_numpy()
+            mask = column_mask if mask is None else mask & column_mask
+    if date_range is not None:
+        dates = df[PREVIEW_DATE_COLUMN]
+        date_mask = ((dates >= date_range[0]) & (dates <= date_range[1])).to_numpy()
+        mask = date_mask if mask is None else mask & date_mask
+    if mask is None and sort_column is None:
+        return None
+    positions = np.flatnonzero(mask) if mask is not None else np.arange(len(df))
+    if sort_column is not None:
+        values = df[sort_column].iloc[positions].reset_index(drop=True)
+        order = values.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+        positions = positions[order]
+    return positions
+
+def preview_page(df, positions, page, page_size):
+    """1ページ分の行を返す関数（pageは0始まり）"""
+    start = page * page_size
+    if positions is None:
+        return df.iloc[start:start + page_size]
+    return df.iloc[positions[start:start + page_size]]
+
+def column_summary(df):
+    """列ごとの型・欠損のない件数・ユニーク数・最小値・最大値を表にして返す関数"""
+    rows = []
+    for column in df.columns:
+        series = df[column]
+        row = {'列': column, '型': str(series.dtype), '件数': int(series.count()), 'ユニーク数': int(series.nunique())}
+        if pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_datetime64_any_dtype(series.dtype):
+            row['最小値'] = str(series.min())
+            row['最大値'] = str(series.max())
+        else:
+            row['最小値'] = row['最大値'] = ''
+        rows.append(row)
+    return pd.DataFrame(rows, columns=['列', '型', '件数', 'ユニーク数', '最小値', '最大値'])
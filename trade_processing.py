@@ -0,0 +1,452 @@
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+REQUIRED_COLUMNS = ['日付', '購入金額', 'ペイアウト', '終了時刻', '判定レート', 'レート', '取引オプション', '取引銘柄', 'HIGH/LOW', '取引番号']
+DROP_COLUMNS = ['日付', '終了時刻', '判定レート', 'レート', '取引オプション', '取引時刻', '終了日時']
+CUMULATIVE_COLUMNS = ['累積利益', 'ピーク', 'ドローダウン']
+STREAM_CHUNK_ROWS = 100_000  # ストリーミング読み込み時の1チャンクあたりの行数
+# スレッドの動いているプロセス（Streamlitのサーバー）からプロセスプールを起動する際の開始方式
+POOL_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+# 証券会社CSVの日時「="dd/mm/YYYY HH:MM:SS"」の文字数・記号の位置・数字の位置
+TIMESTAMP_WIDTH = 22
+TIMESTAMP_LITERALS = {0: '=', 1: '"', 4: '/', 7: '/', 12: ' ', 15: ':', 18: ':', 21: '"'}
+TIMESTAMP_DIGITS = [2, 3, 5, 6, 8, 9, 10, 11, 13, 14, 16, 17, 19, 20]
+
+# CSV読み込み時に指定する列の型（文字列のまま保持せず、読み込み時点でコンパクトな型にする）
+RAW_CSV_DTYPES = {
+    '取引番号': 'string[pyarrow]',
+    '取引銘柄': 'category',
+    'HIGH/LOW': 'category',
+}
+
+# 加工済みデータの列ごとの型
+PROCESSED_SCHEMA = {
+    '取引番号': 'string[pyarrow]',
+    '取引銘柄': 'category',
+    'HIGH/LOW': 'category',
+    '購入金額': 'int32',
+    'ペイアウト': 'int32',
+    '取引日付': 'datetime64[ns, Asia/Tokyo]',
+    '利益': 'int32',
+    '結果(数値)': 'int8',
+    '曜日': 'category',
+    '時間帯': 'category',
+    '取引時間_秒': 'int32',
+    '取引時間': 'category',
+    '累積利益': 'int64',
+    'ピーク': 'int64',
+    'ドローダウン': 'int64',
+}
+
+# 従来（型指定なし）の加工済みデータでの列の型。メモリ比較用
+LEGACY_SCHEMA = {
+    '取引番号': 'object',
+    '取引銘柄': 'object',
+    'HIGH/LOW': 'object',
+    '購入金額': 'int64',
+    'ペイアウト': 'int64',
+    '利益': 'int64',
+    '結果(数値)': 'int64',
+    '取引時間_秒': 'float64',
+}
+
+# 取引時間の区分（下限秒, 上限秒, ラベル）。いずれにも当てはまらない場合は「その他」
+DURATION_BINS = [
+    (15, 15, '15秒'),
+    (30, 30, '30秒'),
+    (60, 60, '60秒'),
+    (170, 190, '3分'),
+    (290, 310, '5分'),
+]
+DURATION_OTHER = 'その他'
+
+
+class TradeDataError(ValueError):
+    """取引データの形式が不正な場合の例外"""
+
+
+class MissingColumnsError(TradeDataError):
+    """CSVファイルに必要な列が不足している場合の例外"""
+    def __init__(self, missing_columns, columns):
+        super().__init__(f"⚠️ エラー：CSVファイルに必要な列が見つかりません。見つからなかった列: {', '.join(missing_columns)}")
+        self.missing_columns = missing_columns
+        self.columns = columns
+
+    def __reduce__(self):
+        # プロセスプールから結果として返せるよう、コンストラクタ引数で復元する
+        return (type(self), (self.missing_columns, self.columns))
+
+
+class InvalidTimestampError(TradeDataError):
+    """日付または終了時刻が解釈できない場合の例外"""
+    def __init__(self):
+        super().__init__("⚠️ エラー：日付または終了時刻の形式が無効です。CSVファイルを確認してください。")
+
+    def __reduce__(self):
+        return (type(self), ())
+
+
+def categorize_duration(seconds):
+    """取引時間をカテゴリに分類する関数"""
+    for lower, upper, label in DURATION_BINS:
+        if lower <= seconds <= upper:
+            return label
+    return DURATION_OTHER
+
+def categorize_durations(seconds):
+    """取引時間の配列をまとめてカテゴリに分類する関数（categorize_durationのベクトル版）"""
+    values = np.asarray(seconds, dtype=float)
+    lowers = np.array([lower for lower, _, _ in DURATION_BINS], dtype=float)
+    uppers = np.array([upper for _, upper, _ in DURATION_BINS], dtype=float)
+    labels = [label for _, _, label in DURATION_BINS] + [DURATION_OTHER]
+    # 下限の二分探索で候補の区分を求め、上限以内なら採用、それ以外（NaNを含む）は「その他」
+    idx = np.searchsorted(lowers, values, side='right') - 1
+    in_bin = (idx >= 0) & (values <= uppers[np.clip(idx, 0, None)])
+    codes = np.where(in_bin, idx, len(DURATION_BINS))
+    # apply(...).astype('category') と同じく、出現したラベルのみを辞書順のカテゴリとする
+    present = np.flatnonzero(np.bincount(codes, minlength=len(labels)))
+    categories = sorted(labels[i] for i in present)
+    remap = np.full(len(labels), -1, dtype=np.int64)
+    for i in present:
+        remap[i] = categories.index(labels[i])
+    return pd.Categorical.from_codes(remap[codes], categories=categories)
+
+def max_streaks(is_win):
+    """勝敗の配列から最大連勝数と最大連敗数をランレングス符号化で求める関数"""
+    is_win = np.asarray(is_win, dtype=bool)
+    if is_win.size == 0:
+        return 0, 0
+    run_starts = np.concatenate(([0], np.flatnonzero(is_win[1:] != is_win[:-1]) + 1))
+    run_lengths = np.diff(np.append(run_starts, is_win.size))
+    run_is_win = is_win[run_starts]
+    max_wins = int(run_lengths[run_is_win].max()) if run_is_win.any() else 0
+    max_losses = int(run_lengths[~run_is_win].max()) if not run_is_win.all() else 0
+    return max_wins, max_losses
+
+def read_trade_csv(source, **kwargs):
+    """取引CSVを、RAW_CSV_DTYPESの型を指定して読み込む関数"""
+    return pd.read_csv(source, dtype=RAW_CSV_DTYPES, **kwargs)
+
+def parse_amounts(series):
+    """「¥1,000」形式の金額を整数に変換する関数。int32に収まる場合はint32にする"""
+    values = pd.to_numeric(series.str.replace('¥', '').str.replace(',', ''), errors='coerce').fillna(0)
+    if values.empty or values.abs().max() < np.iinfo(np.int32).max:
+        return values.astype(np.int32)
+    return values.astype(np.int64)
+
+def validate_columns(df):
+    """必要な列が揃っているか確認する関数"""
+    missing_cols = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing_cols:
+        raise MissingColumnsError(missing_cols, list(df.columns))
+
+def _parse_timestamps_slow(series):
+    """日時の文字列を pd.to_datetime で解析する関数（固定幅の形式に合わない値向け。不正な値はNaT）"""
+    return pd.to_datetime(series.str.strip('="').str.strip('"'), format="%d/%m/%Y %H:%M:%S", errors='coerce')
+
+def parse_broker_timestamps(series):
+    """「="dd/mm/YYYY HH:MM:SS"」形式の文字列を日本時間の日時に変換する関数（不正な値はNaT）
+
+    固定幅の文字位置から数字を取り出してdatetime64を組み立てる。形式に合わない行だけは
+    従来どおり pd.to_datetime で解析するため、結果（NaTになる行を含む）は従来と同じになる。
+    """
+    n = len(series)
+    # 1文字多い幅で変換し、最後の文字が空であることで長すぎる値を除く
+    values = np.asarray(series.to_numpy(dtype=object), dtype=f'<U{TIMESTAMP_WIDTH + 1}')
+    codes = values.view(np.uint32).reshape(n, TIMESTAMP_WIDTH + 1)
+    matched = codes[:, TIMESTAMP_WIDTH] == 0
+    for pos, char in TIMESTAMP_LITERALS.items():
+        matched &= codes[:, pos] == ord(char)
+    digits = codes[:, TIMESTAMP_DIGITS].astype(np.int64) - ord('0')
+    matched &= ((digits >= 0) & (digits <= 9)).all(axis=1)
+
+    def field(start, width):
+        value = np.zeros(n, dtype=np.int64)
+        for i in range(start, start + width):
+            value = value * 10 + digits[:, i]
+        return value
+    day, month, year = field(0, 2), field(2, 2), field(4, 4)
+    hour, minute, second = field(8, 2), field(10, 2), field(12, 2)
+    # datetime64[ns]で表せる範囲外の年は従来の方法に任せる
+    matched &= (month >= 1) & (month <= 12) & (year >= 1700) & (year <= 2200)
+    matched &= (hour < 24) & (minute < 60) & (second < 60)
+    month_start = (np.where(matched, year, 1970) - 1970).astype('M8[Y]').astype('M8[M]') + (np.where(matched, month, 1) - 1).astype('m8[M]')
+    days_in_month = ((month_start + 1).astype('M8[D]') - month_start.astype('M8[D]')).astype(np.int64)
+    matched &= (day >= 1) & (day <= days_in_month)
+
+    seconds = (day - 1) * 86400 + hour * 3600 + minute * 60 + second
+    parsed = (month_start.astype('M8[s]') + seconds.astype('m8[s]')).astype('M8[ns]')
+    parsed[~matched] = np.datetime64('NaT')
+    result = pd.Series(parsed, index=series.index)
+    if not matched.all():
+        result[~matched] = _parse_timestamps_slow(series[~matched]).to_numpy()
+    return result.dt.tz_localize('Asia/Tokyo')
+
+def parse_trade_timestamps(df):
+    """「="dd/mm/YYYY HH:MM:SS"」形式の日付・終了時刻を日本時間の日時に変換する関数（dfを直接書き換える）"""
+    df['取引日付'] = parse_broker_timestamps(df['日付'])
+    df['終了日時'] = parse_broker_timestamps(df['終了時刻'])
+
+    if df['取引日付'].isna().any() or df['終了日時'].isna().any():
+        raise InvalidTimestampError()
+    return df
+
+def parse_trade_amounts(df):
+    """購入金額・ペイアウトを整数に変換し、利益を追加する関数（dfを直接書き換える）"""
+    df['購入金額'] = parse_amounts(df['購入金額'])
+    df['ペイアウト'] = parse_amounts(df['ペイアウト'])
+    df['利益'] = df['ペイアウト'] - df['購入金額']
+    return df
+
+def add_trade_features(df):
+    """勝敗・曜日・時間帯・取引時間など、行ごとに完結する派生列を追加する関数（dfを直接書き換える）"""
+    # 勝敗は 結果(数値)（勝ち=1, 負け=0）だけで持つ。WIN/LOSEの表示はグラフ側で付ける
+    df['結果(数値)'] = (df['利益'] > 0).to_numpy().astype(np.int8)
+    df['曜日'] = df['取引日付'].dt.day_name().astype('category')
+    df['時間帯'] = pd.cut(df['取引日付'].dt.hour, bins=[0, 6, 12, 18, 24], labels=['深夜', '午前', '午後', '夜'], right=False).astype('category')
+
+    # 日時は秒単位のため、取引時間は整数秒で保持する
+    df['取引時間_秒'] = ((df['終了日時'] - df['取引日付']) // pd.Timedelta(seconds=1)).astype(np.int32)
+    df['取引時間'] = categorize_durations(df['取引時間_秒'])
+    return df
+
+def add_derived_columns(df):
+    """日付・金額の解析と、行ごとに完結する派生列の追加を行う関数（dfを直接書き換える）"""
+    parse_trade_timestamps(df)
+    parse_trade_amounts(df)
+    add_trade_features(df)
+    return df
+
+def add_cumulative_columns(df, last_cumulative_profit=0, last_peak=None):
+    """累積利益・ピーク・ドローダウンを追加する関数。直前までの累積値を引き継いで計算できる"""
+    # 金額列はint32のため、累積はint64で計算してオーバーフローを防ぐ
+    cumulative = df['利益'].astype(np.int64).cumsum() + last_cumulative_profit
+    peak = cumulative.cummax()
+    if last_peak is not None:
+        peak = peak.clip(lower=last_peak)
+    df['累積利益'] = cumulative
+    df['ピーク'] = peak
+    df['ドローダウン'] = peak - cumulative
+    return df
+
+def clean_trade_data(df):
+    """取引データを一括で加工する関数（dfを直接書き換える）"""
+    validate_columns(df)
+    add_derived_columns(df)
+    add_cumulative_columns(df)
+    df.sort_values(by='取引日付', inplace=True)
+    return df.drop(columns=DROP_COLUMNS, errors='ignore')
+
+def enforce_processed_schema(df):
+    """加工済みデータの列を PROCESSED_SCHEMA の順・型にそろえる関数。型が異なる列だけを変換する
+
+    スキーマにない列（以前の形式で保存された 結果 など）は除く。累積列のように、まだない列はそのままにする。
+    """
+    extra = [col for col in df.columns if col not in PROCESSED_SCHEMA]
+    if extra:
+        df = df.drop(columns=extra)
+    order = [col for col in PROCESSED_SCHEMA if col in df.columns]
+    if list(df.columns) != order:
+        df = df[order]
+    mismatched = {col: PROCESSED_SCHEMA[col] for col in order if df[col].dtype != PROCESSED_SCHEMA[col]}
+    return df.astype(mismatched) if mismatched else df
+
+def prepare_trade_frame(df):
+    """列を検証し、累積列以外の派生列を追加して生の文字列列を除いた取引データを返す関数"""
+    validate_columns(df)
+    add_derived_columns(df)
+    return enforce_processed_schema(df.drop(columns=DROP_COLUMNS, errors='ignore'))
+
+def iter_trade_chunks(sources, chunksize=STREAM_CHUNK_ROWS):
+    """CSVをチャンク単位で読み込み、累積値を引き継ぎながら加工済みチャンクを順に返すジェネレータ"""
+    offset = 0
+    last_cumulative_profit, last_peak = 0, None
+    for source in sources:
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        for chunk in read_trade_csv(source, chunksize=chunksize):
+            # 一括読み込み時と同じ通し番号のインデックスを振る
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+            # 生の文字列列は早めに捨て、チャンクごとのメモリを抑える
+            chunk = prepare_trade_frame(chunk)
+            add_cumulative_columns(chunk, last_cumulative_profit, last_peak)
+            if not chunk.empty:
+                last_cumulative_profit = chunk['累積利益'].iloc[-1]
+                last_peak = chunk['ピーク'].iloc[-1]
+            yield chunk
+
+def concat_trade_frames(frames, ignore_index=False):
+    """加工済みの取引データを、カテゴリ列のカテゴリを揃えてから結合する関数"""
+    frames = list(frames)
+    if not frames:
+        raise TradeDataError("⚠️ エラー：CSVファイルにデータがありません。")
+    # フレームごとにカテゴリが異なる列は、カテゴリの和集合で結合する
+    category_columns = [col for col in frames[0].columns if isinstance(frames[0][col].dtype, pd.CategoricalDtype)]
+    for col in category_columns:
+        if any(frame[col].dtype != frames[0][col].dtype for frame in frames):
+            unioned = union_categoricals([frame[col] for frame in frames], sort_categories=True)
+            for frame in frames:
+                frame[col] = pd.Categorical(frame[col], categories=unioned.categories, ordered=unioned.ordered)
+    return pd.concat(frames, ignore_index=ignore_index)
+
+def sort_by_trade_date(df):
+    """取引日付順に並べ替える関数。sort_values と同じ順序を、1列ずつ並べ替えて作り直すことで余分なコピーを抑える
+
+    取引日付にNaTは含まれない（解析時に InvalidTimestampError になる）ため、日時の配列を直接並べ替える。
+    同順位の並びを sort_values と揃えるため、整数ではなくdatetime64として並べ替える。
+    """
+    order = np.argsort(df['取引日付'].array.asi8.view('M8[ns]'), kind='quicksort')
+    for col in df.columns:
+        df[col] = df[col].array.take(order)
+    df.index = df.index.take(order)
+    return df
+
+def concat_trade_chunks(chunks):
+    """加工済みチャンクを結合し、一括加工と同じ形に整える関数
+
+    列ごとに結合し、結合した列のチャンク側はすぐに手放す。並べ替えも1列ずつ行うため、
+    ピークのメモリは加工済みデータ1つ分に、数列分を加えた程度になる。
+    """
+    frames = list(chunks)
+    if not frames:
+        raise TradeDataError("⚠️ エラー：CSVファイルにデータがありません。")
+    df = pd.DataFrame(index=frames[0].index.append([frame.index for frame in frames[1:]]))
+    for col in list(frames[0].columns):
+        df[col] = concat_trade_frames([frame.pop(col).to_frame() for frame in frames])[col].array
+    del frames
+    return enforce_processed_schema(sort_by_trade_date(df))
+
+def stream_trade_data(sources, chunksize=STREAM_CHUNK_ROWS):
+    """CSVをチャンク単位で読み込み・加工して、一括加工と同じ結果を返す関数"""
+    return concat_trade_chunks(iter_trade_chunks(sources, chunksize))
+
+def read_trade_file(source, keep_raw=False):
+    """1ファイル分のCSVを読み込んで加工し、(生データ, 加工済みデータ) を返す関数"""
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    elif hasattr(source, 'seek'):
+        source.seek(0)
+    raw_df = read_trade_csv(source)
+    prepared_df = prepare_trade_frame(raw_df.copy() if keep_raw else raw_df)
+    return (raw_df if keep_raw else None), prepared_df
+
+def process_pool(max_workers, **kwargs):
+    """ワーカープロセスを POOL_START_METHOD で起動するプロセスプールを返す関数
+
+    Linuxの既定の fork は、他のスレッドが保持しているロックごとプロセスを複製するため、
+    Streamlitのサーバーのように多数のスレッドが動くプロセスから起動するとワーカーがデッドロックしうる。
+    """
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(POOL_START_METHOD), **kwargs)
+
+def _read_trade_file_result(name, source, keep_raw):
+    """ワーカーで1ファイルを処理し、エラーも含めた結果を返す"""
+    try:
+        raw_df, prepared_df = read_trade_file(source, keep_raw)
+        return {'name': name, 'raw': raw_df, 'df': prepared_df, 'error': None}
+    except Exception as e:
+        return {'name': name, 'raw': None, 'df': None, 'error': e}
+
+def parse_trade_files(sources, max_workers=None, use_processes=False, keep_raw=False, on_result=None):
+    """複数のCSVを並列に読み込み・加工し、ファイルごとの結果をアップロード順のリストで返す関数
+
+    各結果は name / raw / df / error を持つ辞書で、失敗したファイルは error に例外が入る。
+    use_processes=True の場合はプロセスプール（process_pool）を使い、ファイルの中身はバイト列として渡す。
+    on_result を指定すると、1ファイル終わるごとに（完了順に）その結果を渡して呼び出す。
+    """
+    sources = list(sources)
+    names = [getattr(source, 'name', str(source)) for source in sources]
+    if use_processes:
+        sources = [source.getvalue() if hasattr(source, 'getvalue') else source for source in sources]
+    max_workers = max_workers or min(len(sources), os.cpu_count() or 1) or 1
+    if max_workers == 1 or len(sources) == 1:
+        results = []
+        for name, source in zip(names, sources):
+            results.append(_read_trade_file_result(name, source, keep_raw))
+            if on_result is not None:
+                on_result(results[-1])
+        return results
+    executor = process_pool(max_workers) if use_processes else ThreadPoolExecutor(max_workers=max_workers)
+    with executor:
+        futures = [executor.submit(_read_trade_file_result, name, source, keep_raw) for name, source in zip(names, sources)]
+        if on_result is not None:
+            for future in as_completed(futures):
+                on_result(future.result())
+        return [future.result() for future in futures]
+
+def merge_trade_frames(frames):
+    """ファイルごとの加工済みデータを結合し、累積列を計算して取引日付順に並べる関数
+
+    累積列はアップロード順に結合した順序で計算するため、一括加工と同じ結果になる。
+    """
+    df = concat_trade_frames(frames, ignore_index=True)
+    add_cumulative_columns(df)
+    df.sort_values(by='取引日付', inplace=True)
+    return enforce_processed_schema(df)
+
+def generate_summary_stats(df):
+    """要約統計量を計算する関数"""
+    if df.empty:
+        return {
+            'total_trades': 0,
+            'total_profit': 0,
+            'win_rate': 0,
+            'avg_profit': 0,
+            'avg_loss': 0,
+            'risk_reward_ratio': 0,
+            'max_wins': 0,
+            'max_losses': 0,
+            'max_drawdown': 0,
+            'monthly_avg_profit': 0
+        }
+    
+    total_trades = len(df)
+    total_profit = df['利益'].sum()
+    win_rate = df['結果(数値)'].mean()
+    avg_profit = df[df['利益'] > 0]['利益'].mean() if not df[df['利益'] > 0].empty else 0
+    avg_loss = abs(df[df['利益'] < 0]['利益'].mean()) if not df[df['利益'] < 0].empty else 0
+    risk_reward_ratio = avg_profit / avg_loss if avg_loss != 0 and not pd.isna(avg_profit) and not pd.isna(avg_loss) else 0
+    
+    max_wins, max_losses = max_streaks(df['結果(数値)'].to_numpy() == 1)
+    
+    max_drawdown = df['ドローダウン'].max() if 'ドローダウン' in df.columns else 0
+    monthly_avg_profit = df.resample('ME', on='取引日付')['利益'].mean().mean() if not df.empty else 0
+    
+    return {
+        'total_trades': total_trades,
+        'total_profit': total_profit,
+        'win_rate': win_rate,
+        'avg_profit': avg_profit,
+        'avg_loss': avg_loss,
+        'risk_reward_ratio': risk_reward_ratio,
+        'max_wins': max_wins,
+        'max_losses': max_losses,
+        'max_drawdown': max_drawdown,
+        'monthly_avg_profit': monthly_avg_profit
+    }
+
+def period_bounds(timestamps, start, end):
+    """取引日付順に並んだ日時から、期間 [start, end] に入る行の位置範囲を二分探索で求める関数"""
+    return int(timestamps.searchsorted(start, side='left')), int(timestamps.searchsorted(end, side='right'))
+
+def memory_usage_report(df):
+    """列ごとのメモリ使用量を、従来の型の場合（推定）と比較した表を返す関数"""
+    after = df.memory_usage(deep=True, index=False)
+    before = pd.Series({
+        col: df[col].astype(LEGACY_SCHEMA[col]).memory_usage(deep=True, index=False) if col in LEGACY_SCHEMA else after[col]
+        for col in df.columns
+    })
+    report = pd.DataFrame({
+        '列': df.columns,
+        '型': [str(dtype) for dtype in df.dtypes],
+        '従来の型 (MB)': before.to_numpy() / 1024 ** 2,
+        '現在 (MB)': after.to_numpy() / 1024 ** 2,
+    })
+    report['削減率'] = 1 - report['現在 (MB)'] / report['従来の型 (MB)'].where(report['従来の型 (MB)'] > 0)
+    return report
@@ -0,0 +1,344 @@
+"""分析グラフと概要データをPDFレポート（またはグラフ画像のZIP）に書き出すモジュール
+
+グラフはvl-convertでオフラインにPNG・SVGへ変換し、グラフごとにワーカープロセスで並列に描画する。
+コマンドラインから実行すると、加工済みデータ（trade_cli.pyが出力するParquet）や取引履歴CSVから、
+口座ごとのレポートを一括で作成する。
+
+使い方:
+    python trade_report.py processed/ -o reports --days 7 --workers 8
+    python trade_report.py exports/ --account-from-dir --start 2024-01-01 --end 2024-01-31
+    TRADE_REPORT_FONT=/path/to/font.ttf python trade_report.py processed/   # 日本語フォントを指定する
+"""
+import argparse
+import glob
+import io
+import os
+import sys
+import tempfile
+import time
+import zipfile
+from functools import partial
+
+import pandas as pd
+
+from trade_accounts import iter_account_results, process_account, raise_for_errors
+from trade_charts import GRAPH_OPTIONS, build_chart
+from trade_cli import AccountNameConflictError, find_trade_files, group_by_account
+from trade_export import read_exported
+from trade_processing import process_pool, merge_trade_frames, period_bounds, generate_summary_stats
+from trade_rollup import build_rollup, slice_rollup, rollup_by
+
+REPORT_FONT_PATH = os.environ.get(
+    'TRADE_REPORT_FONT', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'NotoSerifJP-VariableFont_wght.ttf')
+)
+REPORT_FONT_FAMILY = 'Noto Serif JP'
+REPORT_FONT_ERROR = "レポート用の日本語フォント（{font_path}）を読み込めません。環境変数 TRADE_REPORT_FONT でTrueTypeフォントを指定してください。"
+TRUETYPE_HEADERS = (b'\x00\x01\x00\x00', b'true')  # TrueTypeフォントのファイル先頭の4バイト
+REPORT_TITLE = '取引分析レポート'
+# レポートの形式ごとの (拡張子, MIMEタイプ)
+REPORT_FORMATS = {
+    'PDF': ('pdf', 'application/pdf'),
+    'PNG (ZIP)': ('zip', 'application/zip'),
+    'SVG (ZIP)': ('zip', 'application/zip'),
+}
+REPORT_CHART_RESOLUTION = 500  # 取引ごとのグラフの横方向の点数（紙面の横幅に合わせて画面表示より少なくする）
+REPORT_CHART_WIDTH = 640
+REPORT_CHART_HEIGHT = 320
+REPORT_CHART_SCALE = 2  # PNGの拡大率（印刷向けに解像度を上げる）
+REPORT_MAX_AXIS_LABELS = 12  # 横軸のカテゴリがこれより多い場合は目盛りラベルを間引く
+REPORT_DEFAULT_DAYS = 7
+WEEKDAY_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+TIME_BAND_ORDER = ['午前', '午後', '夜', '深夜']
+
+_renderer_ready = False
+
+
+class ReportError(RuntimeError):
+    """レポートを作成できない場合（期間内に取引がない、フォントを読み込めないなど）の例外"""
+
+
+def summary_metrics(stats):
+    """要約統計量を、画面の「概要データ」と同じ見出しと書式の (項目, 値) のリストにする関数"""
+    def yen(value):
+        return f"¥{value:,.0f}" if not pd.isna(value) else "N/A"
+    return [
+        ("総取引数", f"{stats['total_trades']} 回"),
+        ("総損益", f"¥{stats['total_profit']:,}"),
+        ("勝率", f"{stats['win_rate']:.2%}"),
+        ("リスク・リワード比率", f"{stats['risk_reward_ratio']:.2f}"),
+        ("平均利益", yen(stats['avg_profit'])),
+        ("平均損失", yen(stats['avg_loss'])),
+        ("最大連勝数", f"{stats['max_wins']} 回"),
+        ("最大連敗数", f"{stats['max_losses']} 回"),
+        ("最大ドローダウン", yen(stats['max_drawdown'])),
+        ("月間平均利益", yen(stats['monthly_avg_profit'])),
+    ]
+
+def summary_tables(period_cube):
+    """期間の集計キューブから、通貨ペア別総損益・時間帯別勝率・曜日別勝率の表を (見出し, 文字列の表) のリストで返す関数"""
+    pair_profit = rollup_by(period_cube, '取引銘柄')['損益'].sort_values(ascending=False).reset_index()
+    time_win_rate = rollup_by(period_cube, '時間帯')['勝率'].reindex(TIME_BAND_ORDER, fill_value=0).reset_index()
+    weekday_win_rate = rollup_by(period_cube, '曜日')['勝率'].reindex(WEEKDAY_ORDER, fill_value=0).reset_index()
+    return [
+        ('通貨ペア別総損益', pd.DataFrame({
+            '通貨ペア': pair_profit['取引銘柄'].astype(str), '総損益': pair_profit['損益'].map('¥{:,.0f}'.format),
+        })),
+        ('時間帯別勝率', pd.DataFrame({'時間帯': time_win_rate['時間帯'].astype(str), '勝率': time_win_rate['勝率'].map('{:.2%}'.format)})),
+        ('曜日別勝率', pd.DataFrame({'曜日': weekday_win_rate['曜日'].astype(str), '勝率': weekday_win_rate['勝率'].map('{:.2%}'.format)})),
+    ]
+
+def _thin_axis_labels(spec, max_labels=REPORT_MAX_AXIS_LABELS):
+    """カテゴリの多い横軸の目盛りラベルを等間隔に間引く
+
+    静的な画像に描く際、数千個のラベルの重なり判定に数秒以上かかるため、表示するラベルを先に絞っておく。
+    """
+    x = spec.get('encoding', {}).get('x')
+    if not x or x.get('type') not in ('nominal', 'ordinal') or 'field' not in x or x.get('axis', {}) is None:
+        return
+    rows = spec.get('datasets', {}).get(spec.get('data', {}).get('name'), [])
+    values = list(dict.fromkeys(row[x['field']] for row in rows if x['field'] in row))
+    if len(values) > max_labels:
+        step = -(-len(values) // max_labels)
+        x['axis'] = {**(x.get('axis') or {}), 'values': values[::step], 'labelOverlap': False}
+
+def report_chart_spec(graph, period_cube, filtered_df, resolution=REPORT_CHART_RESOLUTION):
+    """レポート用に、紙面の大きさとフォントを指定したグラフのVega-Lite仕様を作る関数。データがない場合はNoneを返す"""
+    chart = build_chart(graph, period_cube, filtered_df, resolution)
+    if chart is None:
+        return None
+    spec = chart.properties(width=REPORT_CHART_WIDTH, height=REPORT_CHART_HEIGHT).to_dict()
+    _thin_axis_labels(spec)
+    spec['config'] = {**spec.get('config', {}), 'font': REPORT_FONT_FAMILY}
+    return spec
+
+def _init_renderer(font_dir):
+    """vl-convertにフォントのディレクトリを登録する（ワーカープロセスの初期化で1回だけ実行する）"""
+    global _renderer_ready
+    if not _renderer_ready:
+        import vl_convert as vlc
+        if os.path.isdir(font_dir):
+            vlc.register_font_directory(font_dir)
+        _renderer_ready = True
+
+def _render_chart(spec, fmt):
+    """Vega-Lite仕様を1つPNG（バイト列）かSVG（文字列）に変換する（ワーカーで実行する）
+
+    fpdfは透明度つきのPNGをPythonで1画素ずつ処理して非常に遅いため、PNGは白地に合成したRGBで返す。
+    """
+    # 描画用のライブラリは読み込みに時間がかかるため、レポートを作るときに読み込む
+    import vl_convert as vlc
+    from PIL import Image
+
+    if fmt == 'svg':
+        return vlc.vegalite_to_svg(spec)
+    image = Image.open(io.BytesIO(vlc.vegalite_to_png(spec, scale=REPORT_CHART_SCALE)))
+    flat = Image.new('RGB', image.size, 'white')
+    flat.paste(image, mask=image.getchannel('A') if image.mode == 'RGBA' else None)
+    buffer = io.BytesIO()
+    flat.save(buffer, format='PNG', compress_level=1)
+    return buffer.getvalue()
+
+def render_charts(specs, fmt='png', max_workers=None, font_path=REPORT_FONT_PATH):
+    """複数のグラフの仕様を、ワーカープロセスで並列にPNGかSVGへ変換し、同じ順で返す関数"""
+    font_dir = os.path.dirname(os.path.abspath(font_path))
+    max_workers = min(max_workers or os.cpu_count() or 1, len(specs))
+    if max_workers <= 1:
+        _init_renderer(font_dir)
+        return [_render_chart(spec, fmt) for spec in specs]
+    with process_pool(max_workers, initializer=_init_renderer, initargs=(font_dir,)) as executor:
+        return list(executor.map(_render_chart, specs, [fmt] * len(specs)))
+
+def _add_report_font(pdf, font_path):
+    """PDFに日本語フォントを埋め込む。フォントの解析結果は一時ディレクトリにキャッシュする"""
+    from fpdf import set_global
+
+    cache_dir = os.path.join(tempfile.gettempdir(), 'trade_report_fonts')
+    os.makedirs(cache_dir, exist_ok=True)
+    set_global('FPDF_CACHE_MODE', 2)
+    set_global('FPDF_CACHE_DIR', cache_dir)
+    try:
+        pdf.add_font(REPORT_FONT_FAMILY, '', font_path, uni=True)
+    except Exception as e:
+        raise ReportError(REPORT_FONT_ERROR.format(font_path=font_path)) from e
+
+def check_report_font(font_path=REPORT_FONT_PATH):
+    """レポート用の日本語フォントがTrueTypeフォントかどうかをファイルの先頭だけで確認し、違う場合は ReportError を送出する関数
+
+    フォント全体の解析は時間がかかるため、画面の表示時にはこの確認だけを行い、解析はレポートの作成時に行う。
+    """
+    try:
+        with open(font_path, 'rb') as f:
+            header = f.read(4)
+    except OSError:
+        header = b''
+    if header not in TRUETYPE_HEADERS:
+        raise ReportError(REPORT_FONT_ERROR.format(font_path=font_path))
+
+def _write_table(pdf, table, widths, line_height=6):
+    """見出し行つきの表をPDFに書き込む"""
+    pdf.set_fill_color(240, 240, 240)
+    for column, width in zip(table.columns, widths):
+        pdf.cell(width, line_height, str(column), border=1, fill=True)
+    pdf.ln()
+    for row in table.itertuples(index=False):
+        for value, width in zip(row, widths):
+            pdf.cell(width, line_height, str(value), border=1)
+        pdf.ln()
+
+def build_report_pdf(title, period_label, stats, tables, chart_images, font_path=REPORT_FONT_PATH):
+    """概要データ・集計表・グラフ画像（(見出し, PNGのバイト列) のリスト）からPDFを作成し、バイト列で返す関数"""
+    from fpdf import FPDF
+
+    pdf = FPDF(orientation='P', unit='mm', format='A4')
+    pdf.set_auto_page_break(True, margin=15)
+    _add_report_font(pdf, font_path)
+    pdf.add_page()
+    pdf.set_font(REPORT_FONT_FAMILY, '', 18)
+    pdf.cell(0, 10, title, ln=1)
+    pdf.set_font(REPORT_FONT_FAMILY, '', 10)
+    pdf.cell(0, 6, f"期間: {period_label}　作成日時: {pd.Timestamp.now(tz='Asia/Tokyo'):%Y-%m-%d %H:%M}", ln=1)
+    pdf.ln(4)
+
+    pdf.set_font(REPORT_FONT_FAMILY, '', 14)
+    pdf.cell(0, 8, '概要データ', ln=1)
+    pdf.set_font(REPORT_FONT_FAMILY, '', 10)
+    _write_table(pdf, pd.DataFrame(summary_metrics(stats), columns=['項目', '値']), [60, 50])
+    for heading, table in tables:
+        pdf.ln(4)
+        pdf.set_font(REPORT_FONT_FAMILY, '', 12)
+        pdf.cell(0, 8, heading, ln=1)
+        pdf.set_font(REPORT_FONT_FAMILY, '', 10)
+        _write_table(pdf, table, [60, 50])
+
+    # fpdfの画像はファイルから読み込むため、一時ディレクトリに書き出して貼り付ける
+    image_width = pdf.w - pdf.l_margin - pdf.r_margin
+    image_height = image_width * REPORT_CHART_HEIGHT / REPORT_CHART_WIDTH
+    with tempfile.TemporaryDirectory() as image_dir:
+        for i, (heading, image) in enumerate(chart_images):
+            if i % 2 == 0:
+                pdf.add_page()
+            pdf.set_font(REPORT_FONT_FAMILY, '', 12)
+            pdf.cell(0, 8, heading, ln=1)
+            path = os.path.join(image_dir, f"chart_{i}.png")
+            with open(path, 'wb') as f:
+                f.write(image)
+            pdf.image(path, x=pdf.l_margin, y=pdf.get_y(), w=image_width, type='PNG')
+            pdf.set_y(pdf.get_y() + image_height + 6)
+        return pdf.output(dest='S').encode('latin-1')
+
+def build_chart_archive(chart_images, fmt):
+    """グラフ画像を1つのZIPにまとめ、バイト列で返す関数"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for i, (heading, image) in enumerate(chart_images, start=1):
+            name = f"{i:02d}_{heading.replace('/', '_')}.{fmt}"
+            archive.writestr(name, image if isinstance(image, bytes) else image.encode('utf-8'))
+    return buffer.getvalue()
+
+def build_report(filtered_df, period_cube, period_label, graphs=GRAPH_OPTIONS, report_format='PDF',
+                 title=REPORT_TITLE, max_workers=None, font_path=REPORT_FONT_PATH):
+    """期間内の取引データと集計キューブからレポートを作成し、バイト列で返す関数
+
+    report_format は REPORT_FORMATS のいずれか。PDFは概要データ・集計表・選択したグラフを含み、
+    ZIPは選択したグラフの画像だけを含む。データのないグラフは省く。
+    """
+    if filtered_df.empty:
+        raise ReportError("選択した期間にデータがありません。")
+    specs = [(graph, report_chart_spec(graph, period_cube, filtered_df)) for graph in graphs]
+    specs = [(graph, spec) for graph, spec in specs if spec is not None]
+    fmt = 'svg' if report_format == 'SVG (ZIP)' else 'png'
+    images = render_charts([spec for _, spec in specs], fmt, max_workers, font_path)
+    chart_images = [(graph, image) for (graph, _), image in zip(specs, images)]
+    if report_format != 'PDF':
+        return build_chart_archive(chart_images, fmt)
+    stats = generate_summary_stats(filtered_df)
+    return build_report_pdf(title, period_label, stats, summary_tables(period_cube), chart_images, font_path)
+
+def report_period(df, start=None, end=None, days=REPORT_DEFAULT_DAYS):
+    """レポートの期間（日本時間の開始・終了日時）を返す関数。start・end がなければ最後の取引日までの days 日間"""
+    last_day = df['取引日付'].iloc[-1].date() if not df.empty else pd.Timestamp.now(tz='Asia/Tokyo').date()
+    end_day = pd.Timestamp(end).date() if end else last_day
+    start_day = pd.Timestamp(start).date() if start else end_day - pd.Timedelta(days=days - 1)
+    start_date = pd.Timestamp(start_day, tz='Asia/Tokyo')
+    end_date = pd.Timestamp(end_day, tz='Asia/Tokyo').replace(hour=23, minute=59, second=59, microsecond=999999)
+    return start_date, end_date
+
+def load_account(account, paths):
+    """1口座分の加工済みParquetか取引履歴CSVを読み込み、取引日付順のデータフレームを返す関数
+
+    CSVは process_account で口座の取引としてまとめて加工する。加工済みのParquetはそのまま使い、
+    ParquetとCSVを混ぜて指定した場合だけ、結合して累積列を計算し直す。
+    """
+    frames = [read_exported(path, 'Parquet') for path in paths if path.endswith('.parquet')]
+    csv_paths = [path for path in paths if not path.endswith('.parquet')]
+    if csv_paths:
+        frames.append(raise_for_errors(process_account(account, csv_paths))['df'])
+    if len(frames) == 1:
+        return frames[0]
+    return merge_trade_frames(frames)
+
+def write_account_report(account, paths, output_dir, start=None, end=None, days=REPORT_DEFAULT_DAYS, graphs=GRAPH_OPTIONS):
+    """1口座分のPDFレポートを書き出し、期間内の取引数を返す関数（ワーカーで実行する）"""
+    df = load_account(account, paths)
+    start_date, end_date = report_period(df, start, end, days)
+    lo, hi = period_bounds(df['取引日付'], start_date, end_date)
+    period_cube = slice_rollup(build_rollup(df), start_date, end_date)
+    period_label = f"{start_date:%Y-%m-%d}〜{end_date:%Y-%m-%d}"
+    # 口座ごとにワーカープロセスを割り当てるため、グラフはプロセス内で順に描画する
+    report = build_report(df.iloc[lo:hi], period_cube, period_label, graphs, title=f"{REPORT_TITLE}（{account}）", max_workers=1)
+    with open(os.path.join(output_dir, f"{account}.pdf"), 'wb') as f:
+        f.write(report)
+    return hi - lo
+
+def find_report_inputs(inputs):
+    """ファイル・ディレクトリ・globパターンの指定から、加工済みParquetとCSVのパスを重複なく返す関数"""
+    paths = find_trade_files(inputs)
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            paths.extend(sorted(glob.glob(os.path.join(pattern, '**', '*.parquet'), recursive=True)))
+    return list(dict.fromkeys(os.path.abspath(path) for path in paths))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="加工済みデータ（Parquet）や取引履歴CSVから、口座ごとのPDFレポートを書き出します。")
+    parser.add_argument('inputs', nargs='+', help="Parquet・CSVファイル、ディレクトリ、globパターン（ディレクトリは配下のParquetとCSVをすべて読み込む）")
+    parser.add_argument('-o', '--output-dir', default='reports', help="出力先ディレクトリ（既定: reports）")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1, help="並列に処理するプロセス数（既定: CPUコア数）")
+    parser.add_argument('--account-from-dir', action='store_true', help="親ディレクトリ名を口座名とし、同じディレクトリのファイルをまとめる")
+    parser.add_argument('--start', help="期間の開始日（例: 2024-01-01）")
+    parser.add_argument('--end', help="期間の終了日（既定: 各口座の最後の取引日）")
+    parser.add_argument('--days', type=int, default=REPORT_DEFAULT_DAYS, help=f"--start がない場合の期間の日数（既定: {REPORT_DEFAULT_DAYS}）")
+    parser.add_argument('--graphs', nargs='+', choices=GRAPH_OPTIONS, default=GRAPH_OPTIONS, metavar='GRAPH', help="レポートに含めるグラフ（既定: すべて）")
+    args = parser.parse_args(argv)
+
+    paths = find_report_inputs(args.inputs)
+    if not paths:
+        print("⚠️ ParquetファイルやCSVファイルが見つかりません。", file=sys.stderr)
+        return 1
+    try:
+        accounts = group_by_account(paths, args.account_from_dir)
+    except AccountNameConflictError as e:
+        print(e, file=sys.stderr)
+        return 1
+    workers = max(1, min(args.workers, len(accounts)))
+    os.makedirs(args.output_dir, exist_ok=True)
+    options = {'start': args.start, 'end': args.end, 'days': args.days, 'graphs': args.graphs}
+    print(f"{len(accounts):,}口座のレポートを{workers}プロセスで作成します。", flush=True)
+
+    started = time.perf_counter()
+    failures = 0
+    write_report = partial(write_account_report, output_dir=args.output_dir, **options)
+    for done, result in enumerate(iter_account_results(write_report, accounts, workers), start=1):
+        if result['error'] is not None:
+            failures += 1
+            print(f"[{done}/{len(accounts)}] ❌ {result['account']}: {result['error']}", file=sys.stderr, flush=True)
+            continue
+        print(f"[{done}/{len(accounts)}] ✅ {result['account']}: 期間内 {result['result']:,}件 ({result['seconds']:.2f}秒)", flush=True)
+    elapsed = time.perf_counter() - started
+    print(f"完了: {len(accounts) - failures:,}口座 / {elapsed:.1f}秒 ({elapsed / len(accounts):.2f}秒/口座)")
+    if failures:
+        print(f"⚠️ {failures:,}口座のレポート作成に失敗しました。", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+from trade_processing import period_bounds
+
+# キューブの集計軸。曜日は日付から決まるため、行数を増やさずに軸として持てる
+ROLLUP_KEYS = ['日付', '曜日', '取引銘柄', 'HIGH/LOW', '時間帯', '取引時間']
+ROLLUP_MEASURES = ['取引数', '勝数', '損益']
+
+
+def build_rollup(df):
+    """取引データを日付・通貨ペア・取引方向・時間帯・取引時間ごとに1回で集計したキューブを返す関数"""
+    measures = pd.DataFrame({
+        '日付': df['取引日付'].dt.normalize(),
+        '曜日': df['曜日'],
+        '取引銘柄': df['取引銘柄'],
+        'HIGH/LOW': df['HIGH/LOW'],
+        '時間帯': df['時間帯'],
+        '取引時間': df['取引時間'],
+        '取引数': np.ones(len(df), dtype=np.int64),
+        '勝数': df['結果(数値)'].astype(np.int64),
+        '損益': df['利益'].astype(np.int64),
+    })
+    return measures.groupby(ROLLUP_KEYS, observed=True, sort=True)[ROLLUP_MEASURES].sum().reset_index()
+
+def slice_rollup(cube, start_date, end_date):
+    """日付順に並んだキューブから期間内の行を二分探索で取り出す関数（期間は日単位で区切られている前提）"""
+    lo, hi = period_bounds(cube['日付'], start_date, end_date)
+    return cube.iloc[lo:hi]
+
+def rollup_by(cube, keys):
+    """キューブを指定した軸で集計し、取引数・勝数・損益・勝率を返す関数"""
+    result = cube.groupby(keys, observed=True)[ROLLUP_MEASURES].sum()
+    result['勝率'] = result['勝数'] / result['取引数']
+    return result
@@ -0,0 +1,90 @@
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+# 組み合わせを探す軸（キューブの列）
+SEGMENT_DIMENSIONS = ['取引銘柄', 'HIGH/LOW', '取引時間', '時間帯', '曜日']
+SEGMENT_ALL_LABEL = '（すべて）'
+DEFAULT_MIN_SEGMENT_TRADES = 30
+SEGMENT_CONFIDENCE_OPTIONS = [0.90, 0.95, 0.99]
+DEFAULT_SEGMENT_CONFIDENCE = 0.95
+SEGMENT_TOP_OPTIONS = [10, 20, 50, 100]
+
+
+def wilson_interval(wins, trades, confidence=DEFAULT_SEGMENT_CONFIDENCE):
+    """勝数と取引数の配列から、勝率のウィルソン信頼区間の (下限, 上限) を返す関数（取引数が0の区間はNaN）"""
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = wins / trades
+        denominator = 1 + z ** 2 / trades
+        center = (rate + z ** 2 / (2 * trades)) / denominator
+        half_width = z * np.sqrt(rate * (1 - rate) / trades + z ** 2 / (4 * trades ** 2)) / denominator
+    return center - half_width, center + half_width
+
+def segment_totals(cube, dimensions=SEGMENT_DIMENSIONS):
+    """キューブを軸の値の組み合わせごとに集計し、すべての軸の組み合わせ（各軸を「すべて」にした場合を含む）の
+    取引数・勝数・損益を、軸ごとに (値の数 + 1) の長さを持つ多次元配列で返す関数
+
+    各軸の値の番号を1つの整数キーにまとめて bincount で1回だけ集計し、その後で各軸の末尾に合計（「すべて」）を
+    付け足す。返り値は (各軸の値のリスト, 取引数, 勝数, 損益)。
+    """
+    codes, labels = [], []
+    for dimension in dimensions:
+        dimension_codes, uniques = pd.factorize(cube[dimension], use_na_sentinel=False)
+        codes.append(dimension_codes.astype(np.int64))
+        labels.append([str(value) for value in uniques])
+    shape = tuple(len(values) for values in labels)
+    key = np.ravel_multi_index(codes, shape) if len(cube) else np.array([], dtype=np.int64)
+    size = int(np.prod(shape))
+    totals = []
+    for measure in ['取引数', '勝数', '損益']:
+        # 損益の合計は float64 で正確に扱える範囲（2の53乗未満）に収まる
+        total = np.bincount(key, weights=cube[measure].to_numpy(dtype=np.float64), minlength=size).reshape(shape)
+        for axis in range(len(dimensions)):
+            total = np.concatenate([total, total.sum(axis=axis, keepdims=True)], axis=axis)
+        totals.append(total)
+    return labels, *totals
+
+def search_segments(cube, min_trades=DEFAULT_MIN_SEGMENT_TRADES, confidence=DEFAULT_SEGMENT_CONFIDENCE, top_n=20,
+                    max_conditions=None, dimensions=SEGMENT_DIMENSIONS):
+    """通貨ペア・取引方向・取引時間・時間帯・曜日のすべての組み合わせから、1取引あたりの損益が大きい順に上位 top_n 件を返す関数
+
+    各軸は値を指定するか「すべて」のどちらかで、少なくとも1つの軸を指定した組み合わせを対象にする。
+    取引数が min_trades 未満の組み合わせと、指定した軸が max_conditions を超える組み合わせは除く。
+    勝率には信頼水準 confidence のウィルソン信頼区間を付ける。
+    """
+    labels, trades, wins, profit = segment_totals(cube, dimensions)
+    # 各軸の「すべて」は末尾の番号。指定した軸の数を組み合わせごとに数える
+    conditions = sum(
+        np.expand_dims(np.arange(len(values) + 1) < len(values), [other for other in range(len(dimensions)) if other != axis])
+        for axis, values in enumerate(labels)
+    )
+    eligible = (trades >= max(min_trades, 1)) & (conditions >= 1)
+    if max_conditions is not None:
+        eligible &= conditions <= max_conditions
+    positions = np.flatnonzero(eligible)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected = profit.ravel()[positions] / trades.ravel()[positions]
+    if len(positions) > top_n:
+        best = np.argpartition(-expected, top_n - 1)[:top_n]
+        positions, expected = positions[best], expected[best]
+    order = np.lexsort((-trades.ravel()[positions], -expected))
+    positions, expected = positions[order], expected[order]
+
+    segment_trades = trades.ravel()[positions]
+    segment_wins = wins.ravel()[positions]
+    lower, upper = wilson_interval(segment_wins, segment_trades, confidence)
+    result = {}
+    for dimension, values, index in zip(dimensions, labels, np.unravel_index(positions, trades.shape)):
+        result[dimension] = np.array(values + [SEGMENT_ALL_LABEL], dtype=object)[index]
+    result.update({
+        '条件数': conditions.ravel()[positions],
+        '取引数': segment_trades.astype(np.int64),
+        '勝率': segment_wins / segment_trades,
+        '勝率下限': lower,
+        '勝率上限': upper,
+        '損益': profit.ravel()[positions].astype(np.int64),
+        '1取引あたり損益': expected,
+    })
+    return pd.DataFrame(result)
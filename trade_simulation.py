@@ -0,0 +1,76 @@
+import os
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+from trade_processing import process_pool
+
+SIMULATION_PATH_OPTIONS = [1_000, 5_000, 10_000, 50_000]
+DEFAULT_SIMULATION_PATHS = 10_000
+DEFAULT_BANKROLL = 100_000
+SIMULATION_MAX_TRADES = 100_000  # 1経路あたりの取引数の上限
+SIMULATION_CHUNK_PATHS = 1_000  # 乱数の系列を分ける単位。並列数によらず同じシードなら同じ結果になる
+SIMULATION_BATCH_ELEMENTS = 250_000  # 1回の行列計算で扱う (経路数 × 取引数) の上限。行列をCPUキャッシュに収める
+SIMULATION_PARALLEL_ELEMENTS = 20_000_000  # (経路数 × 取引数) がこれ以上ならプロセスプールで並列に計算する
+SIMULATION_PERCENTILES = [5, 25, 50, 75, 95]
+SIMULATION_MEASURES = ['最終損益', '最大ドローダウン', '最大連敗数']
+
+
+def path_statistics(profits, losses):
+    """(経路数, 取引数) の損益と負けの行列から、経路ごとの最終損益・最大ドローダウン・最大連敗数・最低損益を一括で求める関数"""
+    cumulative = np.cumsum(profits, axis=1, dtype=profits.dtype)
+    drawdown = np.maximum.accumulate(cumulative, axis=1)
+    np.subtract(drawdown, cumulative, out=drawdown)
+    # 各時点から直前に勝った時点（まだ勝っていなければ -1）までの距離が、その時点までの連敗数になる
+    positions = np.arange(profits.shape[1], dtype=np.int32)
+    last_win = np.where(losses, np.int32(-1), positions)
+    np.maximum.accumulate(last_win, axis=1, out=last_win)
+    np.subtract(positions, last_win, out=last_win)
+    return cumulative[:, -1], drawdown.max(axis=1), last_win.max(axis=1), cumulative.min(axis=1)
+
+def _simulate_chunk(profit, is_loss, n_paths, n_trades, seed):
+    """1チャンク分の経路を行列のバッチごとに生成し、経路ごとの統計量を返す（ワーカーで実行する）"""
+    rng = np.random.default_rng(seed)
+    batch = max(1, SIMULATION_BATCH_ELEMENTS // n_trades)
+    # 累積損益がint32に収まる場合は、int32で計算してメモリの読み書きを減らす
+    if n_trades * int(np.abs(profit).max()) < np.iinfo(np.int32).max:
+        profit = profit.astype(np.int32)
+    results = []
+    for start in range(0, n_paths, batch):
+        picks = rng.integers(0, len(profit), size=(min(batch, n_paths - start), n_trades), dtype=np.int32)
+        results.append(path_statistics(np.take(profit, picks), np.take(is_loss, picks)))
+    return [np.concatenate(parts).astype(np.int64) for parts in zip(*results)]
+
+def simulate_trades(profit, is_win, n_paths=DEFAULT_SIMULATION_PATHS, n_trades=None, seed=0, max_workers=None):
+    """取引の (利益, 勝敗) を復元抽出で並べた経路を n_paths 本生成し、経路ごとの統計量を返す関数
+
+    n_trades は1経路あたりの取引数（省略時は元の取引数）。規模が大きい場合はチャンクごとにプロセスプールで並列に計算する。
+    結果は 最終損益・最大ドローダウン・最大連敗数・最低損益 の列を持つ、1経路1行のデータフレーム。
+    """
+    profit = np.asarray(profit, dtype=np.int64)
+    is_loss = np.asarray(is_win) != 1
+    if profit.size == 0:
+        raise ValueError("シミュレーションに使う取引がありません。")
+    n_trades = n_trades or len(profit)
+    sizes = [min(SIMULATION_CHUNK_PATHS, n_paths - start) for start in range(0, n_paths, SIMULATION_CHUNK_PATHS)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    max_workers = min(max_workers or os.cpu_count() or 1, len(sizes))
+    if max_workers > 1 and n_paths * n_trades >= SIMULATION_PARALLEL_ELEMENTS:
+        with process_pool(max_workers) as executor:
+            parts = list(executor.map(_simulate_chunk, repeat(profit), repeat(is_loss), sizes, repeat(n_trades), seeds))
+    else:
+        parts = [_simulate_chunk(profit, is_loss, size, n_trades, chunk_seed) for size, chunk_seed in zip(sizes, seeds)]
+    final, drawdown, streak, lowest = (np.concatenate(values) for values in zip(*parts))
+    return pd.DataFrame({'最終損益': final, '最大ドローダウン': drawdown, '最大連敗数': streak, '最低損益': lowest})
+
+def risk_of_ruin(paths, bankroll):
+    """資金 bankroll から始めて、途中で資金が0以下になった経路の割合を返す関数"""
+    return float((paths['最低損益'] <= -bankroll).mean())
+
+def summarize_simulation(paths):
+    """経路ごとの統計量を、平均と百分位数の表にまとめる関数"""
+    summary = paths[SIMULATION_MEASURES].quantile([p / 100 for p in SIMULATION_PERCENTILES]).T
+    summary.columns = [f"{p}%点" for p in SIMULATION_PERCENTILES]
+    summary.insert(0, '平均', paths[SIMULATION_MEASURES].mean())
+    return summary
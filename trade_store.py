@@ -0,0 +1,191 @@
+import json
+import os
+import threading
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from trade_processing import (
+    DROP_COLUMNS, CUMULATIVE_COLUMNS, PROCESSED_SCHEMA, validate_columns, add_derived_columns, add_cumulative_columns,
+    concat_trade_frames, enforce_processed_schema,
+)
+
+TRADE_STORE_DIR = os.environ.get("TRADE_STORE_DIR", "trade_store")  # 取引データストアの保存先（口座ごとのディレクトリを置く）
+STATE_FILE = "_state.json"
+TRADE_ID_DTYPE = PROCESSED_SCHEMA['取引番号']
+
+
+def validate_account_name(account):
+    """ストアの口座名を確認して前後の空白を除いて返す関数。ディレクトリ名として使えない場合は ValueError を送出する"""
+    account = str(account).strip()
+    if not account or account in ('.', '..') or any(sep in account for sep in ('/', '\\', os.sep)):
+        raise ValueError(f"⚠️ エラー：口座名「{account}」は使えません。区切り文字（/ や \\）を含まない名前を指定してください。")
+    return account
+
+
+class TradeStore:
+    """加工済み取引データを口座ごとに月単位のParquetファイルとして保存し、差分だけを追記するストア
+
+    口座ごとに root/<口座名>/ の下へ保存するため、累積利益・ドローダウンや取引番号による重複の判定は口座をまたがない。
+    """
+    def __init__(self, account, root=TRADE_STORE_DIR):
+        self.account = validate_account_name(account)
+        self.root = os.path.join(root, self.account)
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    # --- 状態管理 ---
+    def _state_path(self):
+        return os.path.join(self.root, STATE_FILE)
+
+    def read_state(self):
+        """累積値や取り込み済みアップロードなど、ストアの状態を返す"""
+        path = self._state_path()
+        if not os.path.exists(path):
+            return {'account': self.account, 'version': 0, 'row_count': 0, 'last_cumulative_profit': 0, 'last_peak': None, 'ingested_hashes': []}
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_state(self, state):
+        state['account'] = self.account
+        tmp_path = self._state_path() + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, self._state_path())
+
+    @property
+    def version(self):
+        return self.read_state()['version']
+
+    def has_ingested(self, upload_hash):
+        """指定したアップロードが取り込み済みかどうかを返す"""
+        return upload_hash in self.read_state()['ingested_hashes']
+
+    # --- パーティション ---
+    def _partition_path(self, month):
+        return os.path.join(self.root, f"{month}.parquet")
+
+    def months(self):
+        """保存済みの月（YYYY-MM）を昇順で返す"""
+        return sorted(name[:-len(".parquet")] for name in os.listdir(self.root) if name.endswith(".parquet"))
+
+    def stored_trade_ids(self):
+        """保存済みの取引番号を返す（取引番号列だけを読み込む）
+
+        取引番号を整数で保存していた以前のパーティションも、読み込んだCSVの取引番号と比べられるよう文字列にそろえる。
+        """
+        ids = [
+            pq.read_table(self._partition_path(month), columns=['取引番号'], memory_map=True).column(0).cast(pa.string())
+            for month in self.months()
+        ]
+        if not ids:
+            return pd.Index([], dtype=TRADE_ID_DTYPE)
+        return pd.Index(pa.chunked_array(ids, type=pa.string()).to_pandas(), dtype=TRADE_ID_DTYPE)
+
+    def _read_partition(self, month, columns=None):
+        """月パーティションを読み込む。以前の形式で保存された列（整数の取引番号・結果の列など）も PROCESSED_SCHEMA にそろえる"""
+        df = pq.read_table(self._partition_path(month), columns=columns, memory_map=True).to_pandas()
+        return enforce_processed_schema(df)
+
+    def _last_stored_timestamp(self):
+        """保存済みの取引で最も新しい取引日付を返す（最後の月の取引日付列だけを読み込む）。未保存の場合はNone"""
+        months = self.months()
+        if not months:
+            return None
+        return self._read_partition(months[-1], columns=['取引日付'])['取引日付'].max()
+
+    # --- 追記・読み込み ---
+    def append(self, raw_df, upload_hash=None):
+        """未保存の取引だけを加工して追記し、(追加件数, 重複件数) を返す
+
+        保存済みの最新の取引より前の取引（期間の重なるエクスポートや過去分の追加）を含む場合は、
+        その取引の月以降のパーティションを読み込み、累積利益・ピーク・ドローダウンを計算し直して書き直す。
+        """
+        validate_columns(raw_df)
+        with self._lock:
+            state = self.read_state()
+            new_df = raw_df.drop_duplicates(subset='取引番号', keep='first')
+            new_df = new_df[~new_df['取引番号'].isin(self.stored_trade_ids())].copy()
+            duplicates = len(raw_df) - len(new_df)
+            if not new_df.empty:
+                add_derived_columns(new_df)
+                new_df = enforce_processed_schema(new_df.drop(columns=DROP_COLUMNS, errors='ignore'))
+                new_df.sort_values(by='取引日付', kind='mergesort', inplace=True)
+                last_timestamp = self._last_stored_timestamp()
+                if last_timestamp is not None and new_df['取引日付'].iloc[0] < last_timestamp:
+                    last_row = self._rewrite_from(new_df)
+                else:
+                    # 新規分がすべて保存済みの取引より後なら、前回保存時の累積値から引き継いで計算する
+                    add_cumulative_columns(new_df, state['last_cumulative_profit'], state['last_peak'])
+                    for month, month_df in self._split_months(new_df):
+                        self._merge_partition(month, month_df)
+                    last_row = new_df.iloc[-1]
+                state['last_cumulative_profit'] = int(last_row['累積利益'])
+                state['last_peak'] = int(last_row['ピーク'])
+                state['row_count'] += len(new_df)
+                state['version'] += 1
+            if upload_hash is not None and upload_hash not in state['ingested_hashes']:
+                state['ingested_hashes'].append(upload_hash)
+            self._write_state(state)
+            return len(new_df), duplicates
+
+    @staticmethod
+    def _split_months(df):
+        """取引日付順のデータを (月, その月のデータ) の組に分ける"""
+        months = df['取引日付'].dt.year * 100 + df['取引日付'].dt.month
+        for month_key, month_df in df.groupby(months, sort=True):
+            yield f"{month_key // 100:04d}-{month_key % 100:02d}", month_df
+
+    def _rewrite_from(self, new_df):
+        """新規分の最初の月以降を保存済みの取引と合わせて取引日付順に並べ、累積列を計算し直して書き直す。最後の行を返す"""
+        first_month = new_df['取引日付'].iloc[0].strftime('%Y-%m')
+        months = self.months()
+        earlier = [month for month in months if month < first_month]
+        affected = [month for month in months if month >= first_month]
+        last_cumulative_profit, last_peak = 0, None
+        if earlier:
+            previous = self._read_partition(earlier[-1], columns=['累積利益', 'ピーク']).iloc[-1]
+            last_cumulative_profit, last_peak = int(previous['累積利益']), int(previous['ピーク'])
+        existing = [self._read_partition(month).drop(columns=CUMULATIVE_COLUMNS) for month in affected]
+        # 同じ取引日付の取引は、保存済みの取引を先にする
+        df = concat_trade_frames(existing + [new_df], ignore_index=True)
+        df.sort_values(by='取引日付', kind='mergesort', inplace=True)
+        add_cumulative_columns(df, last_cumulative_profit, last_peak)
+        for month, month_df in self._split_months(df):
+            self._write_partition(month, month_df)
+        return df.iloc[-1]
+
+    def _merge_partition(self, month, month_df):
+        """既存の月パーティションに新規分を加え、取引日付順で書き直す"""
+        if os.path.exists(self._partition_path(month)):
+            month_df = concat_trade_frames([self._read_partition(month), month_df], ignore_index=True)
+            month_df.sort_values(by='取引日付', kind='mergesort', inplace=True)
+        self._write_partition(month, month_df)
+
+    def _write_partition(self, month, month_df):
+        """月パーティションを書き出す（一時ファイルに書いてから置き換える）"""
+        path = self._partition_path(month)
+        tmp_path = path + ".tmp"
+        month_df.to_parquet(tmp_path, index=False, engine='pyarrow')
+        os.replace(tmp_path, path)
+
+    def load(self, start=None, end=None):
+        """保存済みの取引を取引日付順で読み込む。start/endを指定すると該当する月だけを読む
+
+        Parquetはメモリマップで開くが、pandasのデータフレームへの変換（to_pandas）で読み込んだ分はコピーされる。
+        """
+        months = self.months()
+        if start is not None:
+            months = [month for month in months if month >= pd.Timestamp(start).strftime('%Y-%m')]
+        if end is not None:
+            months = [month for month in months if month <= pd.Timestamp(end).strftime('%Y-%m')]
+        if not months:
+            return None
+        df = concat_trade_frames([self._read_partition(month) for month in months], ignore_index=True)
+        if start is not None:
+            df = df[df['取引日付'] >= start]
+        if end is not None:
+            df = df[df['取引日付'] <= end]
+        return df.reset_index(drop=True)
+
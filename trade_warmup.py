@@ -0,0 +1,70 @@
+"""起動直後の最初の処理を速くするためのウォームアップ
+
+合成の取引データで読み込み・加工・集計・グラフ作成・エクスポートを1回ずつ実行し、
+機能を使うときまで読み込みを遅らせているライブラリ（altair・xlsxwriter）の読み込みと、
+pandas・NumPyの初回呼び出し時の準備を済ませておく。
+アプリでは環境変数 TRADE_WARMUP=1 のときに、最初の表示の後にプロセスごとに1回だけバックグラウンドで実行する。
+
+使い方:
+    TRADE_WARMUP=1 streamlit run app.py
+    python trade_warmup.py --rows 5000   # コンテナの起動時などに単体で実行し、所要時間を表示する
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+from trade_instrumentation import StageTimer
+
+WARMUP_ENV = "TRADE_WARMUP"  # 1 にするとアプリの起動時にウォームアップする
+WARMUP_ROWS = 2_000
+
+
+def warmup_enabled_by_env():
+    """環境変数でウォームアップが有効にされているかどうかを返す関数"""
+    return os.environ.get(WARMUP_ENV, '').lower() in ('1', 'true', 'yes', 'on')
+
+def warm_up(rows=WARMUP_ROWS, timer=None):
+    """合成データでアプリと同じ処理を1回ずつ実行し、段階ごとの計測結果を返す関数"""
+    timer = timer or StageTimer()
+    with timer.stage('warmup:imports'):
+        from trade_benchmark import generate_trade_frame
+        from trade_charts import GRAPH_OPTIONS, build_chart
+        from trade_export import export_csv, export_excel
+        from trade_metrics import rolling_metrics
+        from trade_processing import read_trade_file, merge_trade_frames, generate_summary_stats, period_bounds
+        from trade_rollup import build_rollup, slice_rollup
+        import altair  # noqa: F401  グラフ作成時に読み込むライブラリを先に読み込む
+        import xlsxwriter  # noqa: F401
+    with timer.stage('warmup:processing', rows):
+        rng = np.random.default_rng(0)
+        offsets = np.sort(rng.integers(0, 7 * 86400, rows))
+        csv_bytes = generate_trade_frame(rows, rng, '2024-01-01', 1, offsets).to_csv(index=False).encode('utf-8')
+        df = merge_trade_frames([read_trade_file(csv_bytes)[1]])
+        generate_summary_stats(df)
+    with timer.stage('warmup:rollup', rows):
+        start_date, end_date = df['取引日付'].iloc[0], df['取引日付'].iloc[-1]
+        lo, hi = period_bounds(df['取引日付'], start_date, end_date)
+        period_cube = slice_rollup(build_rollup(df), start_date, end_date)
+        rolling_metrics(df, 50)
+    with timer.stage('warmup:charts', rows):
+        for graph in GRAPH_OPTIONS:
+            chart = build_chart(graph, period_cube, df.iloc[lo:hi])
+            if chart is not None:
+                chart.to_dict()
+    with timer.stage('warmup:export', rows):
+        export_csv(df)
+        export_excel(df)
+    return timer.stages
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="合成データで加工・集計・グラフ作成を1回実行し、段階ごとの所要時間を表示します。")
+    parser.add_argument('--rows', type=int, default=WARMUP_ROWS, help=f"合成データの行数（既定: {WARMUP_ROWS:,}）")
+    args = parser.parse_args(argv)
+    for stage in warm_up(args.rows):
+        print(f"{stage['stage']:<24}{stage['seconds']:>8.3f}秒")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())